@@ -0,0 +1,388 @@
+"""
+This python module exposes the steps of the study as functions working on in-memory objects: a
+`Corpus`, the counters returned by the scans, the sets of accepted keys and streams of contexts.
+Steps can therefore be chained (e.g., in a notebook) without writing and parsing intermediate files:
+
+```
+import TAM.api as api
+
+corpus = api.Corpus.from_list("data_sample/files_input.tsv")
+nouns = api.merge(api.noun_frequencies(corpus))["nouns"]
+
+ngrams = api.merge(api.construction_frequencies(corpus, "ngram", api.accepted(nouns, 10)))
+accepted = {"nouns": api.accepted(ngrams["nouns"], 5), "adverbs": api.accepted(ngrams["adverbs"], 20)}
+
+samples = api.sample(api.contexts(corpus, "ngram", accepted), 20, random_seed=32)
+```
+
+`main.py` is a thin command line wrapper around this module, which writes the results of each step
+to disk (see `write_frequencies` and `write_contexts`).
+"""
+import collections
+import contextlib
+from pathlib import Path
+
+import tqdm
+
+import TAM.checkpoint as checkpoint
+import TAM.contexts as contexts_module
+import TAM.dedup as dedup
+import TAM.encoded as encoded
+import TAM.extract as extract
+import TAM.matcher as matcher
+import TAM.parallel as parallel
+import TAM.prefilter as prefilter
+import TAM.sample as sample_module
+import TAM.utils as utils
+import TAM.writers as writers_pool
+
+
+class Corpus:
+	"""
+	The Corpus class holds a list of corpus files, each one with its format and identifier.
+	"""
+
+	def __init__(self, files):
+		"""
+		This function initializes a corpus from its files.
+
+		Args:
+		  files: An iterable of (`source`, `file_id`, `path`) triples, where `source` is the identifier
+		of the corpus format, as used by `utils.read`.
+		"""
+
+		self.files = [(source, str(file_id), Path(path)) for source, file_id, path in files]
+
+	@classmethod
+	def from_list(cls, filename):
+		"""
+		The function `from_list` reads a corpus from a list of files (e.g., `files_input.tsv`), with
+		one tab-separated (`source`, `file_id`, `path`) triple per line.
+		"""
+
+		files = []
+		with open(filename, encoding="utf-8") as fin:
+			for line in fin:
+				source, file_id, path = line.strip().split("\t")
+				files.append((source, file_id, path))
+
+		return cls(files)
+
+	def __iter__(self):
+		return iter(self.files)
+
+	def __len__(self):
+		return len(self.files)
+
+	def sentences(self):
+		"""
+		The function `sentences` yields the (`source`, `file_id`, `sentence`) triples of all the
+		sentences of the corpus, `sentence` being a `ColumnarSentence`.
+		"""
+
+		for source, file_id, path in self.files:
+			for sentence in utils.read(path, source):
+				yield source, file_id, sentence
+
+	def scan(self, count_function, *args, n_workers=None, n_shards=1, checkpoints=None):
+		"""
+		The function `scan` runs a counting function over the files of the corpus.
+
+		Args:
+		  count_function: A function with signature `(filename, source, *args, start=..., end=...)`
+		returning partial counters, such as `extract.count_NOUN`.
+		  *args: Additional arguments passed to `count_function`.
+		  n_workers: The number of worker processes (see `parallel.scan_files`).
+		  n_shards: The number of shards each file is split into.
+		  checkpoints: The `Checkpoints` of the scan, `None` for an uninterrupted scan.
+
+		Returns:
+		  A list of (`source`, `file_id`, `counters`) triples, in the order of the files.
+		"""
+
+		if checkpoints is None:
+			return parallel.scan_files(count_function, self.files, n_workers, n_shards, args)
+
+		if n_shards > 1:
+			raise ValueError("Checkpoints cannot be combined with --shards")
+
+		return checkpoint.scan_files(count_function, self.files, checkpoints.directory, checkpoints.step,
+									 checkpoints.segment_size, checkpoints.resume, n_workers or 1, args)
+
+
+class Checkpoints:
+	"""
+	The Checkpoints class holds the settings of a resumable scan (see `TAM.checkpoint`).
+	"""
+
+	def __init__(self, directory, step, segment_size=checkpoint.SEGMENT_SIZE, resume=False):
+		"""
+		This function initializes the settings of a resumable scan.
+
+		Args:
+		  directory: The output folder of the step, where checkpoints are kept.
+		  step: A string identifying the step and its arguments, so that checkpoints of other steps
+		are not used.
+		  segment_size: The size of the segments after which checkpoints are saved, in bytes.
+		  resume: Whether the scan continues from the checkpoints, if any.
+		"""
+
+		self.directory = directory
+		self.step = step
+		self.segment_size = segment_size
+		self.resume = resume
+
+	def clear(self):
+		checkpoint.clear_checkpoints(self.directory)
+
+
+def encode(corpus, output_directory, deduplicator=None, dedup_state=None):
+	"""
+	The function `encode` encodes the files of `corpus` (see `TAM.encoded`) in `output_directory`,
+	writing the list of encoded files to `files_input.tsv`.
+
+	Args:
+	  corpus: The `Corpus` to be encoded.
+	  output_directory: The folder where `{source}_{file_id}.tam` corpora are written.
+	  deduplicator: A `dedup.Deduplicator` dropping the sentences seen before, `None` to keep all
+	sentences. The sentences dropped from each file are counted in `dedup.tsv`.
+	  dedup_state: The file where the state of `deduplicator` is saved after each file, if any.
+
+	Returns:
+	  The `Corpus` of the encoded files.
+	"""
+
+	if deduplicator is not None:
+		for _, _, path in corpus:
+			# all the sentences of a file seen before would be dropped
+			if list(checkpoint.file_state(path)) in deduplicator.files:
+				raise ValueError(f"{path} was already deduplicated with state {dedup_state}")
+
+	encoded_files = []
+	with contextlib.ExitStack() as stack:
+		if deduplicator is not None:
+			report = stack.enter_context(open(output_directory.joinpath("dedup.tsv"), "w", encoding="utf-8"))
+			print("source\tfile_id\tsentences\texact\tnear", file=report)
+
+		for source, file_id, path in tqdm.tqdm(corpus.files):
+			encoded_path = output_directory.joinpath(f"{source}_{file_id}.tam").absolute()
+			sentences = utils.read(path, source)
+
+			if deduplicator is None:
+				encoded.encode(sentences, encoded_path, source)
+			else:
+				counts = dict(deduplicator.counts)
+				encoded.encode(dedup.deduplicate(sentences, deduplicator), encoded_path, source)
+				print(source, file_id, *(deduplicator.counts[name] - counts[name] for name in counts),
+					  sep="\t", file=report)
+
+				deduplicator.files.append(list(checkpoint.file_state(path)))
+				if dedup_state is not None:
+					deduplicator.save(dedup_state)
+
+			encoded_files.append((source, file_id, encoded_path))
+
+	with open(output_directory.joinpath("files_input.tsv"), "w", encoding="utf-8") as fout:
+		for source, file_id, encoded_path in encoded_files:
+			print(f"{source}\t{file_id}\t{encoded_path}", file=fout)
+
+	return Corpus(encoded_files)
+
+
+def noun_frequencies(corpus, n_workers=None, n_shards=1, checkpoints=None, approximate=None):
+	"""
+	The function `noun_frequencies` counts the nouns of each file of `corpus` (see
+	`extract.count_NOUN`), approximately in bounded memory with `approximate` (the arguments of
+	`sketch.new_table`, e.g. `{}` for the defaults). Other arguments are the same as for `Corpus.scan`.
+
+	Returns:
+	  A list of (`source`, `file_id`, `counters`) triples, where `counters` maps "nouns" to the
+	frequencies of the nouns of the file.
+	"""
+
+	return corpus.scan(extract.count_NOUN, approximate, n_workers=n_workers, n_shards=n_shards,
+					   checkpoints=checkpoints)
+
+
+def construction_frequencies(corpus, name, accepted_nouns, patterns=matcher.DEFAULT_PATTERNS,
+							 n_workers=None, n_shards=1, checkpoints=None, approximate=None):
+	"""
+	The function `construction_frequencies` counts the matches of a construction in each file of
+	`corpus` (see `extract.count_construction`). Other arguments are the same as for `Corpus.scan`.
+
+	Args:
+	  corpus: The `Corpus` to be scanned.
+	  name: The name of the construction, e.g. "compound" or "ngram".
+	  accepted_nouns: The set of accepted nouns, e.g. as returned by `accepted`.
+	  patterns: The path to the pattern specification file (see `TAM.matcher`).
+	  approximate: The arguments of `sketch.new_table` if frequencies are counted approximately in
+	bounded memory, `None` for exact counts.
+
+	Returns:
+	  A list of (`source`, `file_id`, `counters`) triples, where `counters` maps each table of the
+	construction (e.g., "adverbs") to its frequencies in the file.
+	"""
+
+	return corpus.scan(extract.count_construction, name, accepted_nouns, patterns, approximate,
+					   n_workers=n_workers, n_shards=n_shards, checkpoints=checkpoints)
+
+
+def merge(results):
+	"""
+	The function `merge` sums the counters of all files, as the `merge` step does on the files
+	written for them.
+
+	Args:
+	  results: A list of (`source`, `file_id`, `counters`) triples, as returned by
+	`noun_frequencies` or `construction_frequencies`.
+
+	Returns:
+	  A dictionary mapping each table (e.g., "nouns") to a dictionary of frequencies, with keys as
+	they are read from merged files (see `utils.normalize_frequencies`).
+	"""
+
+	merged = parallel.reduce_counters(counters for _, _, counters in results)
+
+	return {name: utils.normalize_frequencies(freqs) for name, freqs in merged.items()}
+
+
+def accepted(freqs, threshold):
+	"""
+	The function `accepted` returns the keys of `freqs` whose frequency is at least `threshold`, as
+	`utils.load_from_file` does for a frequency list.
+	"""
+
+	return frozenset(key for key, f in freqs.items() if f >= threshold)
+
+
+def write_frequencies(results, write_function, output_directory, per_file=True, merged=False):
+	"""
+	The function `write_frequencies` writes the counters of each file, and/or their merge.
+
+	Args:
+	  results: A list of (`source`, `file_id`, `counters`) triples.
+	  write_function: The function writing the counters of a file, such as `extract.write_NOUN`.
+	  output_directory: The folder where files are written.
+	  per_file: Whether the counters of each file are written.
+	  merged: Whether the merged counters are written to `{name}_merged.tsv` files, as the `merge`
+	step would write them (with their merged sketches, if approximate).
+	"""
+
+	if per_file:
+		for source, file_id, counters in results:
+			write_function(counters, source, file_id, output_directory)
+
+	if merged:
+		for name, freqs in parallel.reduce_counters(counters for _, _, counters in results).items():
+			output_file = output_directory.joinpath(f"{name}_merged.tsv")
+			utils.write_frequencies(freqs, output_file)
+			extract.save_sketch(freqs, output_file)
+
+
+class _ContextBuffer:
+	"""
+	The _ContextBuffer class collects the rows written by `contexts_module.process_ctx_matches`, in place
+	of a `writers.WriterPool`.
+	"""
+
+	def __init__(self):
+		self.rows = []
+
+	def write(self, writer_key, row):
+		self.rows.append((writer_key[1], row))
+
+
+def contexts(corpus, name, accepted, context_width=20, patterns=matcher.DEFAULT_PATTERNS):
+	"""
+	The function `contexts` yields the contexts of the matches of a construction in `corpus`, one
+	sentence after the other.
+
+	Args:
+	  corpus: The `Corpus` to be scanned.
+	  name: The name of the construction, e.g. "compound" or "ngram".
+	  accepted: A dictionary mapping the lists of the construction to sets of accepted keys, e.g.
+	`{"nouns": ..., "adverbs": ...}`.
+	  context_width: The width of left and right contexts.
+	  patterns: The path to the pattern specification file (see `TAM.matcher`).
+
+	Returns:
+	  An iterator of (`key`, `row`) pairs, where `row` is the line that would be written to file
+	`{key}.contexts.tsv` (without the newline).
+	"""
+
+	pattern_matcher = matcher.load_patterns(patterns, (name,))
+	accepted = {name: accepted}
+	sentence_filter = prefilter.Prefilter(pattern_matcher)
+	buffer = _ContextBuffer()
+
+	for source, _, path in corpus:
+		sentences = utils.read(path, source, prefilter=sentence_filter)
+		for sentence in sentences:
+			contexts_module.process_ctx_matches(pattern_matcher, sentence, source, accepted, context_width,
+										 buffer)
+			yield from buffer.rows
+			buffer.rows.clear()
+
+
+def write_contexts(corpus, name, accepted, output_directory, context_width=20,
+				   patterns=matcher.DEFAULT_PATTERNS, store=False, max_open_files=writers_pool.MAX_OPEN,
+				   checkpoints=None):
+	"""
+	The function `write_contexts` writes the contexts of the matches of a construction in `corpus` to
+	`{key}.contexts.tsv` files, or to a context store (see `TAM.context_store`) if `store` is true.
+	Arguments are the same as for `contexts`, and:
+
+	Args:
+	  output_directory: The folder where contexts are written.
+	  store: Whether contexts are written to a context store instead of TSV files.
+	  max_open_files: The maximum number of contexts files open at the same time.
+	  checkpoints: The `Checkpoints` of the scan, `None` for an uninterrupted scan.
+	"""
+
+	pattern_matcher = matcher.load_patterns(patterns, (name,))
+	accepted = {name: accepted}
+
+	if store:
+		if checkpoints is not None:
+			raise ValueError("Checkpoints cannot be combined with --store")
+		writers = contexts_module.contexts_store_writers({name: output_directory}, pattern_matcher.constructions)
+	else:
+		writers = contexts_module.contexts_writers({name: output_directory}, max_open_files)
+
+	with writers:
+		if checkpoints is not None:
+			checkpoint.extract_contexts(corpus.files, pattern_matcher, accepted, context_width, writers,
+										checkpoints.directory, checkpoints.step, checkpoints.segment_size,
+										checkpoints.resume)
+		else:
+			for source, _, path in tqdm.tqdm(corpus.files):
+				contexts_module.extract_ctx(path, source, pattern_matcher, accepted, context_width, writers)
+
+
+def sample(rows, n_ctxs, random_seed):
+	"""
+	The function `sample` samples `n_ctxs` contexts per noun for each key, keeping the proportion
+	among sources, with the same results as the `sample` step on the `{key}.contexts.tsv` files the
+	rows would be written to (see `sample.sample_rows`). The rows of all keys are kept in memory.
+
+	Args:
+	  rows: An iterable of (`key`, `row`) pairs, as yielded by `contexts`.
+	  n_ctxs: The number of contexts to sample for each noun.
+	  random_seed: The seed of the random number generators, see `sample.file_seed`.
+
+	Returns:
+	  A dictionary mapping each key to a (`sources`, `counts`, `sampled`) triple: the sorted list of
+	sources, the frequencies of each noun in each source, and the sampled rows.
+	"""
+
+	rows_by_key = collections.defaultdict(list)
+	for key, row in rows:
+		rows_by_key[key].append(row)
+
+	samples = {}
+	for key, key_rows in rows_by_key.items():
+		seed = sample_module.file_seed(random_seed, f"{key}.contexts.tsv")
+		_, sources, counts, sampled = sample_module.sample_rows(key_rows, n_ctxs, seed)
+		samples[key] = (sources, counts, sampled)
+
+	return samples
@@ -0,0 +1,239 @@
+"""
+This python module makes long scans resumable. Corpus files are read in segments of roughly
+`segment_size` bytes, starting and ending at sentence boundaries (see `TAM.index`), and after each
+segment a checkpoint is written with the position reached, the partial counters and, for contexts,
+the size of each output file.
+
+When a scan is resumed, finished segments are skipped, partial counters are restored and output
+files are truncated to their size at the checkpoint, so that outputs are the same as those of an
+uninterrupted scan. Checkpoints are only used if they were written by the same step, with the same
+arguments, over the same (unchanged) corpus files.
+"""
+import concurrent.futures
+import logging
+import math
+import os
+import pickle
+import shutil
+
+import tqdm
+
+import TAM.contexts as contexts
+import TAM.index as index
+import TAM.parallel as parallel
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FOLDER = ".checkpoints"
+CHECKPOINT_SUFFIX = ".ckpt"
+
+# default size of segments, in bytes
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+def segment_ranges(filename, source, segment_size=SEGMENT_SIZE):
+	"""
+	The function `segment_ranges` splits a corpus file into segments of roughly `segment_size`
+	bytes, returned as (`start`, `end`) pairs as by `index.shard_ranges`.
+	"""
+
+	n_segments = max(1, math.ceil(index.corpus_size(filename) / segment_size))
+	return index.shard_ranges(filename, source, n_segments)
+
+
+def file_state(filename):
+	"""
+	The function `file_state` identifies the current version of a file: its path, size and
+	modification time.
+	"""
+
+	stat = os.stat(filename)
+	return (str(filename), index.corpus_size(filename), stat.st_mtime_ns)
+
+
+def load_checkpoint(checkpoint_filename, fingerprint):
+	"""
+	The function `load_checkpoint` returns the state saved in a checkpoint, or `None` if the
+	checkpoint is missing or was written with a different `fingerprint`.
+	"""
+
+	if not os.path.exists(checkpoint_filename):
+		return None
+
+	try:
+		with open(checkpoint_filename, "rb") as fin:
+			state = pickle.load(fin)
+	except (OSError, pickle.UnpicklingError, EOFError) as err:
+		logger.warning("Unable to read checkpoint %s: %s", checkpoint_filename, err)
+		return None
+
+	if state.get("fingerprint") != fingerprint:
+		logger.warning("Ignoring checkpoint %s, written with different arguments or inputs",
+					   checkpoint_filename)
+		return None
+
+	return state
+
+
+def save_checkpoint(checkpoint_filename, state):
+	"""
+	The function `save_checkpoint` writes a checkpoint, replacing the previous one only once the new
+	one is complete.
+	"""
+
+	temp_filename = f"{checkpoint_filename}.tmp"
+	with open(temp_filename, "wb") as fout:
+		pickle.dump(state, fout, protocol=pickle.HIGHEST_PROTOCOL)
+		fout.flush()
+		os.fsync(fout.fileno())
+
+	os.replace(temp_filename, checkpoint_filename)
+
+
+def clear_checkpoints(output_directory):
+	"""
+	The function `clear_checkpoints` removes the checkpoints of a step, once its outputs are written.
+	"""
+
+	shutil.rmtree(os.path.join(output_directory, CHECKPOINT_FOLDER), ignore_errors=True)
+
+
+def checkpoint_directory(output_directory):
+	"""
+	The function `checkpoint_directory` returns (creating it if needed) the folder where the
+	checkpoints of a step writing to `output_directory` are kept.
+	"""
+
+	directory = os.path.join(output_directory, CHECKPOINT_FOLDER)
+	os.makedirs(directory, exist_ok=True)
+	return directory
+
+
+def scan_file(count_function, source, path, checkpoint_filename, step, segment_size, resume, *args):
+	"""
+	The function `scan_file` runs `count_function` over the segments of a corpus file, saving a
+	checkpoint after each segment.
+
+	Args:
+	  count_function: A function with signature `(filename, source, *args, start=..., end=...)`
+	returning partial counters, such as `extract.count_NOUN`.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  path: The path to the corpus file.
+	  checkpoint_filename: The path of the checkpoint of the file.
+	  step: A string identifying the step and its arguments (e.g., thresholds), stored in the
+	checkpoint so that checkpoints of different runs are never mixed.
+	  segment_size: The size of segments, in bytes.
+	  resume: Whether the scan continues from the checkpoint, if any.
+	  *args: Additional arguments passed to `count_function`.
+
+	Returns:
+	  The counters of the whole file, reduced as by `parallel.reduce_counters`.
+	"""
+
+	ranges = segment_ranges(path, source, segment_size)
+	fingerprint = {"step": step, "file": file_state(path), "ranges": ranges}
+
+	state = load_checkpoint(checkpoint_filename, fingerprint) if resume else None
+	if state is None:
+		state = {"fingerprint": fingerprint, "segment_n": 0, "counters": None}
+
+	for segment_n in range(state["segment_n"], len(ranges)):
+		start, end = ranges[segment_n]
+		partial = count_function(path, source, *args, start=start, end=end)
+
+		if state["counters"] is None:
+			state["counters"] = partial
+		else:
+			state["counters"] = parallel.reduce_counters([state["counters"], partial])
+
+		state["segment_n"] = segment_n + 1
+		save_checkpoint(checkpoint_filename, state)
+
+	return state["counters"]
+
+
+def scan_files(count_function, input_files, output_directory, step, segment_size=SEGMENT_SIZE,
+			   resume=False, n_workers=1, args=()):
+	"""
+	The function `scan_files` runs `count_function` over a list of corpus files, as
+	`parallel.scan_files` does, with a checkpoint for each file. Files are scanned concurrently by
+	`n_workers` processes, and the segments of each file one after the other.
+
+	Args:
+	  count_function: A function with signature `(filename, source, *args, start=..., end=...)`
+	returning partial counters, such as `extract.count_NOUN`.
+	  input_files: A list of (`source`, `file_id`, `path`) triples.
+	  output_directory: The output folder of the step, where checkpoints are kept (see
+	`checkpoint_directory`).
+	  step: A string identifying the step and its arguments, see `scan_file`.
+	  segment_size: The size of segments, in bytes.
+	  resume: Whether scans continue from the checkpoints, if any.
+	  n_workers: The number of worker processes.
+	  args: A tuple of additional arguments passed to `count_function`.
+
+	Returns:
+	  A list of (`source`, `file_id`, `counters`) triples, in the same order as `input_files`.
+	"""
+
+	input_files = list(input_files)
+	directory = checkpoint_directory(output_directory)
+
+	tasks = [(count_function, source, path,
+			  os.path.join(directory, f"{source}_{file_id}{CHECKPOINT_SUFFIX}"), step, segment_size, resume,
+			  *args)
+			 for source, file_id, path in input_files]
+
+	if n_workers is None or n_workers <= 1:
+		counters = [scan_file(*task) for task in tqdm.tqdm(tasks)]
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+			futures = [executor.submit(scan_file, *task) for task in tasks]
+			for _ in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
+				pass
+			counters = [future.result() for future in futures]
+
+	return [(source, file_id, file_counters)
+			for (source, file_id, _), file_counters in zip(input_files, counters)]
+
+
+def extract_contexts(input_files, pattern_matcher, accepted, ctx, writers, output_directory, step,
+					 segment_size=SEGMENT_SIZE, resume=False):
+	"""
+	The function `extract_contexts` runs `contexts.extract_ctx` over the segments of a list of corpus
+	files, saving a checkpoint after each segment.
+
+	Args:
+	  input_files: A list of (`source`, `file_id`, `path`) triples.
+	  pattern_matcher: The `matcher.Matcher` whose patterns are matched.
+	  accepted: The accepted lists of each construction, see `contexts.process_ctx_matches`.
+	  ctx: The width of left and right contexts.
+	  writers: The `writers.WriterPool` of the output files.
+	  output_directory: The output folder of the step, where the checkpoint is kept.
+	  step: A string identifying the step and its arguments, see `scan_file`.
+	  segment_size: The size of segments, in bytes.
+	  resume: Whether extraction continues from the checkpoint, if any.
+	"""
+
+	checkpoint_filename = os.path.join(checkpoint_directory(output_directory), f"contexts{CHECKPOINT_SUFFIX}")
+
+	ranges = [segment_ranges(path, source, segment_size) for source, _, path in input_files]
+	fingerprint = {"step": step, "files": [file_state(path) for _, _, path in input_files],
+				   "ranges": ranges}
+
+	state = load_checkpoint(checkpoint_filename, fingerprint) if resume else None
+	if state is None:
+		state = {"fingerprint": fingerprint, "file_n": 0, "segment_n": 0, "positions": {}}
+	else:
+		writers.restore(state["positions"])
+
+	for file_n in tqdm.tqdm(range(state["file_n"], len(input_files))):
+		source, _, path = input_files[file_n]
+		first_segment = state["segment_n"] if file_n == state["file_n"] else 0
+
+		for segment_n in range(first_segment, len(ranges[file_n])):
+			start, end = ranges[file_n][segment_n]
+			contexts.extract_ctx(path, source, pattern_matcher, accepted, ctx, writers, start, end)
+
+			state["file_n"], state["segment_n"] = file_n, segment_n + 1
+			state["positions"] = writers.positions()
+			save_checkpoint(checkpoint_filename, state)
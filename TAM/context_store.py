@@ -0,0 +1,380 @@
+"""
+This python module implements an indexed binary store for the contexts extracted by
+`TAM.contexts`, as an alternative to one `{key}.contexts.tsv` file per prefix or adverb. Rows can
+be counted, sampled and looked up by (key, noun, source) through the index, without reading the
+whole store, and exported back to the TSV files.
+
+A context store is a folder (`contexts.tcs` by convention) containing:
+- `meta.json`: format version, columns, indexed columns and sizes
+- `{column}.vocab`: one string per line for each column but the contexts, the line number being the code
+- `rows.bin`: one unsigned 32-bit code per column for each row, in order of extraction
+- `texts.bin`: zlib-compressed blocks of `BLOCK_ROWS` rows, each row holding the tab-separated
+left context, occurrence and right context, and rows being separated by newlines
+- `blocks.bin`: signed 64-bit offset of each block in `texts.bin`, plus the size of the file
+- `groups.bin`: for each distinct value of the indexed columns, their codes, the position of its
+first row in `postings.bin` and its number of rows, as signed 64-bit integers sorted by code
+- `postings.bin`: signed 64-bit row numbers, sorted by group and then by row
+
+Integers are stored in native byte order.
+"""
+import array
+import bisect
+import functools
+import json
+import os
+import zlib
+from pathlib import Path
+
+import TAM.writers as writers
+
+FORMAT_VERSION = 1
+
+# number of rows compressed together
+BLOCK_ROWS = 1024
+
+# columns of the contexts, stored compressed
+TEXT_COLUMNS = ("left", "occurrence", "right")
+
+STORE_SUFFIX = ".tcs"
+
+
+def is_store(path):
+	"""
+	The function `is_store` checks whether `path` is a context store.
+	"""
+
+	return os.path.isfile(os.path.join(path, "meta.json")) and \
+		os.path.isfile(os.path.join(path, "postings.bin"))
+
+
+class ContextStoreWriter:
+	"""
+	The ContextStoreWriter class writes the rows of a single construction to a context store. The
+	index is built when the writer is closed.
+	"""
+
+	def __init__(self, output_path, columns, key):
+		"""
+		This function creates an empty store.
+
+		Args:
+		  output_path: The folder where the store is written (created if missing).
+		  columns: The names of the columns preceding the contexts, e.g. ["source", "prefix", "noun"].
+		  key: The column naming the contexts files, e.g. "prefix". Rows are indexed by (`key`,
+		"noun", "source").
+		"""
+
+		self.output_path = Path(output_path)
+		self.output_path.mkdir(parents=True, exist_ok=True)
+
+		self.columns = list(columns)
+		self.index_columns = [key, "noun", "source"]
+		for column in self.index_columns:
+			if column not in self.columns:
+				raise ValueError(f"Unable to index contexts without column {column}")
+		self.index_positions = [self.columns.index(column) for column in self.index_columns]
+
+		self.vocabularies = [{} for _ in self.columns]
+		self.codes = array.array("I")
+		self.texts = []
+		self.block_offsets = array.array("q", [0])
+		self.groups = {}
+		self.n_rows = 0
+
+		self.rows_file = open(self.output_path.joinpath("rows.bin"), "wb")
+		self.texts_file = open(self.output_path.joinpath("texts.bin"), "wb")
+
+	def write(self, row):
+		"""
+		The function `write` appends a row, given as a line of a `{key}.contexts.tsv` file (without
+		the trailing newline).
+		"""
+
+		fields = row.split("\t")
+		n_columns = len(self.columns)
+		if len(fields) != n_columns + len(TEXT_COLUMNS):
+			raise ValueError(f"Expected {n_columns + len(TEXT_COLUMNS)} fields in context row")
+
+		codes = []
+		for vocabulary, string in zip(self.vocabularies, fields):
+			code = vocabulary.get(string)
+			if code is None:
+				code = vocabulary[string] = len(vocabulary)
+			codes.append(code)
+		self.codes.extend(codes)
+
+		group = tuple(codes[position] for position in self.index_positions)
+		rows = self.groups.get(group)
+		if rows is None:
+			rows = self.groups[group] = array.array("q")
+		rows.append(self.n_rows)
+		self.n_rows += 1
+
+		self.texts.append("\t".join(fields[n_columns:]))
+		if len(self.texts) == BLOCK_ROWS:
+			self._write_block()
+
+	def _write_block(self):
+		if not self.texts:
+			return
+
+		self.texts_file.write(zlib.compress("\n".join(self.texts).encode("utf-8")))
+		self.block_offsets.append(self.texts_file.tell())
+		self.texts = []
+
+		self.codes.tofile(self.rows_file)
+		del self.codes[:]
+
+	def close(self):
+		"""
+		The function `close` writes the pending rows, the vocabularies and the index of the store.
+		"""
+
+		if self.rows_file.closed:
+			return
+
+		try:
+			self._write_block()
+		finally:
+			self.rows_file.close()
+			self.texts_file.close()
+
+		with open(self.output_path.joinpath("blocks.bin"), "wb") as fout:
+			self.block_offsets.tofile(fout)
+
+		for column, vocabulary in zip(self.columns, self.vocabularies):
+			with open(self.output_path.joinpath(f"{column}.vocab"), "w", encoding="utf-8",
+					  newline="\n") as fout:
+				for string in vocabulary:
+					print(string, file=fout)
+
+		groups = array.array("q")
+		postings = array.array("q")
+		for group in sorted(self.groups):
+			rows = self.groups[group]
+			groups.extend(group)
+			groups.extend((len(postings), len(rows)))
+			postings.extend(rows)
+
+		with open(self.output_path.joinpath("groups.bin"), "wb") as fout:
+			groups.tofile(fout)
+		with open(self.output_path.joinpath("postings.bin"), "wb") as fout:
+			postings.tofile(fout)
+
+		meta = {"version": FORMAT_VERSION,
+				"columns": self.columns,
+				"index": self.index_columns,
+				"block_rows": BLOCK_ROWS,
+				"n_rows": self.n_rows,
+				"n_groups": len(self.groups)}
+
+		with open(self.output_path.joinpath("meta.json"), "w", encoding="utf-8") as fout:
+			json.dump(meta, fout, indent=1)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+class StorePool:
+	"""
+	The StorePool class dispatches the rows of several constructions to their context stores. It
+	can replace the `writers.WriterPool` of `TAM.contexts`, with writer keys (`construction`, `key`).
+	"""
+
+	def __init__(self, stores):
+		"""
+		Args:
+		  stores: A dictionary mapping each construction name to its `ContextStoreWriter`.
+		"""
+
+		self.stores = stores
+
+	def write(self, writer_key, row):
+		self.stores[writer_key[0]].write(row)
+
+	def close(self):
+		for store in self.stores.values():
+			store.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+class ContextStore:
+	"""
+	The ContextStore class reads a context store. Rows are returned as lines of the corresponding
+	`{key}.contexts.tsv` file (without the trailing newline).
+	"""
+
+	def __init__(self, path):
+		self.path = Path(path)
+
+		with open(self.path.joinpath("meta.json"), encoding="utf-8") as fin:
+			self.meta = json.load(fin)
+
+		if self.meta["version"] != FORMAT_VERSION:
+			raise ValueError(f"Unsupported context store version: {self.meta['version']}")
+
+		self.columns = self.meta["columns"]
+		self.block_rows = self.meta["block_rows"]
+
+		self.vocabularies = []
+		for column in self.columns:
+			with open(self.path.joinpath(f"{column}.vocab"), encoding="utf-8", newline="") as fin:
+				self.vocabularies.append(fin.read().split("\n")[:-1])
+		self.codes = [{string: code for code, string in enumerate(vocabulary)}
+					  for vocabulary in self.vocabularies]
+
+		self.rows = self._load("rows.bin", "I")
+		self.block_offsets = self._load("blocks.bin", "q")
+		self.postings = self._load("postings.bin", "q")
+
+		groups = self._load("groups.bin", "q")
+		self.groups = [tuple(groups[group_n:group_n+5]) for group_n in range(0, len(groups), 5)]
+
+		self.key_column = self.columns.index(self.meta["index"][0])
+		self.noun_column = self.columns.index(self.meta["index"][1])
+		self.source_column = self.columns.index(self.meta["index"][2])
+
+		# decompressed blocks are cached per store, rather than in a cache shared by all stores
+		self._block = functools.lru_cache(maxsize=16)(self._read_block)
+
+	def _load(self, filename, typecode):
+		values = array.array(typecode)
+		with open(self.path.joinpath(filename), "rb") as fin:
+			values.frombytes(fin.read())
+		return values
+
+	def __len__(self):
+		return self.meta["n_rows"]
+
+	def keys(self):
+		"""
+		The function `keys` returns the keys (e.g., the prefixes) of the store, in order of first
+		occurrence.
+		"""
+
+		return list(self.vocabularies[self.key_column])
+
+	def _key_groups(self, key):
+		"""
+		The function `_key_groups` returns the index entries of `key`, as (`noun_code`,
+		`source_code`, `start`, `count`) tuples.
+		"""
+
+		key_code = self.codes[self.key_column].get(key)
+		if key_code is None:
+			return []
+
+		first = bisect.bisect_left(self.groups, (key_code,))
+		last = bisect.bisect_left(self.groups, (key_code + 1,))
+		return [group[1:] for group in self.groups[first:last]]
+
+	def row_ids(self, key, noun=None, source=None):
+		"""
+		The function `row_ids` returns the sorted row numbers of the contexts of `key`, optionally
+		restricted to a `noun` and a `source`.
+		"""
+
+		nouns = self.codes[self.noun_column]
+		sources = self.codes[self.source_column]
+
+		ids = []
+		for noun_code, source_code, start, count in self._key_groups(key):
+			if noun is not None and nouns.get(noun) != noun_code:
+				continue
+			if source is not None and sources.get(source) != source_code:
+				continue
+			ids.extend(self.postings[start:start+count])
+
+		return sorted(ids)
+
+	def _sorted_groups(self, key):
+		return sorted(self._key_groups(key), key=lambda group: self.postings[group[2]])
+
+	def counts(self, key):
+		"""
+		The function `counts` returns the number of contexts of `key` for each noun and source, as a
+		dictionary of dictionaries whose nouns and sources are in order of first occurrence in the
+		rows of `key`.
+		"""
+
+		nouns = self.vocabularies[self.noun_column]
+		sources = self.vocabularies[self.source_column]
+
+		counts = {}
+		for noun_code, source_code, _, count in self._sorted_groups(key):
+			counts.setdefault(nouns[noun_code], {})[sources[source_code]] = count
+
+		return counts
+
+	def sources(self, key):
+		"""
+		The function `sources` returns the sources of the contexts of `key`, in order of first
+		occurrence.
+		"""
+
+		sources = self.vocabularies[self.source_column]
+		return list(dict.fromkeys(sources[source_code] for _, source_code, _, _ in self._sorted_groups(key)))
+
+	def get_rows(self, row_ids):
+		"""
+		The function `get_rows` yields the rows with the given numbers, decompressing each block once
+		for consecutive rows of the same block.
+		"""
+
+		n_columns = len(self.columns)
+		for row_id in row_ids:
+			block_n, position = divmod(row_id, self.block_rows)
+			codes = self.rows[row_id*n_columns:(row_id+1)*n_columns]
+			fields = [vocabulary[code] for vocabulary, code in zip(self.vocabularies, codes)]
+			fields.append(self._block(block_n)[position])
+			yield "\t".join(fields)
+
+	def _read_block(self, block_n):
+		with open(self.path.joinpath("texts.bin"), "rb") as fin:
+			fin.seek(self.block_offsets[block_n])
+			data = fin.read(self.block_offsets[block_n+1] - self.block_offsets[block_n])
+
+		return zlib.decompress(data).decode("utf-8").split("\n")
+
+	def contexts(self, key, noun=None, source=None):
+		"""
+		The function `contexts` yields the rows of `key`, optionally restricted to a `noun` and a
+		`source`, in order of extraction.
+		"""
+
+		return self.get_rows(self.row_ids(key, noun, source))
+
+	def __iter__(self):
+		return self.get_rows(range(len(self)))
+
+	def key_of(self, row):
+		return row.split("\t")[self.key_column]
+
+
+def export_tsv(path, output_directory, max_open=writers.MAX_OPEN):
+	"""
+	The function `export_tsv` writes the rows of a context store as the `{key}.contexts.tsv` files
+	the `contexts` step would have written.
+
+	Args:
+	  path: The folder of the context store.
+	  output_directory: The folder where TSV files are written (created if missing).
+	  max_open: The maximum number of files open at the same time.
+	"""
+
+	output_directory = Path(output_directory)
+	output_directory.mkdir(parents=True, exist_ok=True)
+
+	store = ContextStore(path)
+	with writers.WriterPool(lambda key: output_directory.joinpath(f"{key}.contexts.tsv"),
+							max_open=max_open) as pool:
+		for row in store:
+			pool.write(store.key_of(row), row)
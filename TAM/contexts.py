@@ -1,12 +1,138 @@
 import tqdm
 
+import TAM.context_store as context_store
+import TAM.matcher as matcher
+import TAM.metrics as metrics
+import TAM.pos_maps as pmaps
+import TAM.prefilter as prefilter
 import TAM.utils as utils
+import TAM.writers as writers_pool
+
+# matchers of the built-in constructions of `patterns.yaml`, compiled once for the helpers of each
+# construction below
+COMPOUND_MATCHER = matcher.load_patterns(names=("compound",))
+NGRAM_MATCHER = matcher.load_patterns(names=("ngram",))
+
+
+def contexts_writers(output_dirs, max_open=writers_pool.MAX_OPEN):
+	"""
+	This Python function creates the `writers.WriterPool` used to write contexts: file
+	`{key}.contexts.tsv` in the folder of each construction, for writer keys (`construction`, `key`).
+
+	Args:
+	  output_dirs: A dictionary mapping each construction name to the folder of its output files.
+	  max_open: The maximum number of files open at the same time.
+	"""
+
+	return writers_pool.WriterPool(lambda writer_key: output_dirs[writer_key[0]].joinpath(
+		f"{writer_key[1]}.contexts.tsv"), max_open=max_open)
+
+
+def contexts_store_writers(output_dirs, constructions):
+	"""
+	This Python function creates the `context_store.StorePool` used to write contexts to a context
+	store (`contexts.tcs`) in the folder of each construction, instead of TSV files. It can be used
+	wherever the pool returned by `contexts_writers` is.
+
+	Args:
+	  output_dirs: A dictionary mapping each construction name to the folder of its output files.
+	  constructions: A dictionary mapping each construction name to its `matcher.Construction`.
+	"""
+
+	return context_store.StorePool({
+		name: context_store.ContextStoreWriter(output_dirs[name].joinpath(f"contexts{context_store.STORE_SUFFIX}"),
+											   ["source", *constructions[name].columns],
+											   constructions[name].key)
+		for name in output_dirs})
+
+
+def process_ctx_matches(pattern_matcher, sentence, source, accepted, ctx, writers, match_counts=None):
+	"""
+	This Python function extracts the contexts of the matches of one or more constructions from a
+	single sentence and writes them to the output files: one row for each match whose key (e.g., the
+	prefix or the adverb) belongs to the accepted keys of its construction, in file
+	`{key}.contexts.tsv`.
+
+	Args:
+	  pattern_matcher: The `matcher.Matcher` whose patterns are matched.
+	  sentence: The `ColumnarSentence` to be processed.
+	  source: The identifier of the corpus the sentence comes from, written in the first column.
+	  accepted: A dictionary mapping each construction name to its lists: the ones used by `accept`
+	constraints (e.g., "nouns") and the accepted keys (e.g., "prefs" or "adverbs"). Constructions
+	missing from `accepted` are skipped.
+	  ctx: The width of left and right contexts.
+	  writers: The `writers.WriterPool` of the output files, as created by `contexts_writers`, or the
+	`context_store.StorePool` created by `contexts_store_writers`.
+	  match_counts: An optional dictionary where the written matches of each `matcher.Pattern` are
+	counted (see `TAM.metrics`).
+	"""
+
+	constructions = pattern_matcher.constructions
+
+	# the built-in "ngram" construction is matched by its hand-written loop
+	ngram = pattern_matcher.ngram
+	if ngram is not None and ngram in accepted and "nouns" in accepted[ngram]:
+		process_ctx_detADVN(sentence, source, accepted[ngram]["adverbs"], accepted[ngram]["nouns"], ctx,
+							writers, match_counts, constructions[ngram])
+		if len(accepted) == 1:
+			return
+		accepted = {name: lists for name, lists in accepted.items() if name != ngram}
+
+	for match in pattern_matcher.matches(sentence, accepted):
+		construction = constructions[match.pattern.construction]
+		if construction.key is None:
+			continue
+
+		key = match.fields[construction.key]
+		if not key in accepted[construction.name][construction.key_list]:
+			continue
+
+		if match_counts is not None:
+			match_counts[match.pattern] = match_counts.get(match.pattern, 0) + 1
+
+		columns = [match.pattern.name if column == "type" else match.fields[column]
+				   for column in construction.columns]
+		ctx_left, candidate_str, ctx_right = match.context(ctx)
+
+		writers.write((construction.name, key),
+					  "\t".join([source, *columns, ctx_left, candidate_str, ctx_right]))
+
+
+def extract_ctx(filename, source, pattern_matcher, accepted, ctx, writers, start=0, end=None):
+	"""
+	This Python function extracts the contexts of the matches of one or more constructions from a
+	given file (or from a byte range of it), in a single pass. Arguments are the same as for
+	`process_ctx_matches`, except for `filename`, the corpus file to be read, and `start` and `end`,
+	the boundaries of the range (see `utils.read`).
+	"""
+
+	with metrics.scan("contexts", filename, source, start, end) as file_scan:
+		file_scan.watch(writers)
+		# sentences in which no pattern can match are not parsed
+		sentences = file_scan.sentences(utils.read(filename, source, start, end, file_scan.reader_stats,
+												   prefilter.Prefilter(pattern_matcher)))
+		for sentence in tqdm.tqdm(sentences):
+			process_ctx_matches(pattern_matcher, sentence, source, accepted, ctx, writers, file_scan.matches)
+
+
+def process_ctx_advN(sentence, source,
+					 accepted_prefs, accepted_nouns,
+					 ctx,
+					 writers):
+	"""
+	This Python function extracts contexts for prefix-noun compounds from a single sentence and writes
+	them to the output files. Arguments are the same as for `extract_ctx_advN`, except for `sentence`,
+	the `ColumnarSentence` to be processed.
+	"""
+
+	process_ctx_matches(COMPOUND_MATCHER, sentence, source,
+						{"compound": {"nouns": accepted_nouns, "prefs": accepted_prefs}}, ctx, writers)
 
 
 def extract_ctx_advN(filename, source,
 					 accepted_prefs, accepted_nouns,
 					 ctx,
-					 output_dir, output_files):
+					 writers):
 	"""
 	This Python function extracts context for prefix-noun compounds from a given file based on specified
 	criteria and writes the results to output files.
@@ -25,175 +151,152 @@ def extract_ctx_advN(filename, source,
 	determines how many tokens to consider on the left and right of a candidate noun in a sentence when
 	extracting context information. The context window size `ctx` specifies the number of tokens before
 	and after the compound
-	  output_dir: The `output_dir` parameter in the `extract_ctx_advN` function represents the directory
-	where the output files will be saved. It is a path to the directory where the generated context
-	files will be stored.
-	  output_files: The `output_files` parameter in the `extract_ctx_advN` function is a dictionary that
-	stores file objects for writing the extracted context information. The keys in the dictionary are
-	prefixes, and the values are file objects associated with those prefixes. Each file object is opened
-	for writing in UTF-8 encoding
+	  writers: The `writers.WriterPool` of the output files, created by `contexts_writers` with the
+	output folder of construction "compound". Files are named after prefixes.
 	"""
 
-	for sentence in tqdm.tqdm(utils.read(filename, source)):
-		candidates = {}
-		for tok_id, token in enumerate(sentence.sentence):
-			if token.pos == "NOUN" and "-" in token.form:
-				formsplit = token.form.rsplit("-", 1)
-				if formsplit[1] in accepted_nouns and formsplit[0] in accepted_prefs:
-					candidates[tok_id] = (formsplit[0], formsplit[1])
-
-		for candidate, compound in candidates.items():
-
-			prefix, noun = compound
-
-			sentence_portion_left = sentence.sentence[max(0, candidate-ctx):candidate]
-			sentence_portion_right = sentence.sentence[candidate+1:min(len(sentence.sentence), candidate+ctx+1)]
+	extract_ctx(filename, source, COMPOUND_MATCHER,
+				{"compound": {"nouns": accepted_nouns, "prefs": accepted_prefs}}, ctx, writers)
 
-			ctx_left = " ".join([token.form for token in sentence_portion_left])
-			candidate_str = sentence.sentence[candidate].form
-			ctx_right = " ".join([token.form for token in sentence_portion_right])
 
-			if not prefix in output_files:
-				output_files[prefix] = open(output_dir.joinpath(f"{prefix}.contexts.tsv"),
-								"w", encoding="utf-8")
-
-			print(f"{source}\t{prefix}\t{noun}\t{ctx_left}\t{candidate_str}\t{ctx_right}",
-		 		file=output_files[prefix])
-
-
-def extract_ctx_detADVN(filename, source,
+def process_ctx_detADVN(sentence, source,
 						accepted_adverbs, accepted_nouns,
 						ctx,
-						output_dir, output_files):
+						writers, match_counts=None, construction=None):
 	"""
-	The function `extract_ctx_detADVN` takes in a filename, source, accepted nouns, accepted adverbs,
-	context, output directory, and output files. It processes sentences to extract specific patterns
-	involving adverbs, nouns, and determiners, and writes the extracted information to output files.
-
-	Args:
-	  filename: The `filename` parameter in the `extract_ctx_detADVN` function is the name of the file
-	from which the sentences will be read for processing.
-	  source: The `source` parameter in the `extract_ctx_detADVN` function is a string
-	representing the source of the data from which you are extracting contexts for adverbs and nouns.
-	  accepted_nouns: Accepted_nouns is a list of accepted noun forms that the function will use to
-	filter out nouns in the input data.
-	  accepted_adverbs: The `accepted_adverbs` parameter in the `extract_ctx_detADVN` function is a list
-	of adverbs that are considered acceptable for extraction. These adverbs are used to filter out
-	adverbs that are not of interest for the extraction process.
-	  ctx: The `ctx` parameter in the `extract_ctx_detADVN` function represents the context size, which
-	determines how many tokens to consider on the left and right sides of the adverb in a sentence when
-	extracting information. It is used to define the window size for capturing the surrounding context
-	of the adverb-noun pattern
-	  output_dir: The `output_dir` parameter in the `extract_ctx_detADVN` function represents the
-	directory where the output files will be saved. It is a path to the directory where the output files
-	containing the extracted contexts will be stored.
-	  output_files: The `output_files` parameter in the `extract_ctx_detADVN` function is a dictionary
-	that stores file objects for writing output data. The keys in the dictionary are the adverb forms,
-	and the values are the corresponding file objects where the extracted context information will be
-	written. Each file object is opened for writing in UTF-8 encoding
+	The function `process_ctx_detADVN` extracts contexts for determiner-adverb-noun patterns from a
+	single sentence and writes them to the output files. Arguments are the same as for
+	`extract_ctx_detADVN`, except for `sentence`, the `ColumnarSentence` to be processed.
+
+	The patterns (the "ngram" construction in `patterns.yaml`) are checked by hand, at a lower cost
+	per candidate than by `matcher.Matcher`, and `process_ctx_matches` writes the contexts of the
+	construction with this loop as long as its specification is left unchanged (see
+	`matcher.NGRAM_DIGEST`). When two adverbs are matched, they are joined by a space in the contexts
+	of the following matches as well, but the forms of the sentence are not modified.
+
+	`match_counts` and `construction` are the same as for `extract.process_detADVN`; rows are
+	written with writer keys (`construction.name`, adverb).
 	"""
 
-	for sentence in tqdm.tqdm(utils.read(filename, source)):
-		candidates = {}
+	if construction is None:
+		construction = NGRAM_MATCHER.constructions["ngram"]
+	patterns = construction.patterns
 
-		for tok_id, token in enumerate(sentence.sentence):
-			if token.pos == "ADV" and \
-				tok_id > 2 and \
-					tok_id < len(sentence.sentence)-2:
-					candidates[tok_id] = token
+	ids = sentence.ids
+	forms = sentence.forms
+	pos = sentence.pos
+	heads = sentence.heads
+	deprels = sentence.deprels
+	n_tokens = len(pos)
 
+	# portions of the sentence are kept as index ranges, forms are only joined once
+	# the candidate has been fully processed
+	for c_id in range(3, n_tokens-2):
+		if pos[c_id] != pmaps.ADV:
+			continue
 
-		for c_id, adverb_object in candidates.items():
+		pattern_n = None
 
-			sentence_portion_left = None
-			sentence_portion_right = None
+		if pos[c_id-1] == pmaps.DET:                                                # DET ADV ? ? case
 
-			pprevious_object = sentence.sentence[c_id-2]
-			previous_object = sentence.sentence[c_id-1]
+			left_end = c_id-1
 
-			next_object = sentence.sentence[c_id+1]
-			nnext_object = sentence.sentence[c_id+2]
+			d_id = c_id-1
 
-			if previous_object.pos == "DET":                                            # DET ADV ? ? case
+			if (
+				pos[c_id+1] == pmaps.NOUN and forms[c_id+1] in accepted_nouns and \
+				((deprels[d_id] == "" or heads[d_id] == ids[c_id]) or \
+				(deprels[c_id] == "" or heads[c_id] == ids[c_id+1]))
+			):                                                                      # DET ADV NOUN case
 
-				sentence_portion_left = sentence.sentence[max(0, c_id-1-ctx):c_id-1]
+				pattern_n = 0
+				n_id = c_id+1
+				sentence_portion_right = (c_id+2, min(n_tokens, c_id+2+ctx+1))
+				occurrence = (c_id-1, c_id, c_id+1)
 
-				determiner_object = previous_object
+			elif (
+				pos[c_id+1] == pmaps.ADV and \
+				pos[c_id+2] == pmaps.NOUN and forms[c_id+2] in accepted_nouns and \
+				((deprels[d_id] == "" or heads[d_id] == ids[c_id+2]) or \
+				(deprels[c_id] == "" or heads[c_id] == ids[c_id+2]) or \
+				(deprels[c_id+1] == "" or heads[c_id+1] == ids[c_id+2]))
+			):                                                                      # DET ADV ADV NOUN case
 
-				if (
-					next_object.pos == "NOUN" and next_object.form in accepted_nouns and \
-					((determiner_object.deprel == "" or determiner_object.head == adverb_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == next_object.id))
-				):                                                                      # DET ADV NOUN case
+				if forms is sentence.forms:
+					forms = list(forms)
+				forms[c_id] = forms[c_id] + " " + forms[c_id+1]
 
-					noun_object = next_object
-					ngramtype = "DET ADV NOUN"
+				pattern_n = 1
+				n_id = c_id+2
+				sentence_portion_right = (c_id+3, min(n_tokens, c_id+3+ctx+1))
+				occurrence = (c_id-1, c_id, c_id+2)
 
-					sentence_portion_right = sentence.sentence[c_id+2:min(len(sentence.sentence), c_id+2+ctx+1)]
-					occurrence = sentence.sentence[c_id-1:c_id+2]
+			# DET ADV ADJ NOUN is not extracted
 
-				elif (
-					next_object.pos == "ADV" and \
-					nnext_object.pos == "NOUN" and nnext_object.form in accepted_nouns and \
-					((determiner_object.deprel == "" or determiner_object.head == nnext_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == nnext_object.id) or \
-					(next_object.deprel == "" or next_object.head == nnext_object.id))
-				):                                                                      # DET ADV ADV NOUN case
+		if pos[c_id-2] == pmaps.DET:                                               # DET ? ADV ? case
 
-					noun_object = nnext_object
-					adverb_object.form = adverb_object.form + " " + next_object.form
-					ngramtype = "DET ADV NOUN"
-					sentence_portion_right = sentence.sentence[c_id+3:min(len(sentence.sentence), c_id+3+ctx+1)]
-					occurrence = [sentence.sentence[c_id-1],
-								sentence.sentence[c_id],
-								sentence.sentence[c_id+2]]
+			# the left context stops before the determiner, even when it is not part of the match
+			left_end = c_id-2
 
-				elif (
-					next_object.pos == "ADJ" and \
-					nnext_object.pos == "NOUN" and nnext_object.form in accepted_nouns and \
-					((determiner_object.deprel == "" or determiner_object.head == nnext_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == nnext_object.id))
-				):                                                                      # DET ADV ADJ NOUN case
+			d_id = c_id-2
 
-					noun_object = nnext_object
-					# adj_object = next_object
-					ngramtype = "DET ADV ADJ NOUN"
+			if (
+				pos[c_id-1] == pmaps.ADJ and \
+				pos[c_id+1] == pmaps.NOUN and forms[c_id+1] in accepted_nouns and \
+				((deprels[d_id] == "" or heads[d_id] == ids[c_id+1]) or \
+				(deprels[c_id] == "" or heads[c_id] == ids[c_id+1]))
+			):                                                                      # DET ADJ ADV NOUN case
 
-					# sentence_portion_right = sentence.sentence[c_id+3:min(len(sentence.sentence), c_id+3+ctx+1)]
-					# occurrence = sentence.sentence[c_id-1:c_id+3]
+				pattern_n = 2
+				n_id = c_id+1
+				sentence_portion_right = (c_id+2, min(n_tokens, c_id+1+ctx+1))
+				occurrence = (c_id-2, c_id-1, c_id, c_id+1)
 
+		if pattern_n is None:
+			continue
 
-			if pprevious_object.pos == "DET":                                           # DET ? ADV ? case
+		adverb = forms[c_id]
+		if adverb not in accepted_adverbs:
+			continue
 
-				determiner_object = pprevious_object
-				sentence_portion_left = sentence.sentence[max(0, c_id-2-ctx):c_id-2]
+		pattern = patterns[pattern_n]
+		if match_counts is not None:
+			match_counts[pattern] = match_counts.get(pattern, 0) + 1
 
-				if (
-					previous_object.pos == "ADJ" and \
-					next_object.pos == "NOUN" and next_object.form in accepted_nouns and \
-					((determiner_object.deprel == "" or determiner_object.head == next_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == next_object.id))
-				):                                                                      # DET ADJ ADV NOUN case
+		ctx_left = " ".join(forms[max(0, left_end-ctx):left_end])
+		candidate_str = " ".join([forms[tok_id] for tok_id in occurrence])
+		ctx_right = " ".join(forms[sentence_portion_right[0]:sentence_portion_right[1]])
 
-					noun_object = next_object
-					# adj_object = previous_object
-					ngramtype = "DET ADJ ADV NOUN"
+		writers.write((construction.name, adverb),
+					  f"{source}\t{adverb}\t{forms[n_id]}\t{pattern.name}\t{ctx_left}\t{candidate_str}\t{ctx_right}")
 
-					sentence_portion_right = sentence.sentence[c_id+2:min(len(sentence.sentence), c_id+1+ctx+1)]
-					occurrence = sentence.sentence[c_id-2:c_id+2]
 
-			if adverb_object.form in accepted_adverbs:
-				if sentence_portion_left is not None and sentence_portion_right is not None:
-					ctx_left = " ".join([token.form for token in sentence_portion_left])
-					candidate_str = " ".join([token.form for token in occurrence])
-					ctx_right = " ".join([token.form for token in sentence_portion_right])
+def extract_ctx_detADVN(filename, source,
+						accepted_adverbs, accepted_nouns,
+						ctx,
+						writers):
+	"""
+	The function `extract_ctx_detADVN` takes in a filename, source, accepted nouns, accepted adverbs,
+	context, and the writers of the output files. It processes sentences to extract specific patterns
+	involving adverbs, nouns, and determiners, and writes the extracted information to output files.
 
-					if not adverb_object.form in output_files:
-						output_files[adverb_object.form] = open(
-							output_dir.joinpath(f"{adverb_object.form}.contexts.tsv"),
-							"w",
-							encoding="utf-8")
+	Args:
+	  filename: The `filename` parameter in the `extract_ctx_detADVN` function is the name of the file
+	from which the sentences will be read for processing.
+	  source: The `source` parameter in the `extract_ctx_detADVN` function is a string
+	representing the source of the data from which you are extracting contexts for adverbs and nouns.
+	  accepted_nouns: Accepted_nouns is a list of accepted noun forms that the function will use to
+	filter out nouns in the input data.
+	  accepted_adverbs: The `accepted_adverbs` parameter in the `extract_ctx_detADVN` function is a list
+	of adverbs that are considered acceptable for extraction. These adverbs are used to filter out
+	adverbs that are not of interest for the extraction process.
+	  ctx: The `ctx` parameter in the `extract_ctx_detADVN` function represents the context size, which
+	determines how many tokens to consider on the left and right sides of the adverb in a sentence when
+	extracting information. It is used to define the window size for capturing the surrounding context
+	of the adverb-noun pattern
+	  writers: The `writers.WriterPool` of the output files, created by `contexts_writers` with the
+	output folder of construction "ngram". Files are named after adverbs.
+	"""
 
-					print(f"{source}\t{adverb_object.form}\t{noun_object.form}\t" \
-						f"{ngramtype}\t{ctx_left}\t{candidate_str}\t{ctx_right}",
-						file=output_files[adverb_object.form])
+	extract_ctx(filename, source, NGRAM_MATCHER,
+				{"ngram": {"nouns": accepted_nouns, "adverbs": accepted_adverbs}}, ctx, writers)
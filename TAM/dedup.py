@@ -0,0 +1,262 @@
+"""
+This python module removes repeated sentences (e.g., the boilerplate of crawled corpora such as
+ItWaC) from a stream of sentences, before they reach the counting and extraction steps.
+
+Two modes are available:
+- "exact": a sentence is dropped if the same sequence of forms (lowercased, see `sentence_key`) was
+seen before;
+- "near": in addition, a sentence is dropped if it is a near-duplicate of a sentence seen before,
+through MinHash signatures of its shingles (sequences of `SHINGLE_SIZE` forms) and locality
+sensitive hashing: the signature is split into `BANDS` bands, and a sentence is a near-duplicate if
+any of its bands was seen before. Sentences whose shingles have a Jaccard similarity of about 0.8
+or more are likely to share a band.
+
+Seen sentences and bands are stored in Bloom filters, whose memory is fixed by their capacity, so
+that a few sentences may be wrongly dropped, with probability `error_rate`. Filters can be saved to
+a file and loaded by later runs, which then drop the sentences seen by previous runs as well.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+
+# number of forms of a shingle, and of hash functions of MinHash signatures
+SHINGLE_SIZE = 3
+BANDS = 8
+ROWS = 8
+
+# default number of sentences the Bloom filters are sized for, and their false positive rate: about
+# 24 bits per key, i.e. 30 MB for 10M sentences in "exact" mode, and 9 times as much in "near" mode
+CAPACITY = 10000000
+ERROR_RATE = 1e-5
+
+# Mersenne prime used by the hash functions of MinHash signatures
+_PRIME = (1 << 61) - 1
+_rng = random.Random(42)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(BANDS * ROWS)]
+
+MODES = ("exact", "near")
+
+
+def _digest(data, size=8):
+	return int.from_bytes(hashlib.blake2b(data, digest_size=size).digest(), "little")
+
+
+def sentence_key(sentence):
+	"""
+	The function `sentence_key` returns the normalized sequence of forms of a `ColumnarSentence`,
+	encoded as bytes: forms are lowercased and separated by a single space.
+	"""
+
+	return " ".join(form.lower() for form in sentence.forms).encode("utf-8")
+
+
+def minhash(forms):
+	"""
+	The function `minhash` returns the MinHash signature (`BANDS * ROWS` integers) of the shingles
+	of a list of forms, or `None` if there are fewer than `SHINGLE_SIZE` forms.
+	"""
+
+	if len(forms) < SHINGLE_SIZE:
+		return None
+
+	shingles = {_digest(" ".join(forms[n:n+SHINGLE_SIZE]).encode("utf-8"))
+				for n in range(len(forms) - SHINGLE_SIZE + 1)}
+
+	return [min((a * shingle + b) % _PRIME for shingle in shingles) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature):
+	"""
+	The function `band_keys` returns the keys of the bands of a MinHash signature.
+	"""
+
+	return [struct.pack(f"<H{ROWS}Q", band_n, *signature[band_n*ROWS:(band_n+1)*ROWS])
+			for band_n in range(BANDS)]
+
+
+class BloomFilter:
+	"""
+	The BloomFilter class is a set of byte strings of fixed memory, whose membership test may give
+	false positives (with probability `error_rate` when `capacity` keys were added), but no false
+	negatives.
+	"""
+
+	def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE):
+		"""
+		This function initializes an empty filter.
+
+		Args:
+		  capacity: The number of keys the filter is sized for.
+		  error_rate: The false positive rate of the filter when it holds `capacity` keys.
+		"""
+
+		self.capacity = capacity
+		self.error_rate = error_rate
+		self.n_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+		self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+		self.bits = bytearray((self.n_bits + 7) // 8)
+		self.n_keys = 0
+
+	def _positions(self, key):
+		# double hashing: the i-th position is h1 + i*h2
+		digest = _digest(key, 16)
+		h1, h2 = digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+		return [(h1 + n * h2) % self.n_bits for n in range(self.n_hashes)]
+
+	def __contains__(self, key):
+		bits = self.bits
+		return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+	def add(self, key):
+		"""
+		The function `add` adds `key` to the filter, and returns whether it was (probably) already
+		in it.
+		"""
+
+		bits = self.bits
+		present = True
+		for position in self._positions(key):
+			byte, mask = position >> 3, 1 << (position & 7)
+			if not bits[byte] & mask:
+				bits[byte] |= mask
+				present = False
+
+		if not present:
+			self.n_keys += 1
+		return present
+
+	def header(self):
+		return {"capacity": self.capacity, "error_rate": self.error_rate, "n_bits": self.n_bits,
+				"n_hashes": self.n_hashes, "n_keys": self.n_keys}
+
+	@classmethod
+	def from_header(cls, header, bits):
+		bloom = cls.__new__(cls)
+		bloom.capacity = header["capacity"]
+		bloom.error_rate = header["error_rate"]
+		bloom.n_bits = header["n_bits"]
+		bloom.n_hashes = header["n_hashes"]
+		bloom.n_keys = header["n_keys"]
+		bloom.bits = bytearray(bits)
+		return bloom
+
+
+class Deduplicator:
+	"""
+	The Deduplicator class tells whether sentences were seen before, and keeps count of the
+	duplicates found.
+	"""
+
+	def __init__(self, mode="exact", capacity=CAPACITY, error_rate=ERROR_RATE):
+		"""
+		This function initializes a deduplicator that has seen no sentence.
+
+		Args:
+		  mode: "exact" or "near" (see the description of the module).
+		  capacity: The number of sentences the Bloom filters are sized for.
+		  error_rate: The probability that a new sentence is wrongly dropped, once `capacity`
+		sentences were seen.
+		"""
+
+		if mode not in MODES:
+			raise ValueError(f"Unknown deduplication mode: {mode}")
+
+		self.mode = mode
+		self.sentences = BloomFilter(capacity, error_rate)
+		# each sentence adds `BANDS` keys
+		self.bands = BloomFilter(capacity * BANDS, error_rate) if mode == "near" else None
+		self.counts = {"sentences": 0, "exact": 0, "near": 0}
+		# identifiers of the corpus files whose sentences were seen (see `checkpoint.file_state`)
+		self.files = []
+
+	def is_duplicate(self, sentence):
+		"""
+		The function `is_duplicate` tells whether a `ColumnarSentence` is a duplicate of a sentence
+		seen before, and records it as seen.
+		"""
+
+		self.counts["sentences"] += 1
+
+		if self.sentences.add(sentence_key(sentence)):
+			self.counts["exact"] += 1
+			return True
+
+		if self.bands is None:
+			return False
+
+		signature = minhash([form.lower() for form in sentence.forms])
+		if signature is None:
+			return False
+
+		# all bands are added, so that later near-duplicates of this sentence are found too
+		seen = [self.bands.add(key) for key in band_keys(signature)]
+		if any(seen):
+			self.counts["near"] += 1
+			return True
+
+		return False
+
+	def save(self, filename):
+		"""
+		The function `save` writes the state of the deduplicator to `filename`: a JSON header on the
+		first line, then the bits of the filters.
+		"""
+
+		filters = [self.sentences] if self.bands is None else [self.sentences, self.bands]
+		header = {"mode": self.mode, "files": self.files, "filters": [bloom.header() for bloom in filters]}
+
+		with open(f"{filename}.tmp", "wb") as fout:
+			fout.write(json.dumps(header).encode("utf-8") + b"\n")
+			for bloom in filters:
+				fout.write(bloom.bits)
+		os.replace(f"{filename}.tmp", filename)
+
+	@classmethod
+	def load(cls, filename):
+		"""
+		The function `load` reads the state of a deduplicator written by `save`.
+		"""
+
+		with open(filename, "rb") as fin:
+			header = json.loads(fin.readline())
+			filters = [BloomFilter.from_header(bloom, fin.read((bloom["n_bits"] + 7) // 8))
+					   for bloom in header["filters"]]
+
+		deduplicator = cls.__new__(cls)
+		deduplicator.mode = header["mode"]
+		deduplicator.sentences = filters[0]
+		deduplicator.bands = filters[1] if len(filters) > 1 else None
+		deduplicator.counts = {"sentences": 0, "exact": 0, "near": 0}
+		deduplicator.files = header["files"]
+		return deduplicator
+
+
+def open_deduplicator(mode, state_filename=None, capacity=CAPACITY, error_rate=ERROR_RATE):
+	"""
+	The function `open_deduplicator` returns a `Deduplicator`, loaded from `state_filename` if the
+	file exists (with the capacity and error rate it was created with). A state can only be used in
+	the mode it was saved in: the bands of the sentences seen in "exact" mode are unknown.
+	"""
+
+	if state_filename is None or not os.path.exists(state_filename):
+		return Deduplicator(mode, capacity, error_rate)
+
+	deduplicator = Deduplicator.load(state_filename)
+	if deduplicator.mode != mode:
+		raise ValueError(f"Deduplication state {state_filename} was saved in {deduplicator.mode} mode")
+
+	return deduplicator
+
+
+def deduplicate(sentences, deduplicator):
+	"""
+	The function `deduplicate` yields the sentences of `sentences` that are not duplicates of
+	sentences seen before by `deduplicator`.
+	"""
+
+	for sentence in sentences:
+		if not deduplicator.is_duplicate(sentence):
+			yield sentence
@@ -0,0 +1,86 @@
+"""
+This python module collects diagnostics about the lines of a corpus file that cannot be parsed
+(e.g., tokens with a missing column on noisy web corpora). Instead of logging each of them, the
+readers of `TAM.utils` count them by reason, keeping at most a few sample lines per reason, and log
+a single summary at the end of each file.
+"""
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# maximum number of sample lines kept for each reason
+MAX_SAMPLES = 5
+
+# maximum length (in characters) of a sample line
+SAMPLE_LENGTH = 200
+
+
+class ParseDiagnostics:
+	"""
+	The ParseDiagnostics class counts the malformed lines of a corpus file (or of a byte range of
+	it), by reason.
+	"""
+
+	def __init__(self, source, filename, max_samples=MAX_SAMPLES):
+		"""
+		This function initializes empty counters.
+
+		Args:
+		  source: The name of the corpus format (e.g., "itwac"), reported in the summary.
+		  filename: The path to the corpus file, reported in the summary.
+		  max_samples: The maximum number of sample lines kept for each reason.
+		"""
+
+		self.source = source
+		self.filename = filename
+		self.max_samples = max_samples
+
+		self.counts = collections.Counter()
+		self.samples = collections.defaultdict(list)
+
+	def add(self, reason, offset, line):
+		"""
+		The function `add` counts a malformed line, keeping it as a sample if fewer than
+		`max_samples` lines were kept for `reason`.
+
+		Args:
+		  reason: A short description of the problem, e.g. "missing head or deprel".
+		  offset: The byte offset of the line in the file.
+		  line: The line, as read from the file.
+		"""
+
+		self.counts[reason] += 1
+
+		samples = self.samples[reason]
+		if len(samples) < self.max_samples:
+			samples.append((offset, line.rstrip("\r\n")[:SAMPLE_LENGTH]))
+
+	def summary(self):
+		"""
+		The function `summary` returns the counts and the samples of each reason, as a dictionary
+		that can be serialized to JSON, e.g.
+		`{"wrong number of columns": {"count": 12, "samples": [[1024, "..."], ...]}}`.
+		"""
+
+		return {reason: {"count": count, "samples": [list(sample) for sample in self.samples[reason]]}
+				for reason, count in sorted(self.counts.items())}
+
+	def report(self, stats=None):
+		"""
+		The function `report` logs a summary of the malformed lines, if any, and stores it under the
+		"malformed" key of `stats` (see `utils.read`).
+		"""
+
+		if stats is not None:
+			stats["malformed"] = self.summary()
+
+		if not self.counts:
+			return
+
+		logger.warning("Ignored %d malformed lines of %s (%s)", sum(self.counts.values()),
+					   self.filename, self.source)
+		for reason, count in sorted(self.counts.items()):
+			logger.warning("  %s: %d lines, e.g.", reason, count)
+			for offset, line in self.samples[reason]:
+				logger.warning("    at byte %d: %r", offset, line)
@@ -0,0 +1,223 @@
+"""
+This python module converts corpora into a compact binary format that `utils.read` opens through
+memory maps, so that later runs do not need to decode and split the original text again.
+
+An encoded corpus is a folder (`*.tam` by convention) containing:
+- `meta.json`: format version, source and sizes
+- `forms.vocab`, `lemmas.vocab`, `deprels.vocab`: one string per line, the line number being the code
+- `forms.bin`, `lemmas.bin`, `deprels.bin`: one unsigned 32-bit code per token
+- `pos.bin`: one unsigned 8-bit part of speech code per token (see `pos_maps.UPOS`)
+- `ids.bin`, `heads.bin`: one signed 32-bit integer per token
+- `sentences.bin`: signed 64-bit offset of the first token of each sentence, plus the total number of
+tokens
+
+Integers are stored in native byte order.
+"""
+import array
+import json
+import mmap
+import os
+from pathlib import Path
+
+import TAM.objects as objs
+
+FORMAT_VERSION = 1
+
+# name of each column, with the typecode used to store it
+COLUMNS = {"forms": "I", "lemmas": "I", "deprels": "I", "pos": "B", "ids": "i", "heads": "i"}
+VOCABULARIES = ("forms", "lemmas", "deprels")
+
+# number of tokens buffered in memory before being flushed to disk
+CHUNK_SIZE = 1000000
+
+
+def is_encoded(path):
+	"""
+	The function `is_encoded` checks whether `path` is a corpus encoded by `encode`.
+	"""
+
+	return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def load_meta(path):
+	"""
+	The function `load_meta` returns the metadata (a dictionary) of an encoded corpus.
+	"""
+
+	with open(os.path.join(path, "meta.json"), encoding="utf-8") as fin:
+		return json.load(fin)
+
+
+def encode(sentences, output_path, source):
+	"""
+	The function `encode` writes a stream of sentences as an encoded corpus.
+
+	Args:
+	  sentences: An iterable of `ColumnarSentence` objects, typically the output of `utils.read`.
+	  output_path: The folder where the encoded corpus is written (created if missing).
+	  source: The identifier of the original corpus format, as used by `utils.read`.
+
+	Returns:
+	  The metadata of the encoded corpus.
+	"""
+
+	output_path = Path(output_path)
+	output_path.mkdir(parents=True, exist_ok=True)
+
+	vocabularies = {name: {} for name in VOCABULARIES}
+	buffers = {name: array.array(typecode) for name, typecode in COLUMNS.items()}
+	files = {name: open(output_path.joinpath(f"{name}.bin"), "wb") for name in COLUMNS}
+	sentence_offsets = array.array("q")
+
+	n_tokens = 0
+	sentence_source = source.lower()
+
+	try:
+		for sentence in sentences:
+			sentence_offsets.append(n_tokens)
+			n_tokens += len(sentence)
+			sentence_source = sentence.source
+
+			for name in VOCABULARIES:
+				vocabulary = vocabularies[name]
+				buffer = buffers[name]
+				for string in getattr(sentence, name):
+					code = vocabulary.get(string)
+					if code is None:
+						code = vocabulary[string] = len(vocabulary)
+					buffer.append(code)
+
+			buffers["pos"].frombytes(sentence.pos)
+			buffers["ids"].fromlist(sentence.ids.tolist())
+			buffers["heads"].fromlist(sentence.heads.tolist())
+
+			if len(buffers["pos"]) >= CHUNK_SIZE:
+				for name, buffer in buffers.items():
+					buffer.tofile(files[name])
+					del buffer[:]
+
+		for name, buffer in buffers.items():
+			buffer.tofile(files[name])
+	finally:
+		for fout in files.values():
+			fout.close()
+
+	sentence_offsets.append(n_tokens)
+	with open(output_path.joinpath("sentences.bin"), "wb") as fout:
+		sentence_offsets.tofile(fout)
+
+	for name, vocabulary in vocabularies.items():
+		with open(output_path.joinpath(f"{name}.vocab"), "w", encoding="utf-8", newline="\n") as fout:
+			for string in vocabulary:
+				print(string, file=fout)
+
+	meta = {"version": FORMAT_VERSION,
+			"source": source,
+			"sentence_source": sentence_source,
+			"n_sentences": len(sentence_offsets) - 1,
+			"n_tokens": n_tokens,
+			"vocabularies": {name: len(vocabulary) for name, vocabulary in vocabularies.items()}}
+
+	with open(output_path.joinpath("meta.json"), "w", encoding="utf-8") as fout:
+		json.dump(meta, fout, indent=1)
+
+	return meta
+
+
+def load_vocabulary(path, name):
+	"""
+	The function `load_vocabulary` returns the list of strings of vocabulary `name` ("forms",
+	"lemmas" or "deprels") of an encoded corpus, indexed by code.
+	"""
+
+	with open(os.path.join(path, f"{name}.vocab"), encoding="utf-8", newline="") as fin:
+		return fin.read().split("\n")[:-1]
+
+
+def corpus_size(path):
+	"""
+	The function `corpus_size` returns the total size in bytes of the columns of an encoded corpus.
+	"""
+
+	return sum(os.path.getsize(os.path.join(path, f"{name}.bin")) for name in COLUMNS)
+
+
+def load_sentence_offsets(path):
+	"""
+	The function `load_sentence_offsets` returns the `array` of sentence offsets of an encoded corpus.
+	"""
+
+	offsets = array.array("q")
+	with open(os.path.join(path, "sentences.bin"), "rb") as fin:
+		offsets.frombytes(fin.read())
+
+	return offsets
+
+
+def read_encoded(path, start=0, end=None, predicate=None, forms_only=False):
+	"""
+	The function `read_encoded` yields the sentences of an encoded corpus as `ColumnarSentence`
+	objects. Columns are memory-mapped: integer columns are copied into each sentence as raw bytes,
+	strings are looked up in the vocabularies.
+
+	Args:
+	  path: The folder of the encoded corpus.
+	  start: Index of the first sentence to be read.
+	  end: Index of the sentence at which reading stops, `None` to read until the last sentence.
+	  predicate: An optional function taking the part of speech column of a sentence (see
+	`TAM.prefilter.Prefilter.pos_predicate`) and returning `False` if the sentence can be skipped
+	before its other columns are looked up.
+	  forms_only: If `True`, only the forms and part of speech codes of sentences are read, and their
+	other columns are left empty.
+	"""
+
+	meta = load_meta(path)
+	if meta["version"] != FORMAT_VERSION:
+		raise ValueError(f"Unsupported encoded corpus version: {meta['version']}")
+
+	if meta["n_tokens"] == 0:
+		return
+
+	offsets = load_sentence_offsets(path)
+	vocabularies = {name: load_vocabulary(path, name) for name in VOCABULARIES}
+	sentence_source = meta["sentence_source"]
+
+	files = {}
+	maps = {}
+	views = {}
+	try:
+		for name, typecode in COLUMNS.items():
+			files[name] = open(os.path.join(path, f"{name}.bin"), "rb")
+			maps[name] = mmap.mmap(files[name].fileno(), 0, access=mmap.ACCESS_READ)
+			views[name] = memoryview(maps[name]).cast(typecode)
+
+		forms_view, forms_vocab = views["forms"], vocabularies["forms"]
+		lemmas_view, lemmas_vocab = views["lemmas"], vocabularies["lemmas"]
+		deprels_view, deprels_vocab = views["deprels"], vocabularies["deprels"]
+		pos_view, ids_view, heads_view = views["pos"], views["ids"], views["heads"]
+
+		if end is None:
+			end = len(offsets) - 1
+
+		for sentence_n in range(start, end):
+			first, last = offsets[sentence_n], offsets[sentence_n+1]
+			if predicate is not None and not predicate(pos_view[first:last]):
+				continue
+
+			sentence = objs.ColumnarSentence(source=sentence_source)
+			sentence.forms = list(map(forms_vocab.__getitem__, forms_view[first:last]))
+			sentence.pos = bytearray(pos_view[first:last])
+			if not forms_only:
+				sentence.lemmas = list(map(lemmas_vocab.__getitem__, lemmas_view[first:last]))
+				sentence.deprels = list(map(deprels_vocab.__getitem__, deprels_view[first:last]))
+				sentence.ids = array.array("i", ids_view[first:last].tobytes())
+				sentence.heads = array.array("i", heads_view[first:last].tobytes())
+
+			yield sentence
+	finally:
+		for view in views.values():
+			view.release()
+		for mapped in maps.values():
+			mapped.close()
+		for fin in files.values():
+			fin.close()
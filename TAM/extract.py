@@ -1,9 +1,257 @@
-import collections
+import os
+
 import tqdm
 
+import TAM.matcher as matcher
+import TAM.metrics as metrics
+import TAM.parallel as parallel
+import TAM.pos_maps as pmaps
+import TAM.prefilter as prefilter
+import TAM.sketch as sketch
 import TAM.utils as utils
+import TAM.vocabulary as vocab
+
+ACCEPTED_CHARS = "abcdefghijklmnopqrstuvwxyzàèéìòù"
+
+# matchers of the built-in constructions of `patterns.yaml`, compiled once for the helpers of each
+# construction below
+COMPOUND_MATCHER = matcher.load_patterns(names=("compound",))
+NGRAM_MATCHER = matcher.load_patterns(names=("ngram",))
+
+
+def new_counters(*names, pairs=(), approximate=None):
+	"""
+	This function creates empty counters: a dictionary mapping each of `names` (the suffixes of the
+	output files, e.g. "nouns") to a `vocabulary.FrequencyTable`, or to a `vocabulary.PairTable` for
+	the names listed in `pairs`. All frequency tables share the same `vocabulary.Vocabulary`.
+
+	With `approximate`, a dictionary of arguments of `sketch.new_table` (e.g., `{"capacity": 100000}`),
+	tables are `sketch.ApproximateTable` objects instead, whose memory does not grow with the number
+	of keys.
+	"""
+
+	if approximate is not None:
+		return {name: sketch.new_table(name in pairs, **approximate) for name in names}
+
+	vocabulary = vocab.Vocabulary()
+
+	return {name: vocab.PairTable() if name in pairs else vocab.FrequencyTable(vocabulary)
+			for name in names}
+
+
+def is_accepted_noun(form):
+	"""
+	This function checks whether a noun is composed by alphabetic characters, or characters in the
+	set (-, ., " "), with at least one alphabetic character.
+	"""
+
+	return all(c.lower() in ACCEPTED_CHARS or c in ["-", ".", " "] for c in form) and \
+		any(c not in ["-", ".", " "] for c in form)
+
+
+def new_construction_counters(construction, approximate=None):
+	"""
+	This function creates empty counters for the frequency tables of a `matcher.Construction`,
+	approximate ones with `approximate` (see `new_counters`).
+	"""
+
+	return new_counters(*construction.tables, pairs=construction.pairs, approximate=approximate)
+
+
+def process_matches(pattern_matcher, sentence, accepted, counters, match_counts=None):
+	"""
+	This function counts the matches of the patterns of one or more constructions in a single
+	sentence.
+
+	Args:
+	  pattern_matcher: The `matcher.Matcher` whose patterns are matched.
+	  sentence: The `ColumnarSentence` to be processed.
+	  accepted: A dictionary mapping each construction name to the lists (e.g., "nouns") used by the
+	`accept` constraints of its patterns. Constructions missing from `accepted` are not counted.
+	  counters: A dictionary mapping each construction name to its counters, as created by
+	`new_construction_counters`.
+	  match_counts: An optional dictionary where the matches of each `matcher.Pattern` are counted
+	(see `TAM.metrics`).
+	"""
+
+	# the built-in "ngram" construction is counted by its hand-written loop
+	ngram = pattern_matcher.ngram
+	if ngram is not None and ngram in accepted and "nouns" in accepted[ngram]:
+		process_detADVN(sentence, accepted[ngram]["nouns"], counters[ngram], match_counts,
+						pattern_matcher.constructions[ngram])
+		if len(accepted) == 1:
+			return
+		accepted = {name: lists for name, lists in accepted.items() if name != ngram}
+
+	for match in pattern_matcher.matches(sentence, accepted):
+		if match_counts is not None:
+			match_counts[match.pattern] = match_counts.get(match.pattern, 0) + 1
+
+		construction_counters = counters[match.pattern.construction]
+		fields = match.fields
+
+		for table, field in match.pattern.counts:
+			if isinstance(field, tuple):
+				construction_counters[table].add(fields[field[0]], fields[field[1]])
+			else:
+				construction_counters[table].add(fields[field])
+
+
+def count_construction(filename, source, name, accepted_nouns, patterns=matcher.DEFAULT_PATTERNS,
+					   approximate=None, start=0, end=None):
+	"""
+	This function counts the matches of the patterns of a construction in a given file (or in a byte
+	range of it), based on a list of accepted nouns.
+
+	Args:
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  name: The name of the construction, e.g. "compound" or "ngram".
+	  accepted_nouns: The set of accepted nouns, bound to the "nouns" list of `accept` constraints.
+	  patterns: The path to the pattern specification file (see `TAM.matcher`).
+	  approximate: The arguments of `sketch.new_table` if frequencies are counted approximately in
+	bounded memory, `None` for exact counts.
+	  start: Byte offset of the sentence boundary from which reading starts (see `utils.read`).
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
+
+	Returns:
+	  A dictionary mapping the suffix of each output file (the tables of the construction) to the
+	corresponding frequency counts.
+	"""
+
+	pattern_matcher = matcher.load_patterns(patterns, (name,))
+	counters = new_construction_counters(pattern_matcher.constructions[name], approximate)
+	accepted = {name: {"nouns": accepted_nouns}}
+
+	# sentences in which no pattern can match are not parsed
+	sentence_filter = prefilter.Prefilter(pattern_matcher)
+
+	with metrics.scan("extract", filename, source, start, end) as file_scan:
+		sentences = file_scan.sentences(utils.read(filename, source, start, end, file_scan.reader_stats,
+												   sentence_filter))
+		for sentence in tqdm.tqdm(sentences):
+			process_matches(pattern_matcher, sentence, accepted, {name: counters}, file_scan.matches)
+
+	return counters
+
+
+def write_construction(construction, counters, source, file_id, output_directory):
+	"""
+	This function saves the frequency counts of a construction in separate output files, one for
+	each table, in the order given by the `sort` setting of the construction. Pairs are written
+	joined by a space. Approximate tables are also saved next to their frequency lists (see
+	`save_sketch`).
+
+	Args:
+	  construction: The `matcher.Construction` the counts refer to.
+	  counters: The dictionary returned by `count_construction` (or a reduction of several of them).
+	  source: The source of the data from which the construction was extracted.
+	  file_id: The identifier of the processed file, used in naming the output files.
+	  output_directory: The directory where `{source}_{file_id}.{table}.tsv` files are saved.
+	"""
+
+	for table in construction.tables:
+		items = counters[table].items()
+		if construction.sort == "frequency":
+			items = [(key, f) for key, f in sorted(items, key=lambda x: -x[1]) if f > 0]
+
+		output_file = output_directory.joinpath(f"{source}_{file_id}.{table}.tsv")
+		with open(output_file, "w", encoding="utf-8") as fout:
+			for key, f in items:
+				if not isinstance(key, str):
+					key = " ".join(key)
+				print(f"{f}\t{key}", file=fout)
+
+		save_sketch(counters[table], output_file)
+
+
+def save_sketch(freqs, output_file):
+	"""
+	This function saves an approximate frequency table (see `TAM.sketch`) next to the frequency list
+	`output_file` it was written to, e.g. to `ITWAC_0.nouns.sketch` for `ITWAC_0.nouns.tsv`, so that
+	the `merge` step merges the tables instead of the lists. Exact tables are not saved, and the
+	table left by a previous approximate run is removed, since it no longer matches the list.
+	"""
+
+	if not isinstance(freqs, sketch.ApproximateTable):
+		remove_sketch(output_file)
+		return
+
+	freqs.save(sketch.sketch_filename(output_file))
+
+	bounds = freqs.bounds()
+	utils.logger.info("%s: approximate frequencies (total %d), overestimated by at most %d with "
+					  "probability %.3f; all keys above %d are listed", output_file, bounds["total"],
+					  bounds["overestimate"], bounds["probability"], bounds["guaranteed"])
+
+
+def remove_sketch(output_file):
+	"""
+	This function removes the approximate frequency table saved next to the frequency list
+	`output_file` (see `save_sketch`), if any.
+	"""
+
+	try:
+		os.remove(sketch.sketch_filename(output_file))
+	except FileNotFoundError:
+		pass
+
+
+def process_advN(sentence, accepted_nouns, counters):
+	"""
+	This function counts the compound nouns, prefixes, and base nouns of a single sentence, based on a
+	list of accepted nouns (see the "compound" construction in `patterns.yaml`).
+
+	Args:
+	  sentence: The `ColumnarSentence` to be processed.
+	  accepted_nouns: The set of accepted base nouns.
+	  counters: The counters to be updated, as created by `new_counters("compounds", "prefs", "nouns")`.
+	"""
+
+	process_matches(COMPOUND_MATCHER, sentence,
+					{"compound": {"nouns": accepted_nouns}}, {"compound": counters})
+
+
+def count_advN(filename, source, accepted_nouns, start=0, end=None):
+	"""
+	This function counts compound nouns, prefixes, and base nouns in a given file (or in a byte range
+	of it), based on a list of accepted nouns.
+
+	Args:
+	  filename: The `filename` parameter (corpus) is the name of the file from which you are extracting
+	adverbs and nouns compounds.
+	  source: The `source` parameter in the function is a string
+	representing the source of the data from which you are extracting compounds.
+	  accepted_nouns: Accepted_nouns is a list of nouns that have been approved or allowed for
+	extraction.
+	  start: Byte offset of the sentence boundary from which reading starts (see `utils.read`).
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
+
+	Returns:
+	  A dictionary mapping the suffix of each output file ("compounds", "prefs" and "nouns") to the
+	corresponding frequency counts.
+	"""
+
+	return count_construction(filename, source, "compound", accepted_nouns, start=start, end=end)
+
+
+def write_advN(counters, source, file_id, output_directory):
+	"""
+	This function saves the frequency counts returned by `count_advN` in separate output files.
+
+	Args:
+	  counters: The dictionary returned by `count_advN` (or a reduction of several of them).
+	  source: The source of the data from which compounds were extracted.
+	  file_id: The identifier of the processed file, used in naming the output files.
+	  output_directory: The directory where `{source}_{file_id}.compounds.tsv`,
+	`{source}_{file_id}.prefs.tsv`, and `{source}_{file_id}.nouns.tsv` are saved.
+	"""
 
-def extract_advN(filename, source, file_id, accepted_nouns, output_directory):
+	construction = COMPOUND_MATCHER.constructions["compound"]
+	write_construction(construction, counters, source, file_id, output_directory)
+
+
+def extract_advN(filename, source, file_id, accepted_nouns, output_directory, n_shards=1):
 	"""
 	This function extracts and counts compound nouns, prefixes, and base nouns from a given
 	file, based on a list of accepted nouns, and saves the frequency counts in separate output files.
@@ -22,39 +270,152 @@ def extract_advN(filename, source, file_id, accepted_nouns, output_directory):
 	  output_directory: The `output_directory` parameter in the `extract_advN` function is the directory
 	where the output files will be saved. It is the location where the generated files such as
 	`{source}_{file_id}.compounds.tsv`, `{source}_{file_id}.prefs.tsv`, and `{source}_{file_id}.nouns.tsv`
+	  n_shards: The number of byte ranges in which the file is split and scanned by parallel worker
+	processes (see `TAM.index`), 1 by default.
 	"""
 
-	freqs = collections.defaultdict(int)
+	counters = parallel.scan_shards(count_advN, filename, source, n_shards, accepted_nouns)
+	write_advN(counters, source, file_id, output_directory)
 
-	prefs_freqs = collections.defaultdict(int)
-	nouns_freqs = collections.defaultdict(int)
 
-	for sentence in tqdm.tqdm(utils.read(filename, source)):
-		for token in sentence.sentence:
-			if token.pos == "NOUN" and "-" in token.form:
-				formsplit = token.form.rsplit("-", 1)
-				if formsplit[1] in accepted_nouns:
-					freqs[token.form] += 1
-					prefs_freqs[formsplit[0]] += 1
-					nouns_freqs[formsplit[1]] += 1
+def process_detADVN(sentence, accepted_nouns, counters, match_counts=None, construction=None):
+	"""
+	This function counts the adverb-noun pairs of a single sentence, based on specific patterns (see
+	the "ngram" construction in `patterns.yaml`) and a list of accepted nouns. When two adverbs are
+	matched, they are counted as a single one, joined by a space.
 
-	with open(output_directory.joinpath(f"{source}_{file_id}.compounds.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in freqs.items():
-			print(f"{f}\t{key}", file=fout)
+	The patterns are checked by hand, at a lower cost per candidate than by `matcher.Matcher`, and
+	`process_matches` counts the construction with this loop as long as its specification is left
+	unchanged (see `matcher.NGRAM_DIGEST`).
 
-	with open(output_directory.joinpath(f"{source}_{file_id}.prefs.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in prefs_freqs.items():
-			print(f"{f}\t{key}", file=fout)
+	Args:
+	  sentence: The `ColumnarSentence` to be processed.
+	  accepted_nouns: The set of accepted nouns.
+	  counters: The counters to be updated, as created by
+	`new_counters("ngrams", "adverbs", "nouns", pairs=("ngrams",))`.
+	  match_counts: An optional dictionary where the matches of each `matcher.Pattern` are counted
+	(see `TAM.metrics`).
+	  construction: The `matcher.Construction` whose patterns are the keys of `match_counts`, the
+	"ngram" construction of `NGRAM_MATCHER` if `None`.
+	"""
 
-	with open(output_directory.joinpath(f"{source}_{file_id}.nouns.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in nouns_freqs.items():
-			print(f"{f}\t{key}", file=fout)
+	freqs = counters["ngrams"]
+	adverbs_freqs = counters["adverbs"]
+	nouns_freqs = counters["nouns"]
+
+	if construction is None:
+		construction = NGRAM_MATCHER.constructions["ngram"]
+	patterns = construction.patterns
+
+	ids = sentence.ids
+	forms = sentence.forms
+	pos = sentence.pos
+	heads = sentence.heads
+	deprels = sentence.deprels
 
+	for c_id in range(3, len(pos)-2):
+		if pos[c_id] != pmaps.ADV:
+			continue
 
-def extract_detADVN(filename, source, file_id, accepted_nouns, output_directory):
+		pattern_n = None
+
+		if pos[c_id-1] == pmaps.DET:                                                    # DET ADV ? ? case
+
+			d_id = c_id-1
+
+			if (
+				pos[c_id+1] == pmaps.NOUN and \
+				((deprels[d_id] == "" or heads[d_id] == ids[c_id]) or \
+				(deprels[c_id] == "" or heads[c_id] == ids[c_id+1]))
+			):                                                                          # DET ADV NOUN case
+
+				pattern_n = 0
+				adverb = forms[c_id]
+				n_id = c_id+1
+
+			elif (
+				pos[c_id+1] == pmaps.ADV and \
+				pos[c_id+2] == pmaps.NOUN and \
+				((deprels[d_id] == "" or heads[d_id] == ids[c_id+2]) or \
+				(deprels[c_id] == "" or heads[c_id] == ids[c_id+2]) or \
+				(deprels[c_id+1] == "" or heads[c_id+1] == ids[c_id+2]))
+			):                                                                          # DET ADV ADV NOUN case
+
+				# no later candidate reads the first adverb, so the merge is not written to the forms
+				pattern_n = 1
+				adverb = forms[c_id] + " " + forms[c_id+1]
+				n_id = c_id+2
+
+			# DET ADV ADJ NOUN is not extracted
+
+		if pos[c_id-2] == pmaps.DET:                                                    # DET ? ADV ? case
+
+			d_id = c_id-2
+
+			if (
+				pos[c_id-1] == pmaps.ADJ and \
+				pos[c_id+1] == pmaps.NOUN and \
+				((deprels[d_id] == "" or heads[d_id] == ids[c_id+1]) or \
+				(deprels[c_id] == "" or heads[c_id] == ids[c_id+1]))
+			):                                                                          # DET ADJ ADV NOUN case
+
+				pattern_n = 2
+				adverb = forms[c_id]
+				n_id = c_id+1
+
+		if pattern_n is None or forms[n_id] not in accepted_nouns:
+			continue
+
+		freqs.add(adverb, forms[n_id])
+		adverbs_freqs.add(adverb)
+		nouns_freqs.add(forms[n_id])
+
+		if match_counts is not None:
+			pattern = patterns[pattern_n]
+			match_counts[pattern] = match_counts.get(pattern, 0) + 1
+
+
+def count_detADVN(filename, source, accepted_nouns, start=0, end=None):
+	"""
+	This function counts adverb-noun pairs in a given file (or in a byte range of it), based on
+	specific patterns and a list of accepted nouns.
+
+	Args:
+	  filename: The `filename` parameter (corpus) is the name of the file from which you are extracting
+	adverbs and nouns ngrams.
+	  source: The `source` parameter in the function is a string
+	representing the source of the data from which you are extracting ngrams.
+	  accepted_nouns: The `accepted_nouns` parameter is a list of nouns that are considered acceptable
+	for extraction.
+	  start: Byte offset of the sentence boundary from which reading starts (see `utils.read`).
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
+
+	Returns:
+	  A dictionary mapping the suffix of each output file ("ngrams", "adverbs" and "nouns") to the
+	corresponding frequency counts.
+	"""
+
+	return count_construction(filename, source, "ngram", accepted_nouns, start=start, end=end)
+
+
+def write_detADVN(counters, source, file_id, output_directory):
+	"""
+	This function saves the frequency counts returned by `count_detADVN` in separate output files,
+	sorted by decreasing frequency.
+
+	Args:
+	  counters: The dictionary returned by `count_detADVN` (or a reduction of several of them).
+	  source: The source of the data from which ngrams were extracted.
+	  file_id: The identifier of the processed file, used in naming the output files.
+	  output_directory: The directory where `{source}_{file_id}.ngrams.tsv`,
+	`{source}_{file_id}.adverbs.tsv`, and `{source}_{file_id}.nouns.tsv` are saved.
+	"""
+
+	construction = NGRAM_MATCHER.constructions["ngram"]
+	write_construction(construction, counters, source, file_id, output_directory)
+
+
+def extract_detADVN(filename, source, file_id, accepted_nouns, output_directory, n_shards=1):
 	"""
 	This function extracts adverb-noun pairs from sentences based on specific patterns and saves
 	the frequency of adverbs, nouns, and adverb-noun pairs to separate output files.
@@ -72,116 +433,82 @@ def extract_detADVN(filename, source, file_id, accepted_nouns, output_directory)
 	  output_directory: The `output_directory` parameter in the `extract_detADVN` function is the
 	directory where the output files will be saved. It is the location where the generated files such as
 	`{source}_{file_id}.ngrams.tsv`, `{source}_{file_id}.adverbs.tsv`, and `{source}_{file_id}.nouns.tsv`
+	  n_shards: The number of byte ranges in which the file is split and scanned by parallel worker
+	processes (see `TAM.index`), 1 by default.
 	"""
 
-	freqs = collections.defaultdict(int)
-
-	adverbs_freqs = collections.defaultdict(int)
-	nouns_freqs = collections.defaultdict(int)
-
-	for sentence in tqdm.tqdm(utils.read(filename, source)):
-		candidates = []
-
-		for tok_id, token in enumerate(sentence.sentence):
-			if token.pos == "ADV" and \
-				tok_id > 2 and \
-					tok_id < len(sentence.sentence)-2:
-					candidates.append(tok_id)
-
-		for c_id in candidates:
-
-			adverb_object = sentence.sentence[c_id]
-
-			pprevious_object = sentence.sentence[c_id-2]
-			previous_object = sentence.sentence[c_id-1]
+	counters = parallel.scan_shards(count_detADVN, filename, source, n_shards, accepted_nouns)
+	write_detADVN(counters, source, file_id, output_directory)
 
-			next_object = sentence.sentence[c_id+1]
-			nnext_object = sentence.sentence[c_id+2]
 
-			if previous_object.pos == "DET":                                                # DET ADV ? ? case
-
-				determiner_object = previous_object
-
-				if (
-					next_object.pos == "NOUN" and \
-					((determiner_object.deprel == "" or determiner_object.head == adverb_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == next_object.id))
-				):                                                                          # DET ADV NOUN case
+def process_NOUN(sentence, counters):
+	"""
+	This Python function counts the nouns of a single sentence. Only nouns composed by alphabetic
+	characters, or characters in the set (-, ., " "), are considered.
 
-					noun_object = next_object
+	Args:
+	  sentence: The `ColumnarSentence` to be processed.
+	  counters: The counters to be updated, as created by `new_counters("nouns")`.
+	"""
 
-					if noun_object.form in accepted_nouns:
-						freqs[(adverb_object.form, noun_object.form)] += 1
-						adverbs_freqs[adverb_object.form] += 1
-						nouns_freqs[noun_object.form] += 1
+	freqs = counters["nouns"]
 
-				elif (
-					next_object.pos == "ADV" and \
-					nnext_object.pos == "NOUN" and \
-					((determiner_object.deprel == "" or determiner_object.head == nnext_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == nnext_object.id) or \
-					(next_object.deprel == "" or next_object.head == nnext_object.id))
-				):                                                                          # DET ADV ADV NOUN case
+	for form, pos in zip(sentence.forms, sentence.pos):
+		if pos == pmaps.NOUN:
+			freqs.add_if(form, is_accepted_noun)
 
-					noun_object = nnext_object
-					adverb_object.form = adverb_object.form + " " + next_object.form
 
-					if noun_object.form in accepted_nouns:
-						freqs[(adverb_object.form, noun_object.form)] += 1
-						adverbs_freqs[adverb_object.form] += 1
-						nouns_freqs[noun_object.form] += 1
+def count_NOUN(filename, source, approximate=None, start=0, end=None):
+	"""
+	This Python function counts the frequency of nouns in a given file (or in a byte range of it).
 
-				elif (
-					next_object.pos == "ADJ" and \
-					nnext_object.pos == "NOUN" and \
-					((determiner_object.deprel == "" or determiner_object.head == nnext_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == nnext_object.id))
-				):                                                                          # DET ADV ADJ NOUN case
-					noun_object = nnext_object
+	Args:
+	  filename: The `filename` parameter in the `count_NOUN` function is the path to the
+	file containing the text data (corpus) from which you want to extract nouns.
+	  source: The `source` parameter in the `count_NOUN` function refers to the source (corpus) of the
+	data or text being processed.
+	  approximate: The arguments of `sketch.new_table` if frequencies are counted approximately in
+	bounded memory, `None` for exact counts.
+	  start: Byte offset of the sentence boundary from which reading starts (see `utils.read`).
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
 
-					# if noun_object.form in accepted_nouns:
-					# 	freqs[(adverb_object.form, noun_object.form)] += 1
-					# 	adverbs_freqs[adverb_object.form] += 1
-					# 	nouns_freqs[noun_object.form] += 1
+	Returns:
+	  A dictionary mapping the suffix of the output file ("nouns") to the noun frequency counts.
+	"""
 
-			if pprevious_object.pos == "DET":                                               # DET ? ADV ? case
+	counters = new_counters("nouns", approximate=approximate)
 
-				determiner_object = pprevious_object
+	with metrics.scan("frequencies", filename, source, start, end) as file_scan:
+		# only forms and part of speech tags are decoded
+		sentences = file_scan.sentences(utils.read(filename, source, start, end, file_scan.reader_stats,
+												   forms_only=True))
+		for sentence in tqdm.tqdm(sentences):
+			process_NOUN(sentence, counters)
 
-				if (
-					previous_object.pos == "ADJ" and \
-					next_object.pos == "NOUN" and \
-					((determiner_object.deprel == "" or determiner_object.head == next_object.id) or \
-					(adverb_object.deprel == "" or adverb_object.head == next_object.id))
-				):                                                                          # DET ADJ ADV NOUN case
+	return counters
 
-					noun_object = next_object
 
-					if noun_object.form in accepted_nouns:
-						freqs[(adverb_object.form, noun_object.form)] += 1
-						adverbs_freqs[adverb_object.form] += 1
-						nouns_freqs[noun_object.form] += 1
+def write_NOUN(counters, source, file_id, output_directory):
+	"""
+	This Python function writes the noun frequencies returned by `count_NOUN` to a TSV file, sorted
+	alphabetically. Approximate frequencies are also saved next to it (see `save_sketch`).
 
-	with open(output_directory.joinpath(f"{source}_{file_id}.ngrams.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in sorted(freqs.items(), key=lambda x: -x[1]):
-			if f > 0:
-				print(f"{f}\t{' '.join(key)}", file=fout)
+	Args:
+	  counters: The dictionary returned by `count_NOUN` (or a reduction of several of them).
+	  source: The source (corpus) of the processed data.
+	  file_id: The identifier of the processed file, used in naming the output file.
+	  output_directory: The directory where `{source}_{file_id}.nouns.tsv` is saved.
+	"""
 
-	with open(output_directory.joinpath(f"{source}_{file_id}.adverbs.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in sorted(adverbs_freqs.items(), key=lambda x: -x[1]):
-			if f > 0:
-				print(f"{f}\t{key}", file=fout)
+	output_file = output_directory.joinpath(f"{source}_{file_id}.nouns.tsv")
+	with open(output_file, "w", encoding="utf-8") as fout:
+		for key, f in sorted(counters["nouns"].items()):
+			print(f"{f}\t{key}", file=fout)
 
-	with open(output_directory.joinpath(f"{source}_{file_id}.nouns.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in sorted(nouns_freqs.items(), key=lambda x: -x[1]):
-			if f > 0:
-				print(f"{f}\t{key}", file=fout)
+	save_sketch(counters["nouns"], output_file)
 
 
-def extract_NOUN(filename, source, file_id, output_directory):
+def extract_NOUN(filename, source, file_id, output_directory, n_shards=1):
 	"""
 	This Python function extracts and counts the frequency of nouns from a given file and writes the
 	results to a TSV file in the specified output directory.
@@ -197,19 +524,9 @@ def extract_NOUN(filename, source, file_id, output_directory):
 	  output_directory: The `output_directory` parameter in the `extract_NOUN` function is the directory
 	where the output file will be saved. It is the location where the function will write the results of
 	the noun extraction process.
+	  n_shards: The number of byte ranges in which the file is split and scanned by parallel worker
+	processes (see `TAM.index`), 1 by default.
 	"""
 
-	accepted_chars = "abcdefghijklmnopqrstuvwxyzàèéìòù"
-	freqs = collections.defaultdict(int)
-
-	for sentence in tqdm.tqdm(utils.read(filename, source)):
-		for token in sentence.sentence:
-			if token.pos == "NOUN":
-				if all(c.lower() in accepted_chars or c in ["-", ".", " "] for c in token.form) and \
-					any(c not in ["-", ".", " "] for c in token.form):
-					freqs[token.form] += 1
-
-	with open(output_directory.joinpath(f"{source}_{file_id}.nouns.tsv"),
-		   "w", encoding="utf-8") as fout:
-		for key, f in sorted(freqs.items()):
-			print(f"{f}\t{key}", file=fout)
+	counters = parallel.scan_shards(count_NOUN, filename, source, n_shards)
+	write_NOUN(counters, source, file_id, output_directory)
@@ -0,0 +1,204 @@
+"""
+This python module builds sentence-boundary indexes for corpus files. An index stores the byte
+offsets of the lines at which a new sentence starts, so that a single corpus file can be split
+into shards that are read independently by `utils.read`.
+"""
+import array
+import bisect
+import logging
+import os
+
+import TAM.encoded as encoded
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx"
+# stored after the size and modification time of the corpus; negative, so that it cannot be taken
+# for the first offset of an index written before versions were stored
+INDEX_VERSION = -2
+
+
+def is_vert_boundary(raw_line):
+	"""
+	The function `is_vert_boundary` tells whether a raw line (bytes) of an ITWAC or REPUBBLICA corpus
+	opens a new sentence.
+	"""
+
+	return raw_line.startswith(b"<s")
+
+
+def is_wikiconll_boundary(raw_line):
+	"""
+	The function `is_wikiconll_boundary` tells whether a raw line (bytes) of a wikiCoNLL corpus opens
+	a new sentence: a `<doc` line, or a blank line once decoded (Unicode whitespace included), as
+	for the readers of `utils`.
+	"""
+
+	line = raw_line.strip()
+	if line and not (0x20 < line[0] < 0x7f and 0x20 < line[-1] < 0x7f):
+		# non-ASCII characters at either end may be stripped once decoded
+		line = raw_line.decode("utf-8").strip().encode("utf-8")
+	return len(line) == 0 or line.startswith(b"<doc")
+
+
+def _is_boundary(source):
+	"""
+	The function `_is_boundary` returns a predicate telling whether a raw line (bytes) opens a new
+	sentence in corpora coming from `source`.
+
+	Args:
+	  source: The identifier of the corpus format, as used by `utils.read`.
+
+	Returns:
+	  A function that takes a line of the corpus as bytes and returns `True` if a new sentence
+	starts at that line.
+	"""
+
+	if source in ("ITWAC", "REPUBBLICA"):
+		return is_vert_boundary
+
+	if source == "WIKICONLL":
+		return is_wikiconll_boundary
+
+	raise ValueError(f"Unable to index source: {source}")
+
+
+def build_index(filename, source):
+	"""
+	The function `build_index` scans a corpus file and records the byte offsets of its sentence
+	boundaries: `<s` lines for ITWAC and REPUBBLICA, `<doc` and blank lines for WIKICONLL.
+
+	Args:
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+
+	Returns:
+	  An `array` of (sorted) byte offsets.
+	"""
+
+	is_boundary = _is_boundary(source)
+	offsets = array.array("q")
+
+	with open(filename, "rb") as fin:
+		offset = 0
+		for line in fin:
+			if is_boundary(line):
+				offsets.append(offset)
+			offset += len(line)
+
+	return offsets
+
+
+def load_index(filename, source, index_filename=None):
+	"""
+	The function `load_index` returns the sentence-boundary index of a corpus file. The index is
+	built once and stored next to the corpus (as `{filename}.idx`, unless `index_filename` is
+	provided); it is rebuilt whenever the size or modification time of the corpus (or the version of
+	the index) change.
+
+	Args:
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  index_filename: The path where the index is stored, `{filename}.idx` by default.
+
+	Returns:
+	  An `array` of (sorted) byte offsets.
+	"""
+
+	if index_filename is None:
+		index_filename = f"{filename}{INDEX_SUFFIX}"
+
+	stat = os.stat(filename)
+
+	if os.path.exists(index_filename):
+		stored = array.array("q")
+		with open(index_filename, "rb") as fin:
+			stored.frombytes(fin.read())
+
+		if len(stored) >= 3 and stored[0] == stat.st_size and stored[1] == stat.st_mtime_ns and \
+				stored[2] == INDEX_VERSION:
+			return stored[3:]
+
+	offsets = build_index(filename, source)
+
+	try:
+		with open(index_filename, "wb") as fout:
+			array.array("q", [stat.st_size, stat.st_mtime_ns, INDEX_VERSION]).tofile(fout)
+			offsets.tofile(fout)
+	except OSError as err:
+		logger.warning("Unable to store index for %s: %s", filename, err)
+
+	return offsets
+
+
+def shard_ranges(filename, source, n_shards, index_filename=None):
+	"""
+	The function `shard_ranges` splits a corpus file into (at most) `n_shards` byte ranges of
+	roughly equal size, each starting and ending at a sentence boundary.
+
+	Args:
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  n_shards: The number of requested shards.
+	  index_filename: The path where the index is stored, see `load_index`.
+
+	Returns:
+	  A list of (`start`, `end`) pairs to be passed to `utils.read`. The `end` of the last shard is
+	`None`, meaning that the shard extends until the end of the file. For encoded corpora (see
+	`TAM.encoded`), `start` and `end` are sentence indexes and shards contain similar numbers of tokens.
+	"""
+
+	if n_shards <= 1:
+		return [(0, None)]
+
+	if encoded.is_encoded(filename):
+		offsets = encoded.load_sentence_offsets(filename)
+		n_tokens = offsets[-1]
+
+		cuts = [0]
+		for shard in range(1, n_shards):
+			position = bisect.bisect_left(offsets, n_tokens * shard // n_shards, hi=len(offsets)-1)
+			if position > cuts[-1]:
+				cuts.append(position)
+
+		return list(zip(cuts, cuts[1:] + [None]))
+
+	offsets = load_index(filename, source, index_filename)
+	size = os.path.getsize(filename)
+
+	cuts = [0]
+	for shard in range(1, n_shards):
+		target = size * shard // n_shards
+		position = bisect.bisect_left(offsets, target)
+		if position < len(offsets) and offsets[position] > cuts[-1]:
+			cuts.append(offsets[position])
+
+	return list(zip(cuts, cuts[1:] + [None]))
+
+
+def corpus_size(filename):
+	"""
+	The function `corpus_size` returns the size in bytes of a corpus file or of an encoded corpus.
+	"""
+
+	if encoded.is_encoded(filename):
+		return encoded.corpus_size(filename)
+
+	return os.path.getsize(filename)
+
+
+def shard_size(filename, start, end):
+	"""
+	The function `shard_size` returns the (approximate, for encoded corpora) size in bytes of the
+	shard of `filename` delimited by `start` and `end`, as returned by `shard_ranges`.
+	"""
+
+	size = corpus_size(filename)
+
+	if encoded.is_encoded(filename):
+		n_sentences = encoded.load_meta(filename)["n_sentences"]
+		if end is None:
+			end = n_sentences
+		return size * (end - start) // max(n_sentences, 1)
+
+	return (size if end is None else end) - start
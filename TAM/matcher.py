@@ -0,0 +1,461 @@
+"""
+This python module compiles the declarative pattern specifications of `patterns.yaml` into a
+single matcher shared by `TAM.extract` (frequency counts) and `TAM.contexts` (context rows).
+
+A specification file maps the name of each construction to:
+- `output_name`: the name used for its output folders in the `all` step (defaults to the name)
+- `sort`: the order of its frequency lists, `insertion` or `frequency` (decreasing)
+- `context`: the `key` field (one output file per key), the `accept` list keys are checked against
+and the `columns` written before the contexts (`type` is the name of the pattern)
+- `patterns`: a list of patterns
+
+Each pattern has:
+- `name`: the name of the pattern
+- `tokens`: the sequence of tokens, each with its part of speech `pos` (a tag or a list of tags), and
+optionally a `name` (the field bound to its form), `anchor: true` (exactly one token, the position
+patterns are scanned from), `optional: true` (only at the edges, the token is not part of the
+occurrence but contexts stop before it), form predicates (`contains` a string, `regex` searched in
+the form, `split` on the last occurrence of a separator `into` two fields)
+- `range`: the accepted positions of the anchor, `[first, last]`, negative values counting from
+the end of the sentence (by default `[0, -1]`)
+- `heads`: a list of [`dependent`, `head`] token names, at least one of which must hold (the
+dependent has no dependency relation or is attached to the head)
+- `merge`: token names whose forms are joined by a space into the field of the first one; the joined
+form replaces the form of the first token in the contexts of the following matches
+- `accept`: a mapping from fields to the name of the list they must belong to (checked only if the
+list is provided, e.g. "nouns" by both `extract` and `contexts`)
+- `counts`: a mapping from frequency tables to the field (or the pair of fields) they count
+- `right_width`: additional tokens in the right context
+
+Candidate anchors of a sentence are found at once, by a regular expression over its part of speech
+column (see `objects.ColumnarSentence`); the remaining constraints are checked in Python on the
+candidates only.
+
+The "ngram" construction of `patterns.yaml` is the one the hand-written loops
+`extract.process_detADVN` and `contexts.process_ctx_detADVN` implement: as long as its specification
+is left unchanged (see `NGRAM_DIGEST`), its matches are counted and written by those loops, which cost
+less per candidate than interpreting its patterns.
+"""
+import functools
+import hashlib
+import json
+import pathlib
+import re
+
+import yaml
+
+import TAM.pos_maps as pmaps
+
+DEFAULT_PATTERNS = pathlib.Path(__file__).with_name("patterns.yaml")
+
+# digest (see `Construction.digest`) of the "ngram" construction of `patterns.yaml`, matched by the
+# hand-written loops of `extract` and `contexts` (see `benchmarks/equivalence.py`)
+NGRAM_DIGEST = "31db8311eaf82c1bd2e3fa65b8e1b17a40c7b901669c78b716d6a95de9d95b54"
+
+
+def _pos_codes(tags):
+	"""
+	The function `_pos_codes` converts a part of speech tag, or a list of tags, into a set of codes.
+	"""
+
+	if isinstance(tags, str):
+		tags = [tags]
+
+	codes = set()
+	for tag in tags:
+		if tag not in pmaps.upos_codes:
+			raise ValueError(f"Unknown part of speech in pattern: {tag}")
+		codes.add(pmaps.upos_codes[tag])
+
+	return frozenset(codes)
+
+
+def _byte_class(codes):
+	"""
+	The function `_byte_class` returns a regular expression matching one of the part of speech
+	`codes`.
+	"""
+
+	return b"[" + b"".join(re.escape(bytes([code])) for code in sorted(codes)) + b"]"
+
+
+class TokenSpec:
+	"""
+	The TokenSpec class represents a compiled token of a pattern, at position `offset` relative to
+	the anchor.
+	"""
+	__slots__ = ("offset", "codes", "name", "optional", "contains", "regex", "split", "into",
+				 "has_predicates")
+
+	def __init__(self, offset, spec):
+		self.offset = offset
+		self.codes = _pos_codes(spec["pos"])
+		self.name = spec.get("name")
+		self.optional = spec.get("optional", False)
+		self.contains = spec.get("contains")
+		self.regex = re.compile(spec["regex"]) if "regex" in spec else None
+		self.split = spec.get("split")
+		self.into = tuple(spec.get("into", ()))
+
+		self.has_predicates = self.contains is not None or self.regex is not None or self.split is not None
+
+		if self.split is not None and len(self.into) != 2:
+			raise ValueError(f"Token splitting on {self.split!r} needs two fields in `into`")
+
+	def check_form(self, form):
+		if self.contains is not None and self.contains not in form:
+			return False
+		if self.regex is not None and self.regex.search(form) is None:
+			return False
+		if self.split is not None and self.split not in form:
+			return False
+		return True
+
+
+class Pattern:
+	"""
+	The Pattern class represents a compiled pattern of a construction.
+	"""
+	__slots__ = ("construction", "name", "tokens", "required", "optional", "anchor_codes", "range",
+				 "heads", "merges", "merge_field", "dropped", "accept", "counts", "right_width",
+				 "anchor_filter", "bounds", "structure", "predicates", "named", "splits", "label")
+
+	def __init__(self, construction, spec):
+		"""
+		This function compiles a pattern specification.
+
+		Args:
+		  construction: The name of the construction the pattern belongs to.
+		  spec: A dictionary, as read from a specification file.
+		"""
+
+		self.construction = construction
+		self.name = spec["name"]
+		# set by `Construction`, identifies the pattern in metrics (see `TAM.metrics`)
+		self.label = self.name
+
+		anchors = [token_n for token_n, token in enumerate(spec["tokens"]) if token.get("anchor")]
+		if len(anchors) != 1:
+			raise ValueError(f"Pattern {self.name} must have exactly one anchor token")
+
+		self.tokens = [TokenSpec(token_n - anchors[0], token) for token_n, token in enumerate(spec["tokens"])]
+		self.required = [token for token in self.tokens if not token.optional]
+		self.optional = [token for token in self.tokens if token.optional]
+
+		for token_n, token in enumerate(self.tokens):
+			if token.optional and 0 < token_n < len(self.tokens) - 1:
+				raise ValueError(f"Optional tokens must be at the edges of pattern {self.name}")
+			if token.optional and token.offset == 0:
+				raise ValueError(f"The anchor of pattern {self.name} cannot be optional")
+
+		self.anchor_codes = self.tokens[anchors[0]].codes
+		self.range = tuple(spec.get("range", (0, -1)))
+
+		offsets = {token.name: token.offset for token in self.tokens if token.name is not None}
+
+		def offset(name):
+			if name not in offsets:
+				raise ValueError(f"Unknown token {name} in pattern {self.name}")
+			return offsets[name]
+
+		self.heads = [(offset(dependent), offset(head)) for dependent, head in spec.get("heads", [])]
+
+		merge = spec.get("merge", [])
+		self.merges = [offset(name) for name in merge]
+		self.merge_field = merge[0] if merge else None
+		self.dropped = frozenset(self.merges[1:])
+
+		self.accept = list(spec.get("accept", {}).items())
+		self.counts = [(table, tuple(field) if isinstance(field, list) else field)
+					   for table, field in spec.get("counts", {}).items()]
+		self.right_width = spec.get("right_width", 0)
+
+		# flattened views of the tokens, used by `match`
+		anchor = self.tokens[anchors[0]]
+		self.anchor_filter = anchor.contains if anchor.contains is not None else anchor.split
+		self.bounds = (self.required[0].offset, self.required[-1].offset)
+		# the tags of the required tokens, matched from the first one in a single call
+		self.structure = re.compile(b"".join(_byte_class(token.codes) for token in self.required), re.DOTALL)
+		self.predicates = tuple(token for token in self.required if token.has_predicates)
+		self.named = tuple((token.offset, token.name) for token in self.required if token.name is not None)
+		self.splits = tuple((token.offset, token.split, token.into) for token in self.required
+							if token.split is not None)
+
+	def match(self, sentence, forms, c_id, accepted):
+		"""
+		The function `match` checks whether the pattern matches with its anchor in position `c_id`.
+
+		Args:
+		  sentence: The `ColumnarSentence` to be matched.
+		  forms: The forms of the sentence, as modified by the merges of previous matches.
+		  c_id: The position of the anchor.
+		  accepted: A dictionary mapping the names of the lists in `accept` to sets of strings, or
+		`None` to skip the `accept` constraints. Constraints on lists missing from `accepted` are
+		skipped as well.
+
+		Returns:
+		  A `Match`, or `None`.
+		"""
+
+		pos = sentence.pos
+		n_tokens = len(pos)
+
+		# the anchor and the tags of the other required tokens are checked by the caller
+		first, last = self.range
+		if c_id < (first if first >= 0 else n_tokens + first) or \
+			c_id > (last if last >= 0 else n_tokens + last):
+			return None
+
+		start = c_id + self.bounds[0]
+		end = c_id + self.bounds[1]
+
+		for token in self.predicates:
+			if not token.check_form(forms[c_id + token.offset]):
+				return None
+
+		for token in self.optional:
+			tok_id = c_id + token.offset
+			if 0 <= tok_id < n_tokens and pos[tok_id] in token.codes and token.check_form(forms[tok_id]):
+				if tok_id < start:
+					start = tok_id
+				elif tok_id > end:
+					end = tok_id
+
+		if self.heads:
+			ids = sentence.ids
+			heads = sentence.heads
+			deprels = sentence.deprels
+			for dependent, head in self.heads:
+				if deprels[c_id+dependent] == "" or heads[c_id+dependent] == ids[c_id+head]:
+					break
+			else:
+				return None
+
+		fields = {name: forms[c_id + offset] for offset, name in self.named}
+		for offset, separator, into in self.splits:
+			fields[into[0]], fields[into[1]] = forms[c_id + offset].rsplit(separator, 1)
+
+		if self.merges:
+			fields[self.merge_field] = " ".join([forms[c_id + offset] for offset in self.merges])
+
+		if accepted is not None:
+			for field, list_name in self.accept:
+				if list_name in accepted and fields[field] not in accepted[list_name]:
+					return None
+
+		return Match(self, c_id, fields, start, end)
+
+
+class Match:
+	"""
+	The Match class represents an occurrence of a pattern in a sentence.
+	"""
+	__slots__ = ("pattern", "anchor", "fields", "start", "end", "forms")
+
+	def __init__(self, pattern, anchor, fields, start, end):
+		self.pattern = pattern
+		self.anchor = anchor
+		self.fields = fields
+		self.start = start
+		self.end = end
+		self.forms = None
+
+	def occurrence(self):
+		"""
+		The function `occurrence` returns the positions of the tokens of the occurrence, i.e. the
+		required tokens of the pattern, except those merged into a preceding one.
+		"""
+
+		return [self.anchor + token.offset for token in self.pattern.required
+				if token.offset not in self.pattern.dropped]
+
+	def context(self, ctx):
+		"""
+		The function `context` returns the left context, the occurrence and the right context of the
+		match, as strings.
+
+		Args:
+		  ctx: The width of the contexts.
+		"""
+
+		forms = self.forms
+		ctx_left = " ".join(forms[max(0, self.start-ctx):self.start])
+		candidate_str = " ".join([forms[tok_id] for tok_id in self.occurrence()])
+		ctx_right = " ".join(forms[self.end+1:min(len(forms), self.end+1+ctx+self.pattern.right_width)])
+
+		return ctx_left, candidate_str, ctx_right
+
+
+class Construction:
+	"""
+	The Construction class groups the compiled patterns of a construction, with its output settings.
+	"""
+	__slots__ = ("name", "output_name", "sort", "key", "key_list", "columns", "patterns",
+				 "tables", "pairs", "digest")
+
+	def __init__(self, name, spec):
+		self.name = name
+		# identifies the specification, regardless of the name of the construction
+		self.digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+		self.output_name = spec.get("output_name", name)
+		self.sort = spec.get("sort", "insertion")
+		if self.sort not in ("insertion", "frequency"):
+			raise ValueError(f"Unknown sort order for construction {name}: {self.sort}")
+
+		context = spec.get("context", {})
+		self.key = context.get("key")
+		self.key_list = context.get("accept")
+		self.columns = context.get("columns", [])
+
+		self.patterns = [Pattern(name, pattern) for pattern in spec["patterns"]]
+		for pattern_n, pattern in enumerate(self.patterns):
+			pattern.label = f"{name}[{pattern_n}] {pattern.name}"
+
+		self.tables = []
+		self.pairs = []
+		for pattern in self.patterns:
+			for table, field in pattern.counts:
+				if table not in self.tables:
+					self.tables.append(table)
+					if isinstance(field, tuple):
+						self.pairs.append(table)
+				if isinstance(field, tuple) != (table in self.pairs):
+					raise ValueError(f"Table {table} of construction {name} counts both strings and pairs")
+
+
+class Matcher:
+	"""
+	The Matcher class matches all the patterns of a set of constructions in a single sweep over
+	each sentence.
+	"""
+
+	def __init__(self, constructions):
+		"""
+		This function compiles the regular expression finding the candidate anchors of all patterns.
+
+		Args:
+		  constructions: A dictionary mapping construction names to `Construction` objects.
+		"""
+
+		self.constructions = constructions
+		# the construction matched by the hand-written loops, if any (see `NGRAM_DIGEST`)
+		self.ngram = next((name for name, construction in constructions.items()
+						   if construction.digest == NGRAM_DIGEST), None)
+		# patterns indexed by the part of speech code of their anchor
+		self.by_anchor = [[] for _ in range(256)]
+
+		alternatives = []
+		for construction in constructions.values():
+			for pattern in construction.patterns:
+				for code in pattern.anchor_codes:
+					self.by_anchor[code].append(pattern)
+
+				before = [token for token in pattern.required if token.offset < 0]
+				after = [token for token in pattern.required if token.offset > 0]
+
+				# the anchor is consumed first, so that the regex engine can quickly skip to the
+				# next candidate, then preceding and following tokens are checked by lookarounds
+				alternative = _byte_class(pattern.anchor_codes)
+				if before:
+					alternative += b"(?<=" + b"".join(_byte_class(token.codes) for token in before) + \
+						_byte_class(pattern.anchor_codes) + b")"
+				if after:
+					alternative += b"(?=" + b"".join(_byte_class(token.codes) for token in after) + b")"
+				if alternative not in alternatives:
+					alternatives.append(alternative)
+
+		self.regex = re.compile(b"|".join(alternatives) if alternatives else b"(?!)", re.DOTALL)
+
+	def matches(self, sentence, accepted):
+		"""
+		The function `matches` yields the matches of all patterns in a sentence, ordered by anchor
+		and, for the same anchor, in the order patterns are specified.
+
+		Merges only affect the forms seen by the following matches of the same construction, the
+		forms of the sentence are never modified.
+
+		Args:
+		  sentence: The `ColumnarSentence` to be matched.
+		  accepted: A dictionary mapping construction names to the lists used by their `accept`
+		constraints (see `Pattern.match`). Constructions missing from `accepted` are skipped; with
+		`None`, all constructions are matched without `accept` constraints.
+
+		Yields:
+		  `Match` objects, whose `forms` attribute holds the forms seen by the match.
+		"""
+
+		pos = sentence.pos
+		by_anchor = self.by_anchor
+		sentence_forms = sentence.forms
+		forms = {}
+		for candidate in self.regex.finditer(pos):
+			c_id = candidate.start()
+			for pattern in by_anchor[pos[c_id]]:
+				if accepted is None:
+					lists = None
+				else:
+					lists = accepted.get(pattern.construction)
+					if lists is None:
+						continue
+
+				construction_forms = forms.get(pattern.construction, sentence_forms) if forms else sentence_forms
+				anchor_filter = pattern.anchor_filter
+				if anchor_filter is not None and anchor_filter not in construction_forms[c_id]:
+					continue
+
+				# the lookarounds of `regex` do not tell which of the patterns of the anchor matched
+				start = c_id + pattern.bounds[0]
+				if start < 0 or pattern.structure.match(pos, start) is None:
+					continue
+
+				match = pattern.match(sentence, construction_forms, c_id, lists)
+				if match is None:
+					continue
+
+				if pattern.merges:
+					if construction_forms is sentence_forms:
+						construction_forms = forms[pattern.construction] = list(sentence_forms)
+					construction_forms[c_id + pattern.merges[0]] = match.fields[pattern.merge_field]
+
+				match.forms = construction_forms
+				yield match
+
+	def has_candidate(self, sentence):
+		"""
+		The function `has_candidate` checks whether any pattern matches a sentence, regardless of
+		`accept` constraints.
+		"""
+
+		for _ in self.matches(sentence, None):
+			return True
+
+		return False
+
+
+@functools.lru_cache(maxsize=None)
+def load_patterns(filename=DEFAULT_PATTERNS, names=None):
+	"""
+	The function `load_patterns` reads a specification file and compiles it into a `Matcher`.
+	Matchers are cached, so that each process compiles the same file once.
+
+	Args:
+	  filename: The path to the specification file, `patterns.yaml` of this package by default.
+	  names: A tuple with the names of the constructions to be compiled, `None` for all of them.
+
+	Returns:
+	  A `Matcher`.
+	"""
+
+	with open(filename, encoding="utf-8") as fin:
+		specs = yaml.safe_load(fin)
+
+	if names is None:
+		names = tuple(specs)
+
+	constructions = {}
+	for name in names:
+		if name not in specs:
+			raise ValueError(f"Unknown construction {name} in {filename}")
+		constructions[name] = Construction(name, specs[name])
+
+	return Matcher(constructions)
@@ -0,0 +1,277 @@
+"""
+This python module records metrics of the scans of corpus files, when enabled (see `enable`): for
+each stage and each file (or range of a file), the bytes and lines read, the sentences and tokens
+parsed, the sentences skipped without being parsed (see `TAM.prefilter`), the matches of each
+pattern, the time spent parsing, matching and writing, and the peak memory of the process.
+
+Each scan is appended as a JSON object, on a line of its own, to the metrics file. Since the file is
+named by an environment variable, worker processes (e.g., those of `TAM.parallel`) append their
+scans to the same file.
+
+It also implements the profiling of whole steps with `cProfile` and `tracemalloc` (see `profile`).
+"""
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+METRICS_VARIABLE = "TAM_METRICS"
+
+# subfolder of the output folder where profiling reports are written
+PROFILE_FOLDER = ".profile"
+
+# number of entries of the profiling reports
+PROFILE_ENTRIES = 50
+
+
+def enable(filename):
+	"""
+	The function `enable` starts appending metrics to `filename`, in the current process and in the
+	worker processes it starts.
+	"""
+
+	os.environ[METRICS_VARIABLE] = os.path.abspath(filename)
+
+
+def metrics_filename():
+	return os.environ.get(METRICS_VARIABLE)
+
+
+def peak_memory():
+	"""
+	The function `peak_memory` returns the peak resident memory of the current process, in MB, or
+	`None` if it is unavailable on this platform.
+	"""
+
+	if resource is None:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# bytes on macOS, kilobytes elsewhere
+	return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def append(record):
+	"""
+	The function `append` appends a record to the metrics file, with a single write so that records
+	of concurrent processes are not interleaved.
+	"""
+
+	line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+	fd = os.open(metrics_filename(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+	try:
+		os.write(fd, line)
+	finally:
+		os.close(fd)
+
+
+class Scan:
+	"""
+	The Scan class records the metrics of a scan of a corpus file, and appends them to the metrics
+	file when closed.
+	"""
+
+	def __init__(self, stage, filename, source=None, start=0, end=None):
+		"""
+		This function starts the timer of a scan.
+
+		Args:
+		  stage: The name of the step (e.g., "frequencies").
+		  filename: The path to the scanned file.
+		  source: The identifier of the corpus format, as used by `utils.read`.
+		  start: The start of the scanned range (see `utils.read`).
+		  end: The end of the scanned range, `None` for the end of file.
+		"""
+
+		self.record = {"stage": stage, "file": str(filename), "source": source, "start": start, "end": end,
+					   "pid": os.getpid()}
+
+		# filled by the readers of `TAM.utils`
+		self.reader_stats = {}
+		# matches of each `matcher.Pattern`
+		self.matches = {}
+
+		self.sentences_n = 0
+		self.tokens_n = 0
+		self.parse_seconds = 0.0
+		self.write_seconds = 0.0
+		self.writers = []
+		self.start_time = time.perf_counter()
+
+	def sentences(self, iterable):
+		"""
+		The function `sentences` yields the sentences of `iterable`, counting them and timing the
+		parsing.
+		"""
+
+		clock = time.perf_counter
+		iterator = iter(iterable)
+		try:
+			while True:
+				parse_start = clock()
+				try:
+					sentence = next(iterator)
+				except StopIteration:
+					return
+				finally:
+					self.parse_seconds += clock() - parse_start
+
+				self.sentences_n += 1
+				self.tokens_n += len(sentence.forms)
+				yield sentence
+		finally:
+			close = getattr(iterator, "close", None)
+			if close is not None:
+				close()
+
+	def watch(self, writers):
+		"""
+		The function `watch` includes the time a `writers.WriterPool` spends writing during the scan
+		in the writing time.
+		"""
+
+		self.writers.append((writers, getattr(writers, "write_seconds", 0.0)))
+
+	@contextlib.contextmanager
+	def writing(self):
+		"""
+		The function `writing` times a block that writes outputs.
+		"""
+
+		write_start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.write_seconds += time.perf_counter() - write_start
+
+	def close(self):
+		seconds = time.perf_counter() - self.start_time
+		for writers, write_seconds in self.writers:
+			self.write_seconds += getattr(writers, "write_seconds", 0.0) - write_seconds
+
+		self.record.update({
+			"bytes": self.reader_stats.get("bytes"),
+			"lines": self.reader_stats.get("lines"),
+			"skipped": self.reader_stats.get("skipped"),
+			"malformed": {reason: summary["count"]
+						  for reason, summary in self.reader_stats.get("malformed", {}).items()},
+			"sentences": self.sentences_n,
+			"tokens": self.tokens_n,
+			"matches": dict(sorted((pattern.label, n) for pattern, n in self.matches.items())),
+			"seconds": seconds,
+			"parse_seconds": self.parse_seconds,
+			"match_seconds": max(0.0, seconds - self.parse_seconds - self.write_seconds),
+			"write_seconds": self.write_seconds,
+			"peak_memory_mb": peak_memory(),
+		})
+		append(self.record)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, *exc_info):
+		if exc_type is None:
+			self.close()
+
+
+class _NullScan:
+	"""
+	The _NullScan class is used in place of `Scan` when metrics are disabled, at no cost.
+	"""
+
+	reader_stats = None
+	matches = None
+
+	def sentences(self, iterable):
+		return iterable
+
+	def watch(self, writers):
+		pass
+
+	def writing(self):
+		return contextlib.nullcontext()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		pass
+
+
+NULL_SCAN = _NullScan()
+
+
+def scan(stage, filename, source=None, start=0, end=None):
+	"""
+	The function `scan` returns the `Scan` recording the metrics of a scan, or a `_NullScan` if
+	metrics are disabled. Both are context managers, and are used as:
+
+	```
+	with metrics.scan("frequencies", filename, source, start, end) as file_scan:
+		for sentence in file_scan.sentences(utils.read(filename, source, start, end, file_scan.reader_stats)):
+			...
+	```
+	"""
+
+	if metrics_filename() is None:
+		return NULL_SCAN
+
+	return Scan(stage, filename, source, start, end)
+
+
+@contextlib.contextmanager
+def profile(output_directory, name, cpu=True, memory=False):
+	"""
+	The function `profile` profiles a block with `cProfile` and/or `tracemalloc`, and writes the
+	reports in the `PROFILE_FOLDER` subfolder of `output_directory`: `{name}.pstats` (to be loaded
+	with `pstats`) and `{name}.cpu.txt`, the functions taking the most cumulative time, and
+	`{name}.memory.txt`, the lines allocating the most memory still in use at the end of the block,
+	with the peak traced memory.
+
+	Only the current process is profiled, not its worker processes.
+	"""
+
+	directory = os.path.join(output_directory, PROFILE_FOLDER)
+	os.makedirs(directory, exist_ok=True)
+	prefix = os.path.join(directory, name)
+
+	profiler = cProfile.Profile() if cpu else None
+	if memory:
+		tracemalloc.start()
+	if profiler is not None:
+		profiler.enable()
+
+	try:
+		yield
+	finally:
+		if profiler is not None:
+			profiler.disable()
+
+		if memory:
+			snapshot = tracemalloc.take_snapshot()
+			_, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+
+			with open(f"{prefix}.memory.txt", "w", encoding="utf-8") as fout:
+				print(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n", file=fout)
+				for stat in snapshot.statistics("lineno")[:PROFILE_ENTRIES]:
+					print(stat, file=fout)
+
+		if profiler is not None:
+			profiler.dump_stats(f"{prefix}.pstats")
+
+			report = io.StringIO()
+			pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_ENTRIES)
+			with open(f"{prefix}.cpu.txt", "w", encoding="utf-8") as fout:
+				fout.write(report.getvalue())
@@ -1,8 +1,16 @@
+import array
+import sys
+
+import TAM.pos_maps as pmaps
+
+
 class Token:
     """
     The Token class represents a token with attributes such as token ID, form, lemma, part of speech,
     head, and dependency relation.
     """
+    __slots__ = ("id", "form", "lemma", "pos", "head", "deprel")
+
     def __init__(self, tok_id:int, form:str, lemma:str, pos:str,
                  head: int, deprel:str) -> None:
         """
@@ -115,4 +123,138 @@ class Sentence:
           The `__repr__` method is returning a string that consists of joining the `form` attribute
         of each element in the `sentence` list with a space in between.
         """
-        return " ".join(x.form for x in self.sentence)
\ No newline at end of file
+        return " ".join(x.form for x in self.sentence)
+
+
+class TokenView:
+    """
+    The TokenView class is a lightweight, read-only view over a single position of a
+    `ColumnarSentence`. It exposes the same attributes as `Token` without copying any data.
+    """
+    __slots__ = ("_sentence", "_index")
+
+    def __init__(self, sentence, index:int) -> None:
+        """
+        This Python function initializes a view on the token at position `index` of `sentence`.
+
+        Args:
+          sentence (ColumnarSentence): The sentence the view refers to.
+          index (int): The position (0-based) of the token within the sentence columns.
+        """
+        self._sentence = sentence
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return self._sentence.ids[self._index]
+
+    @property
+    def form(self) -> str:
+        return self._sentence.forms[self._index]
+
+    @property
+    def lemma(self) -> str:
+        return self._sentence.lemmas[self._index]
+
+    @property
+    def pos(self) -> str:
+        return pmaps.UPOS[self._sentence.pos[self._index]]
+
+    @property
+    def head(self) -> int:
+        return self._sentence.heads[self._index]
+
+    @property
+    def deprel(self) -> str:
+        return self._sentence.deprels[self._index]
+
+    def __repr__(self) -> str:
+        """
+        The `__repr__` function returns the same representation as `Token.__repr__`, in the
+        form "{form}/{pos}/{deprel}:{head}".
+        """
+        return f"{self.form}/{self.pos}/{self.deprel}:{self.head}"
+
+
+class ColumnarSentence:
+    """
+    This Python class represents a sentence as parallel columns instead of a list of `Token`
+    objects: ids and heads are stored in `array`s, part of speech tags as small integer codes
+    (see `pos_maps.UPOS`) in a `bytearray`, and forms, lemmas and dependency relations as lists
+    of interned strings. No Python object is allocated per token.
+    """
+    __slots__ = ("source", "ids", "forms", "lemmas", "pos", "heads", "deprels")
+
+    def __init__(self, source:str) -> None:
+        """
+        This Python function initializes an empty sentence drawn from `source`.
+
+        Args:
+          source (str): The identifier of the corpus from which the sentence is drawn.
+        """
+        self.source = source
+        self.ids = array.array("l")
+        self.forms = []
+        self.lemmas = []
+        self.pos = bytearray()
+        self.heads = array.array("l")
+        self.deprels = []
+
+    def add_token(self, tok_id:int, form:str, lemma:str, pos:int,
+                  head:int, deprel:str) -> None:
+        """
+        The `add_token` function appends one value to each column of the sentence.
+
+        Args:
+          tok_id (int): The token ID within the sentence.
+          form (str): The surface form of the token.
+          lemma (str): The lemma of the token.
+          pos (int): The code of the normalized part of speech tag, as returned by
+        `pos_maps.pos_code`.
+          head (int): The ID of the syntactic head, or -1 if unavailable.
+          deprel (str): The dependency relation, or "" if unavailable.
+        """
+        self.ids.append(tok_id)
+        self.forms.append(sys.intern(form))
+        self.lemmas.append(sys.intern(lemma))
+        self.pos.append(pos)
+        self.heads.append(head)
+        self.deprels.append(sys.intern(deprel))
+
+    def empty(self) -> bool:
+        """
+        The `empty` function checks whether the sentence contains no tokens.
+        """
+        return len(self.pos) == 0
+
+    def get_token(self, tok_id:int) -> TokenView:
+        """
+        This function returns a view on the token with the provided token ID.
+
+        Args:
+          tok_id (int): The ID of the token, as found in the `ids` column.
+
+        Returns:
+          The `TokenView` on the token whose ID is `tok_id`.
+        """
+        return TokenView(self, self.ids.index(tok_id))
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def __getitem__(self, index:int) -> TokenView:
+        if index < 0:
+            index += len(self.pos)
+        if not 0 <= index < len(self.pos):
+            raise IndexError(index)
+        return TokenView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.pos)):
+            yield TokenView(self, index)
+
+    def __repr__(self) -> str:
+        """
+        The `__repr__` method returns the forms of the sentence joined by a space.
+        """
+        return " ".join(self.forms)
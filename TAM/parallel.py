@@ -0,0 +1,150 @@
+"""
+This python module runs counting functions (such as `extract.count_NOUN`) over corpus files, or
+shards of them, in parallel worker processes and reduces their partial counters in memory.
+"""
+import collections
+import concurrent.futures
+
+import tqdm
+
+import TAM.index as index
+import TAM.sketch as sketch
+
+
+def reduce_counters(partials):
+	"""
+	The function `reduce_counters` sums a sequence of partial counters into a single one.
+
+	Partial counters are dictionaries mapping the name of a frequency table (e.g., "nouns") to a
+	dictionary of frequencies. They are summed in the given order, so that, if the partials come from
+	consecutive shards of a file, keys keep the order in which they were first seen in the file.
+	Approximate tables (see `TAM.sketch`) are merged into a new approximate table instead.
+
+	Args:
+	  partials: An iterable of partial counters, as returned by the `count_*` functions of
+	`TAM.extract`.
+
+	Returns:
+	  A dictionary mapping each table name to a `defaultdict` with the summed frequencies, or to a
+	`sketch.ApproximateTable`.
+	"""
+
+	total = collections.defaultdict(lambda: collections.defaultdict(int))
+
+	for partial in partials:
+		for name, freqs in partial.items():
+			if isinstance(freqs, sketch.ApproximateTable):
+				if name in total:
+					total[name].merge(freqs)
+				else:
+					total[name] = freqs.copy()
+				continue
+
+			table = total[name]
+			for key, f in freqs.items():
+				table[key] += f
+
+	return dict(total)
+
+
+def _shard_tasks(input_files, n_shards):
+	"""
+	The function `_shard_tasks` lists the shards of all input files, from the largest to the
+	smallest.
+
+	Args:
+	  input_files: A list of (`source`, `file_id`, `path`) triples.
+	  n_shards: The number of shards each file is split into.
+
+	Returns:
+	  A list of (`file_n`, `shard_n`, `source`, `path`, `start`, `end`) tuples, where `file_n` is the
+	position of the file in `input_files` and `shard_n` the position of the shard within the file.
+	"""
+
+	tasks = []
+	for file_n, (source, _, path) in enumerate(input_files):
+		for shard_n, (start, end) in enumerate(index.shard_ranges(path, source, n_shards)):
+			length = index.shard_size(path, start, end)
+			tasks.append((length, file_n, shard_n, source, path, start, end))
+
+	tasks.sort(key=lambda task: -task[0])
+
+	return [task[1:] for task in tasks]
+
+
+def scan_files(count_function, input_files, n_workers=None, n_shards=1, args=()):
+	"""
+	The function `scan_files` runs `count_function` over a list of corpus files in a pool of worker
+	processes and returns, for each file, the reduction of the partial counters of its shards.
+
+	Shards are submitted from the largest to the smallest, so that with files of very different sizes
+	the overall wall time stays close to the time needed for the largest one.
+
+	Args:
+	  count_function: A function with signature `(filename, source, *args, start=..., end=...)`
+	returning partial counters, such as `extract.count_NOUN`.
+	  input_files: A list of (`source`, `file_id`, `path`) triples.
+	  n_workers: The number of worker processes, defaults to `n_shards`. With 1 (or less) files are
+	scanned one after the other in the current process.
+	  n_shards: The number of shards each file is split into.
+	  args: A tuple of additional arguments passed to `count_function`.
+
+	Returns:
+	  A list of (`source`, `file_id`, `counters`) triples, in the same order as `input_files`.
+	"""
+
+	input_files = list(input_files)
+
+	if n_workers is None:
+		n_workers = n_shards
+
+	if n_workers <= 1:
+		return [(source, file_id, count_function(path, source, *args))
+				for source, file_id, path in tqdm.tqdm(input_files)]
+
+	partials = [{} for _ in input_files]
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+		futures = {}
+		for file_n, shard_n, source, path, start, end in _shard_tasks(input_files, n_shards):
+			future = executor.submit(count_function, path, source, *args, start=start, end=end)
+			futures[future] = (file_n, shard_n)
+
+		for future in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
+			file_n, shard_n = futures[future]
+			partials[file_n][shard_n] = future.result()
+
+	results = []
+	for (source, file_id, _), shards in zip(input_files, partials):
+		if len(shards) == 1:
+			counters = shards[0]
+		else:
+			counters = reduce_counters(shards[shard_n] for shard_n in sorted(shards))
+		results.append((source, file_id, counters))
+
+	return results
+
+
+def scan_shards(count_function, filename, source, n_shards, *args):
+	"""
+	The function `scan_shards` splits a corpus file into `n_shards` byte ranges, runs `count_function`
+	on each of them in a separate worker process and reduces the results.
+
+	Args:
+	  count_function: A function with signature `(filename, source, *args, start=..., end=...)`
+	returning partial counters, such as `extract.count_NOUN`.
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  n_shards: The number of shards. With 1 (or less) the file is scanned in the current process.
+	  *args: Additional arguments passed to `count_function` (e.g., the set of accepted nouns).
+
+	Returns:
+	  The reduced counters, as returned by `reduce_counters`.
+	"""
+
+	if n_shards <= 1:
+		return count_function(filename, source, *args)
+
+	[(_, _, counters)] = scan_files(count_function, [(source, None, filename)], n_shards, n_shards, args)
+
+	return counters
@@ -0,0 +1,272 @@
+"""
+This python module implements the fused pipeline run by the `all` subcommand: each corpus file is
+parsed only once, and every sentence is fed to all the consumers that do not depend on frequency
+thresholds (noun counting and the caching of candidate sentences). The extraction of all the
+constructions of `patterns.yaml` (see `TAM.matcher`), and then of their contexts, which depend on
+the accepted nouns, prefixes and adverbs, are resolved by single sweeps over the cached candidate
+sentences only.
+"""
+import concurrent.futures
+import functools
+import pickle
+
+import tqdm
+
+import TAM.contexts as contexts
+import TAM.extract as extract
+import TAM.index as index
+import TAM.matcher as matcher
+import TAM.metrics as metrics
+import TAM.objects as objs
+import TAM.parallel as parallel
+import TAM.utils as utils
+import TAM.writers as writers
+
+
+def dump_sentence(sentence, fout):
+	"""
+	The function `dump_sentence` appends the columns of a sentence to a candidates cache file.
+
+	Args:
+	  sentence: The `ColumnarSentence` to be cached.
+	  fout: A file opened in binary mode.
+	"""
+
+	pickle.dump((sentence.ids, sentence.forms, sentence.lemmas,
+				 sentence.pos, sentence.heads, sentence.deprels),
+				fout, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_cache(filename, source):
+	"""
+	The function `read_cache` yields the sentences stored in a candidates cache file by `dump_sentence`.
+
+	Args:
+	  filename: The path to the cache file.
+	  source: The identifier of the corpus the sentences come from.
+	"""
+
+	with open(filename, "rb") as fin:
+		while True:
+			try:
+				columns = pickle.load(fin)
+			except EOFError:
+				return
+
+			sentence = objs.ColumnarSentence(source=source)
+			sentence.ids, sentence.forms, sentence.lemmas, \
+				sentence.pos, sentence.heads, sentence.deprels = columns
+			yield sentence
+
+
+def scan(filename, source, consumers, start=0, end=None, stage="all"):
+	"""
+	The function `scan` reads a corpus file once and feeds each sentence to all the `consumers`, in
+	the given order.
+
+	Args:
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  consumers: A list of functions taking a `ColumnarSentence` as their only argument.
+	  start: Byte offset of the sentence boundary from which reading starts (see `utils.read`).
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
+	  stage: The name of the stage the scan is recorded under, if metrics are enabled (see
+	`TAM.metrics`).
+	"""
+
+	with metrics.scan(stage, filename, source, start, end) as file_scan:
+		sentences = file_scan.sentences(utils.read(filename, source, start, end, file_scan.reader_stats))
+		for sentence in tqdm.tqdm(sentences):
+			for consumer in consumers:
+				consumer(sentence)
+
+
+def first_pass(filename, source, cache_prefix, patterns=matcher.DEFAULT_PATTERNS):
+	"""
+	The function `first_pass` scans a corpus file, counting its nouns and caching (in
+	`{cache_prefix}.cache`) the sentences in which at least one pattern of `patterns` matches,
+	regardless of accepted lists.
+
+	Args:
+	  filename: The path to the corpus file.
+	  source: The identifier of the corpus format, as used by `utils.read`.
+	  cache_prefix: The path prefix of the cache file.
+	  patterns: The path to the pattern specification file (see `TAM.matcher`).
+
+	Returns:
+	  The noun counters, as returned by `extract.count_NOUN`.
+	"""
+
+	counters = extract.new_counters("nouns")
+	pattern_matcher = matcher.load_patterns(patterns)
+
+	with open(f"{cache_prefix}.cache", "wb") as cache:
+
+		def count_nouns(sentence):
+			extract.process_NOUN(sentence, counters)
+
+		def cache_candidates(sentence):
+			if pattern_matcher.has_candidate(sentence):
+				dump_sentence(sentence, cache)
+
+		scan(filename, source, [count_nouns, cache_candidates])
+
+	return counters
+
+
+def _first_pass_all(input_files, cache_directory, n_workers, patterns):
+	"""
+	The function `_first_pass_all` runs `first_pass` on all input files, in a pool of `n_workers`
+	processes (largest files first) if `n_workers` is greater than 1.
+
+	Returns:
+	  A list of (`source`, `file_id`, `counters`) triples, in the same order as `input_files`.
+	"""
+
+	cache_prefixes = [cache_directory.joinpath(f"{source}_{file_id}")
+					  for source, file_id, _ in input_files]
+
+	if n_workers <= 1:
+		return [(source, file_id, first_pass(path, source, prefix, patterns))
+				for (source, file_id, path), prefix in zip(input_files, cache_prefixes)]
+
+	order = sorted(range(len(input_files)), key=lambda file_n: -index.corpus_size(input_files[file_n][2]))
+	counters = [None] * len(input_files)
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+		futures = {}
+		for file_n in order:
+			source, _, path = input_files[file_n]
+			futures[executor.submit(first_pass, path, source, cache_prefixes[file_n], patterns)] = file_n
+
+		for future in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
+			counters[futures[future]] = future.result()
+
+	return [(source, file_id, file_counters)
+			for (source, file_id, _), file_counters in zip(input_files, counters)]
+
+
+def _write_all(results, write_function, output_directory):
+	"""
+	The function `_write_all` writes per-file frequency lists with `write_function` and merged lists
+	(`{name}_merged.tsv`) with `utils.write_frequencies`.
+	"""
+
+	for source, file_id, counters in results:
+		write_function(counters, source, file_id, output_directory)
+
+	merged = parallel.reduce_counters(counters for _, _, counters in results)
+	for name, freqs in merged.items():
+		utils.write_frequencies(freqs, output_directory.joinpath(f"{name}_merged.tsv"))
+
+
+def run_all(input_files, output_directory,
+			threshold, nouns_threshold, prefs_threshold, adverbs_threshold, ctx,
+			accepted_prefs=None, accepted_adverbs=None, n_workers=1,
+			patterns=matcher.DEFAULT_PATTERNS, max_open_files=writers.MAX_OPEN, store=False):
+	"""
+	The function `run_all` runs the `frequencies`, `merge`, `extract` and `contexts` steps for all the
+	constructions of a pattern specification file, parsing each corpus file only once. The patterns
+	of all constructions are then matched in a single sweep over the cached candidate sentences for
+	extraction, and in another one for contexts.
+
+	Outputs are organized in subfolders of `output_directory`: `noun_frequencies`, and
+	`{output_name}_frequencies` and `{output_name}_contexts` for each construction (e.g.,
+	`compound_frequencies`, `ngrams_frequencies`, `compound_contexts` and `ngrams_contexts`), contain
+	the same files the single steps would produce (merged lists are named `{name}_merged.tsv`), while
+	`cache` contains the candidate sentences of each corpus file.
+
+	Args:
+	  input_files: A list of (`source`, `file_id`, `path`) triples.
+	  output_directory: The folder where outputs are written.
+	  threshold: Minimum noun frequency for constructions to be extracted.
+	  nouns_threshold: Minimum frequency (in the extracted constructions) of nouns whose contexts are
+	extracted.
+	  prefs_threshold: Minimum frequency of prefixes whose contexts are extracted.
+	  adverbs_threshold: Minimum frequency of adverbs whose contexts are extracted.
+	  ctx: Width of left and right contexts.
+	  accepted_prefs: Path to a list of accepted prefixes; if `None`, the merged list of extracted
+	prefixes is used.
+	  accepted_adverbs: Path to a list of accepted adverbs; if `None`, the merged list of extracted
+	adverbs is used.
+	  n_workers: Number of worker processes for the first pass.
+	  patterns: The path to the pattern specification file (see `TAM.matcher`). Accepted keys of
+	constructions other than "prefs" and "adverbs" are read from their merged lists, with
+	`nouns_threshold`.
+	  max_open_files: Maximum number of contexts files open at the same time (see `TAM.writers`).
+	  store: Whether contexts are written to a context store (see `TAM.context_store`) in each
+	contexts folder, instead of TSV files.
+	"""
+
+	pattern_matcher = matcher.load_patterns(patterns)
+	constructions = pattern_matcher.constructions
+
+	directories = {}
+	for name in ["noun_frequencies", "cache"]:
+		directories[name] = output_directory.joinpath(name)
+		directories[name].mkdir(parents=True, exist_ok=True)
+
+	frequencies_directories = {}
+	contexts_directories = {}
+	for name, construction in constructions.items():
+		frequencies_directories[name] = output_directory.joinpath(f"{construction.output_name}_frequencies")
+		contexts_directories[name] = output_directory.joinpath(f"{construction.output_name}_contexts")
+		frequencies_directories[name].mkdir(parents=True, exist_ok=True)
+		contexts_directories[name].mkdir(parents=True, exist_ok=True)
+
+	# first pass: parse corpora, count nouns and cache candidate sentences
+	results = _first_pass_all(input_files, directories["cache"], n_workers, patterns)
+	_write_all(results, extract.write_NOUN, directories["noun_frequencies"])
+
+	accepted_nouns = utils.load_from_file(directories["noun_frequencies"].joinpath("nouns_merged.tsv"),
+										  threshold)
+
+	# second pass: count all constructions over cached candidates
+	accepted = {name: {"nouns": accepted_nouns} for name in constructions}
+	results = {name: [] for name in constructions}
+	for source, file_id, _ in input_files:
+		counters = {name: extract.new_construction_counters(construction)
+					for name, construction in constructions.items()}
+
+		cache = directories["cache"].joinpath(f"{source}_{file_id}.cache")
+		with metrics.scan("all.extract", cache, source) as file_scan:
+			sentences = file_scan.sentences(read_cache(cache, source))
+			for sentence in sentences:
+				extract.process_matches(pattern_matcher, sentence, accepted, counters, file_scan.matches)
+
+		for name in constructions:
+			results[name].append((source, file_id, counters[name]))
+
+	for name, construction in constructions.items():
+		_write_all(results[name], functools.partial(extract.write_construction, construction),
+				   frequencies_directories[name])
+
+	# third pass: extract contexts of all constructions over cached candidates
+	accepted_keys = {"prefs": (accepted_prefs, prefs_threshold),
+					 "adverbs": (accepted_adverbs, adverbs_threshold)}
+
+	accepted = {}
+	for name, construction in constructions.items():
+		accepted[name] = {"nouns": utils.load_from_file(
+			frequencies_directories[name].joinpath("nouns_merged.tsv"), nouns_threshold)}
+
+		if construction.key_list is not None:
+			keys_filename, keys_threshold = accepted_keys.get(construction.key_list, (None, nouns_threshold))
+			if keys_filename is None:
+				keys_filename = frequencies_directories[name].joinpath(f"{construction.key_list}_merged.tsv")
+			accepted[name][construction.key_list] = utils.load_from_file(keys_filename, keys_threshold)
+
+	if store:
+		pool = contexts.contexts_store_writers(contexts_directories, constructions)
+	else:
+		pool = contexts.contexts_writers(contexts_directories, max_open_files)
+
+	with pool:
+		for source, file_id, _ in input_files:
+			cache = directories["cache"].joinpath(f"{source}_{file_id}.cache")
+			with metrics.scan("all.contexts", cache, source) as file_scan:
+				file_scan.watch(pool)
+				sentences = file_scan.sentences(read_cache(cache, source))
+				for sentence in sentences:
+					contexts.process_ctx_matches(pattern_matcher, sentence, source, accepted, ctx,
+												 pool, file_scan.matches)
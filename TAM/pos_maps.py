@@ -36,4 +36,30 @@ wikiCoNLL_map = {
     "A": "ADJ",
     "B": "ADV",
     "D": "DET",
-}
\ No newline at end of file
+}
+
+# Universal Dependencies tags are stored as small integer codes in columnar sentences
+# (see `objects.ColumnarSentence`). Code 0 is reserved for native tags that none of the
+# maps above normalizes.
+UPOS = ("_", "ADJ", "ADP", "ADV", "AUX", "CCONJ", "DET", "INTJ", "NOUN",
+        "NUM", "PART", "PRON", "PROPN", "PUNCT", "SCONJ", "SYM", "VERB", "X")
+
+upos_codes = {tag: code for code, tag in enumerate(UPOS)}
+
+ADJ = upos_codes["ADJ"]
+ADV = upos_codes["ADV"]
+DET = upos_codes["DET"]
+NOUN = upos_codes["NOUN"]
+
+
+def pos_code(tag):
+	"""
+	The function `pos_code` returns the integer code of a (normalized) part of speech tag.
+
+	Args:
+	  tag: The part of speech tag, as produced by one of the maps in this module.
+
+	Returns:
+	  The code of `tag` in `UPOS`, or 0 if `tag` is not a Universal Dependencies tag.
+	"""
+	return upos_codes.get(tag, 0)
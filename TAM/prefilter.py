@@ -0,0 +1,178 @@
+"""
+This python module derives, from the patterns of a `matcher.Matcher`, cheap predicates telling
+whether any pattern can possibly match a sentence, which are pushed down to the readers of
+`TAM.utils`: sentences are checked on their raw lines, and only those passing the check are parsed
+into `ColumnarSentence` objects. Since most sentences contain no candidate of rare constructions
+(e.g., no hyphenated noun), most of a corpus is skipped without being parsed.
+
+A pattern can only match a sentence if, for each of its required tokens:
+- a token line has a native part of speech tag that may be normalized to one of the tags of the
+token (see `TAM.pos_maps`);
+- the sentence contains the strings of its `contains` and `split` predicates (only strings without
+cased characters and whitespace are checked, since forms are lowercased by the readers and may be
+joined by the merges of previous matches).
+
+Checks are conservative: a sentence passing them may still not match (e.g., its tokens are not
+adjacent), but a sentence failing them never does, so results are the same as without pushdown.
+Predicates are only pushed down if each pattern requires a string: part of speech tags alone are
+found in most sentences, and searching them costs more than parsing the sentences they fail to skip.
+Sentences of encoded corpora (see `TAM.encoded`) are checked on their part of speech column, with
+the regular expression of the matcher, before their other columns are looked up.
+"""
+import re
+
+import TAM.pos_maps as pmaps
+
+# for each corpus format: the map of its tags, whether tags missing from the map are looked up by
+# their first character (see `utils._pos_code`), the encoding of its files and the regular
+# expression matching what precedes the part of speech column in a token line (lines are stripped
+# by the readers before being split into columns)
+FORMATS = {
+	"ITWAC": (pmaps.itwac_map, False, "iso-8859-1", rb"^(?!<)[^\S\n]*[^\t\n]*\t"),
+	"REPUBBLICA": (pmaps.repubblica_map, True, "utf-8", rb"^(?!<)[^\S\n]*(?:[^\t\n]*\t){4}[^\t\n\w]*"),
+	"WIKICONLL": (pmaps.wikiCoNLL_map, True, "utf-8", rb"^[^\S\n]*(?:[^\t\n]*\t){3}"),
+}
+
+
+def _tags(codes, pos_map, prefix_fallback):
+	"""
+	The function `_tags` returns the native tags that may be normalized to one of `codes`, and the
+	first characters of the tags missing from `pos_map` that may be normalized to one of `codes`.
+	"""
+
+	tags = {tag for tag, normalized in pos_map.items() if pmaps.pos_code(normalized) in codes}
+	# tags missing from the map are kept as they are
+	tags.update(tag for tag in pmaps.UPOS if pmaps.upos_codes[tag] in codes)
+
+	prefixes = set()
+	if prefix_fallback:
+		prefixes = {tag for tag in tags if len(tag) == 1 and tag in pos_map}
+
+	return sorted(tags, key=lambda tag: (-len(tag), tag)), sorted(prefixes)
+
+
+def tag_regex(codes, source):
+	"""
+	The function `tag_regex` compiles a regular expression finding the token lines of a `source`
+	corpus whose part of speech tag may be normalized to one of `codes`.
+
+	Args:
+	  codes: A set of part of speech codes (see `pos_maps.pos_code`).
+	  source: The identifier of the corpus format, as used by `utils.read`.
+
+	Returns:
+	  A compiled regular expression over bytes, or `None` if any tag may be normalized to one of
+	`codes` (i.e., they include the code of unknown tags).
+	"""
+
+	if 0 in codes:
+		return None
+
+	pos_map, prefix_fallback, _, column = FORMATS[source]
+	tags, prefixes = _tags(codes, pos_map, prefix_fallback)
+	alternation = b"|".join(re.escape(tag.encode("ascii")) for tag in tags)
+
+	if source == "ITWAC":
+		# the reader keeps what precedes the first colon of the tag
+		tag = b"(?:" + alternation + rb")[:\t]"
+	else:
+		tag = b"(?:" + alternation + rb")[^\t\n\w]*(?:\t|$)"
+		if prefixes:
+			tag = b"(?:" + tag + b"|[" + b"".join(re.escape(prefix.encode("ascii")) for prefix in prefixes) + b"])"
+
+	return re.compile(column + tag, re.MULTILINE)
+
+
+def _literal(string, encoding):
+	"""
+	The function `_literal` returns `string` encoded as it appears in the raw lines of a corpus, or
+	`None` if it cannot be checked on raw lines.
+	"""
+
+	if string is None or string.lower() != string.upper() or any(char.isspace() for char in string):
+		return None
+
+	try:
+		return string.encode(encoding)
+	except UnicodeEncodeError:
+		return None
+
+
+class Prefilter:
+	"""
+	The Prefilter class holds the predicates pushed down to the readers of `TAM.utils` for the
+	patterns of a `matcher.Matcher`, regardless of `accept` constraints.
+	"""
+
+	def __init__(self, pattern_matcher):
+		"""
+		This function initializes the predicates of a matcher; those of each corpus format are
+		compiled when first requested.
+
+		Args:
+		  pattern_matcher: The `matcher.Matcher` whose patterns are checked.
+		"""
+
+		self.regex = pattern_matcher.regex
+		self.patterns = [pattern for construction in pattern_matcher.constructions.values()
+						 for pattern in construction.patterns]
+		self.predicates = {}
+
+	def raw_predicate(self, source):
+		"""
+		The function `raw_predicate` returns a function taking the raw lines of a sentence of a
+		`source` corpus (as a single bytes object) and returning `False` if no pattern can match the
+		sentence, or `None` if some pattern requires no string that can be checked on raw lines.
+		"""
+
+		if source not in self.predicates:
+			self.predicates[source] = self._compile(source)
+		return self.predicates[source]
+
+	def _compile(self, source):
+		encoding = FORMATS[source][2]
+
+		regexes = {}
+		requirements = []
+		for pattern in self.patterns:
+			literals = set()
+			pattern_regexes = []
+			for token in pattern.required:
+				for string in (token.contains, token.split):
+					literal = _literal(string, encoding)
+					if literal is not None:
+						literals.add(literal)
+
+				if token.codes not in regexes:
+					regexes[token.codes] = tag_regex(token.codes, source)
+				regex = regexes[token.codes]
+				if regex is not None and regex not in pattern_regexes:
+					pattern_regexes.append(regex)
+
+			# a requirement on tags alone is not selective enough to be worth checking
+			if not literals:
+				return None
+
+			# literals are checked first, being the cheapest and most selective
+			requirement = (tuple(sorted(literals)), tuple(pattern_regexes))
+			if requirement not in requirements:
+				requirements.append(requirement)
+
+		def predicate(block):
+			for literals, pattern_regexes in requirements:
+				if all(literal in block for literal in literals) and \
+					all(regex.search(block) is not None for regex in pattern_regexes):
+					return True
+			return False
+
+		return predicate
+
+	def pos_predicate(self):
+		"""
+		The function `pos_predicate` returns a function taking the part of speech column of a
+		sentence of an encoded corpus (a bytes-like object of codes) and returning `False` if no
+		pattern can be anchored in it.
+		"""
+
+		search = self.regex.search
+		return lambda pos: search(pos) is not None
@@ -0,0 +1,520 @@
+"""
+This python module runs a pipeline of steps (`frequencies`, `merge`, `extract`, `contexts`,
+`sample`, ...) described in a YAML file, such as `data/pipeline.yaml`, with a content-addressed cache
+of their outputs.
+
+Each stage of the pipeline is a subcommand of `main.py` with its options, e.g.:
+
+```yaml
+stages:
+  noun_frequencies:
+    step: frequencies
+    input-files-list: data/files_input.tsv
+    output-folder: data/noun_frequencies
+```
+
+The runner knows which options of each step are inputs (corpora, frequency lists, folders) and
+which is the output, so that a stage reading the output of another one runs after it, while
+independent stages (e.g., the compound and the ngram branches) run concurrently.
+
+The key of a stage is a hash of its step, of its options and of its inputs: files that are not
+produced by other stages are identified by their size and modification time (or by their content),
+outputs of other stages by the key of the stage that produced them. Outputs are written to
+`{cache}/objects/{key}`, read from there by the following stages, and copied to the output folder of
+the stage. A stage whose key is already in the cache is not run again.
+"""
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# default folder of the cache
+CACHE_FOLDER = ".tam_cache"
+
+# inputs and output of each step, by argument name: `corpora` are lists of input files, whose
+# corpus files are inputs as well
+STEPS = {
+	"frequencies": {"corpora": ["input_files_list"], "inputs": [], "output": "output_folder"},
+	"encode": {"corpora": ["input_files_list"], "inputs": [], "output": "output_folder"},
+	"merge": {"corpora": [], "inputs": ["input_folder"], "output": "output_folder"},
+	"extract": {"corpora": ["input_files"], "inputs": ["nouns_filename", "patterns"],
+				"output": "output_folder"},
+	"contexts": {"corpora": ["input_files"],
+				 "inputs": ["accepted_nouns", "accepted_prefs", "accepted_adverbs", "patterns"],
+				 "output": "output_folder"},
+	"sample": {"corpora": [], "inputs": ["input_folder"], "output": "output_folder"},
+	"export": {"corpora": [], "inputs": ["input_store"], "output": "output_folder"},
+	"sketchengine": {"corpora": [], "inputs": [], "output": "output_folder"},
+	"all": {"corpora": ["input_files"], "inputs": ["accepted_prefs", "accepted_adverbs", "patterns"],
+			"output": "output_folder"},
+}
+
+# arguments that do not change the outputs of a step, left out of its key
+UNKEYED_ARGUMENTS = {"workers", "shards", "max_open_files", "max_items", "temp_folder",
+					 "checkpoint_every", "resume", "metrics", "profile", "max_requests", "rate",
+					 "response_cache"}
+
+# subfolders of output folders that are not outputs (see `TAM.checkpoint` and `TAM.metrics`)
+UNCACHED_FOLDERS = {".checkpoints", ".profile"}
+
+
+class Stage:
+	"""
+	The Stage class holds a stage of a pipeline: a step and its arguments.
+	"""
+
+	def __init__(self, name, step, options, parser):
+		"""
+		This function initializes a stage, checking its options with the parser of its step.
+
+		Args:
+		  name: The name of the stage in the pipeline file.
+		  step: The subcommand run by the stage, one of `STEPS`.
+		  options: A dictionary mapping option names (e.g., "output-folder") to their values; options
+		set to `true` are passed as flags, options set to `false` or `null` are left out.
+		  parser: The `argparse.ArgumentParser` of the subcommand.
+		"""
+
+		if step not in STEPS:
+			raise ValueError(f"Unknown step {step} in stage {name}")
+
+		self.name = name
+		self.step = step
+		self.options = {option.replace("-", "_"): value for option, value in options.items()}
+		self.args = vars(parser.parse_args(self.argv()))
+
+		spec = STEPS[step]
+		self.corpora = {dest: _absolute(self.args[dest]) for dest in spec["corpora"]}
+		self.inputs = {dest: _absolute(self.args[dest]) for dest in spec["inputs"]
+					   if self.args[dest] is not None}
+		self.output = _absolute(self.args[spec["output"]])
+
+		# the path other stages read the outputs from: a single file for `merge`
+		if step == "merge":
+			self.produces = self.output.joinpath(self.args["output_filename"])
+		else:
+			self.produces = self.output
+
+		self.depends = set()
+
+	def argv(self, overrides=None):
+		"""
+		The function `argv` returns the command line arguments of the stage, with the values of
+		`overrides` (a dictionary indexed by argument name) in place of the original ones.
+		"""
+
+		options = dict(self.options)
+		options.update(overrides or {})
+
+		argv = []
+		for dest, value in options.items():
+			if value is None or value is False:
+				continue
+			argv.append("--" + dest.replace("_", "-"))
+			if value is not True:
+				argv.append(str(value))
+
+		return argv
+
+
+def _absolute(path):
+	return Path(os.path.abspath(path))
+
+
+def _is_within(path, directory):
+	return path == directory or directory in path.parents
+
+
+def load_pipeline(filename, parsers):
+	"""
+	The function `load_pipeline` reads a pipeline file and links each stage to the stages it depends
+	on.
+
+	Args:
+	  filename: The path to the YAML pipeline file, with a `stages` mapping from stage names to
+	options (see the module documentation).
+	  parsers: A dictionary mapping each subcommand to its `argparse.ArgumentParser`.
+
+	Returns:
+	  The list of `Stage` objects, in an order in which each stage follows the stages it depends on.
+	"""
+
+	with open(filename, encoding="utf-8") as fin:
+		config = yaml.safe_load(fin)
+
+	stages = []
+	for name, options in config["stages"].items():
+		options = dict(options)
+		step = options.pop("step", None)
+		if step not in parsers:
+			raise ValueError(f"Unknown step {step} in stage {name}")
+		stages.append(Stage(name, step, options, parsers[step]))
+
+	produced = {}
+	for stage in stages:
+		if stage.produces in produced:
+			raise ValueError(f"Stages {produced[stage.produces].name} and {stage.name} "
+							 f"write the same output {stage.produces}")
+		produced[stage.produces] = stage
+
+	for stage in stages:
+		for path in list(stage.corpora.values()) + list(stage.inputs.values()):
+			producer = _producer(stages, stage, path)
+			if producer is not None:
+				stage.depends.add(producer.name)
+
+	return _topological_order(stages)
+
+
+def _producer(stages, stage, path):
+	"""
+	The function `_producer` returns the stage whose output contains `path` (the most specific one,
+	if several do), or `None`.
+	"""
+
+	candidates = [other for other in stages
+				  if other is not stage and _is_within(path, other.produces)]
+	if not candidates:
+		return None
+
+	return max(candidates, key=lambda other: len(other.produces.parts))
+
+
+def _topological_order(stages):
+	order = []
+	done = set()
+
+	remaining = list(stages)
+	while remaining:
+		ready = [stage for stage in remaining if stage.depends <= done]
+		if not ready:
+			raise ValueError("Pipeline stages depend on each other: " +
+							 ", ".join(stage.name for stage in remaining))
+		for stage in ready:
+			order.append(stage)
+			done.add(stage.name)
+		remaining = [stage for stage in remaining if stage.name not in done]
+
+	return order
+
+
+class PipelineCache:
+	"""
+	The PipelineCache class keeps the outputs of stages in folder `{directory}/objects`, indexed by
+	their keys, and the state of the output folders in `{directory}/stages`.
+	"""
+
+	def __init__(self, directory=CACHE_FOLDER, hash_content=False, code_paths=()):
+		"""
+		This function initializes a cache, creating its folders if needed.
+
+		Args:
+		  directory: The folder of the cache.
+		  hash_content: If `True`, input files are identified by a hash of their content, otherwise
+		by their path, size and modification time.
+		  code_paths: Source files whose content is part of every key (e.g., `main.py`), so that
+		cached outputs are not used by a different version of the code.
+		"""
+
+		self.directory = _absolute(directory)
+		self.hash_content = hash_content
+
+		for name in ["objects", "stages", "logs"]:
+			self.directory.joinpath(name).mkdir(parents=True, exist_ok=True)
+
+		self.hashes_filename = self.directory.joinpath("hashes.json")
+		self.hashes = {}
+		if hash_content and self.hashes_filename.exists():
+			with open(self.hashes_filename, encoding="utf-8") as fin:
+				self.hashes = json.load(fin)
+
+		code_paths = sorted([Path(path) for path in code_paths] + list(Path(__file__).parent.glob("*.py")))
+		digest = hashlib.sha256()
+		for path in code_paths:
+			digest.update(self._content_hash(path).encode("utf-8"))
+		self.code_hash = digest.hexdigest()
+
+	def object_directory(self, key):
+		return self.directory.joinpath("objects", key)
+
+	def _manifest_filename(self, key):
+		return self.directory.joinpath("objects", f"{key}.json")
+
+	def log_filename(self, stage):
+		return self.directory.joinpath("logs", f"{stage.name}.log")
+
+	def is_cached(self, key):
+		return self._manifest_filename(key).exists()
+
+	def files(self, key):
+		"""
+		The function `files` returns the paths of the outputs of `key`, relative to its object folder.
+		"""
+
+		with open(self._manifest_filename(key), encoding="utf-8") as fin:
+			return json.load(fin)["files"]
+
+	@staticmethod
+	def _content_hash(path):
+		digest = hashlib.sha256()
+		with open(path, "rb") as fin:
+			for block in iter(lambda: fin.read(1 << 20), b""):
+				digest.update(block)
+		return digest.hexdigest()
+
+	def file_fingerprint(self, path):
+		"""
+		The function `file_fingerprint` identifies the current version of a file or folder that is
+		not the output of a stage.
+		"""
+
+		if path.is_dir():
+			return sorted((str(child.relative_to(path)), self.file_fingerprint(child))
+						  for child in path.rglob("*") if child.is_file())
+
+		if not path.exists():
+			return "missing"
+
+		if self.directory in path.parents:
+			return str(path.relative_to(self.directory))
+
+		stat = path.stat()
+		if not self.hash_content:
+			return [str(path), stat.st_size, stat.st_mtime_ns]
+
+		state = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+		if state not in self.hashes:
+			self.hashes[state] = self._content_hash(path)
+		return self.hashes[state]
+
+	def save_hashes(self):
+		if self.hash_content:
+			_write_json(self.hashes_filename, self.hashes)
+
+	def commit(self, key, stage):
+		"""
+		The function `commit` records the outputs of a stage that completed successfully.
+		"""
+
+		directory = self.object_directory(key)
+		files = sorted(str(path.relative_to(directory)) for path in directory.rglob("*")
+					   if path.is_file() and UNCACHED_FOLDERS.isdisjoint(path.relative_to(directory).parts))
+
+		_write_json(self._manifest_filename(key), {"stage": stage.name, "step": stage.step,
+												   "argv": stage.argv(), "files": files})
+
+	def materialize(self, key, stage):
+		"""
+		The function `materialize` copies the outputs of `key` to the output folder of `stage`,
+		removing the files copied there for a previous key of the same stage.
+		"""
+
+		directory = self.object_directory(key)
+		files = self.files(key)
+
+		state_filename = self.directory.joinpath("stages", f"{stage.name}.json")
+		if state_filename.exists():
+			with open(state_filename, encoding="utf-8") as fin:
+				state = json.load(fin)
+			if state["output"] == str(stage.output):
+				for filename in set(state["files"]) - set(files):
+					stage.output.joinpath(filename).unlink(missing_ok=True)
+
+		for filename in files:
+			source = directory.joinpath(filename)
+			target = stage.output.joinpath(filename)
+			if target.exists():
+				source_stat, target_stat = source.stat(), target.stat()
+				if source_stat.st_size == target_stat.st_size and \
+					source_stat.st_mtime_ns == target_stat.st_mtime_ns:
+					continue
+			target.parent.mkdir(parents=True, exist_ok=True)
+			shutil.copy2(source, target)
+
+		_write_json(state_filename, {"key": key, "output": str(stage.output), "files": files})
+
+
+def _write_json(filename, obj):
+	temp_filename = f"{filename}.{os.getpid()}.tmp"
+	with open(temp_filename, "w", encoding="utf-8") as fout:
+		json.dump(obj, fout, indent=1)
+	os.replace(temp_filename, filename)
+
+
+def _resolve(path, stages_by_produces, keys, cache):
+	"""
+	The function `_resolve` returns the path from which a stage reads `path`, and its fingerprint:
+	outputs of other stages are read from their object folders.
+	"""
+
+	candidates = [produces for produces in stages_by_produces if _is_within(path, produces)]
+	if candidates:
+		producer = stages_by_produces[max(candidates, key=lambda produces: len(produces.parts))]
+		key = keys[producer.name]
+		cached_path = cache.object_directory(key).joinpath(path.relative_to(producer.output))
+		if cached_path.exists():
+			return cached_path, ["stage", key, str(path.relative_to(producer.output))]
+
+	return path, cache.file_fingerprint(path)
+
+
+def stage_key(stage, stages_by_produces, keys, cache):
+	"""
+	The function `stage_key` computes the key of a stage, whose dependencies have already been run.
+
+	Args:
+	  stage: The `Stage`.
+	  stages_by_produces: A dictionary mapping the output path of each stage (see `Stage.produces`) to
+	the stage.
+	  keys: A dictionary mapping the name of each stage already run to its key.
+	  cache: The `PipelineCache`.
+
+	Returns:
+	  The key (a hexadecimal string) and a dictionary mapping the names of input arguments to the
+	paths the stage reads them from.
+	"""
+
+	stages_by_produces = {produces: other for produces, other in stages_by_produces.items()
+						  if other is not stage}
+	resolved = {}
+	fingerprints = {}
+
+	for dest, path in stage.inputs.items():
+		resolved[dest], fingerprints[dest] = _resolve(path, stages_by_produces, keys, cache)
+
+	for dest, path in stage.corpora.items():
+		resolved[dest], fingerprint = _resolve(path, stages_by_produces, keys, cache)
+		corpora = []
+		if resolved[dest].is_file():
+			with open(resolved[dest], encoding="utf-8") as fin:
+				for line in fin:
+					linesplit = line.strip().split("\t")
+					if len(linesplit) == 3:
+						corpora.append(_resolve(_absolute(linesplit[2]), stages_by_produces,
+												keys, cache)[1])
+		fingerprints[dest] = [fingerprint, corpora]
+
+	spec = STEPS[stage.step]
+	arguments = {dest: str(value) for dest, value in sorted(stage.args.items())
+				 if dest not in fingerprints and dest != spec["output"] and
+				 dest not in UNKEYED_ARGUMENTS and not callable(value)}
+
+	description = json.dumps({"version": CACHE_VERSION, "code": cache.code_hash, "step": stage.step,
+							  "arguments": arguments, "inputs": fingerprints}, sort_keys=True)
+
+	resolved = {dest: path for dest, path in resolved.items()
+				if path != stage.inputs.get(dest, stage.corpora.get(dest))}
+	return hashlib.sha256(description.encode("utf-8")).hexdigest(), resolved
+
+
+def _run_stage(stage, argv, log_filename, command):
+	with open(log_filename, "w", encoding="utf-8") as log:
+		completed = subprocess.run(list(command) + [stage.step] + argv, stdout=log,
+								   stderr=subprocess.STDOUT, check=False)
+	return completed.returncode
+
+
+def run_pipeline(stages, cache, command, n_jobs=1, force=False, dry_run=False):
+	"""
+	The function `run_pipeline` runs the stages of a pipeline whose outputs are not cached, at most
+	`n_jobs` at a time, each as soon as the stages it depends on are done.
+
+	Args:
+	  stages: The list of `Stage` objects returned by `load_pipeline`.
+	  cache: The `PipelineCache`.
+	  command: The command running a step, followed by the step and its arguments, e.g.
+	[sys.executable, "main.py"].
+	  n_jobs: The maximum number of stages run at the same time.
+	  force: If `True`, all stages are run again, replacing their cached outputs.
+	  dry_run: If `True`, stages are listed (as cached or to be run) but not run.
+
+	Returns:
+	  A dictionary mapping the name of each stage to its key (`None` for stages that could not be
+	keyed in a dry run, because they depend on stages to be run).
+	"""
+
+	stages_by_produces = {stage.produces: stage for stage in stages}
+	keys = {}
+	done = set()
+	pending = list(stages)
+	running = {}
+	failed = []
+
+	def start(stage):
+		key, resolved = stage_key(stage, stages_by_produces, keys, cache)
+		keys[stage.name] = key
+
+		if cache.is_cached(key) and not force:
+			print(f"{stage.name}: cached ({key[:12]})")
+			if not dry_run:
+				cache.materialize(key, stage)
+			done.add(stage.name)
+			return None
+
+		print(f"{stage.name}: {'to be run' if dry_run else 'running'} ({key[:12]})")
+		if dry_run:
+			return None
+
+		directory = cache.object_directory(key)
+		if directory.exists() and not stage.args.get("resume"):
+			shutil.rmtree(directory)
+		directory.mkdir(parents=True, exist_ok=True)
+
+		resolved[STEPS[stage.step]["output"]] = directory
+		argv = stage.argv(resolved)
+		logger.info("Running stage %s: %s", stage.name, " ".join(argv))
+		return executor.submit(_run_stage, stage, argv, cache.log_filename(stage), command)
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n_jobs)) as executor:
+		while pending or running:
+			if not failed:
+				for stage in list(pending):
+					if len(running) >= max(1, n_jobs):
+						break
+					if not stage.depends <= done:
+						continue
+
+					pending.remove(stage)
+					future = start(stage)
+					if future is not None:
+						running[future] = stage
+
+			if dry_run:
+				for stage in pending:
+					print(f"{stage.name}: to be run (after {', '.join(sorted(stage.depends - done))})")
+					keys[stage.name] = None
+				break
+
+			if not running:
+				break
+
+			finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+			for future in finished:
+				stage = running.pop(future)
+				if future.result() != 0:
+					failed.append(stage)
+					continue
+
+				key = keys[stage.name]
+				cache.commit(key, stage)
+				cache.materialize(key, stage)
+				done.add(stage.name)
+				print(f"{stage.name}: done ({key[:12]})")
+
+	cache.save_hashes()
+
+	if failed:
+		raise RuntimeError("Stages failed: " + ", ".join(f"{stage.name} (see {cache.log_filename(stage)})"
+														  for stage in failed))
+
+	return keys
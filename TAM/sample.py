@@ -1,8 +1,121 @@
+"""
+This python module samples a fixed number of contexts per noun from contexts files (or context
+stores, see `TAM.context_store`), keeping the proportion among sources.
+
+For each noun, the quota of a source with `x` of the `tot` contexts of the noun is
+`math.ceil(x*n_ctxs/tot)`. By default, contexts are sampled in a single pass: a reservoir of
+`n_ctxs` contexts is kept for each (noun, source) pair, and the quota is drawn from it once all
+frequencies are known, so that memory depends on the number of sampled contexts rather than on
+the size of the input. In exact mode, samples are drawn as in previous versions (two passes over
+the file), so that a seed gives the same contexts it always did.
+
+Each file gets its own random number generator, seeded from the seed and the name of the file (see
+`file_seed`), and sources are sorted, so that files can be sampled in any order, possibly by
+parallel workers, with the same results. Exact mode uses the seed itself and, as previous versions
+did, the iteration order of the set of sources.
+"""
 import collections
+import concurrent.futures
+import functools
+import hashlib
 import random
 import math
+from pathlib import Path
+
+import tqdm
+
+import TAM.context_store as context_store
+
+
+def file_seed(random_seed, name):
+	"""
+	The function `file_seed` derives the seed of the random number generator of a contexts file from
+	the global `random_seed` and the name of the file (e.g., "anti.contexts.tsv").
+	"""
+
+	digest = hashlib.sha256(f"{random_seed}\t{name}".encode("utf-8")).digest()
+	return int.from_bytes(digest[:8], "big")
+
+
+def _write_counts(fout, sources, counts):
+	"""
+	The function `_write_counts` writes the header and the rows of a `*.counts.tsv` file.
+	"""
+
+	sources_str = '\t'.join(sources)
+	print(f"NOUN\t{sources_str}", file=fout)
+
+	for noun in counts:
+		freqs_str = '\t'.join(str(counts[noun].get(source, 0)) for source in sources)
+		print(f"{noun}\t{freqs_str}", file=fout)
+
+
+def _quotas(noun_counts, sources, n_ctxs):
+	"""
+	The function `_quotas` yields the (`source`, `f`, `quota`) triples of a noun, where `quota` is the
+	number of contexts to sample among the `f` contexts of the noun in `source`.
+	"""
+
+	freqs = [noun_counts.get(source, 0) for source in sources]
+	tot = sum(freqs)
+
+	for source, f in zip(sources, freqs):
+		yield source, f, min(f, math.ceil(f*n_ctxs/tot))
+
 
-def sample_contexts(filename, n_ctxs, random_seed, output_directory):
+def sample_rows(rows, n_ctxs, random_seed):
+	"""
+	The function `sample_rows` samples contexts from a stream of rows in a single pass, with a
+	reservoir of `n_ctxs` rows for each (noun, source) pair.
+
+	Args:
+	  rows: An iterable of lines of a `*.contexts.tsv` file.
+	  n_ctxs: The number of contexts to sample for each noun.
+	  random_seed: The seed of the random number generator, see `file_seed`.
+
+	Returns:
+	  A (`key`, `sources`, `counts`, `sampled`) tuple: the key of the rows (their second column, e.g.
+	the prefix), the sorted list of sources, the frequencies of each noun in each source (a dictionary of
+	dictionaries, nouns being in order of first occurrence), and the sampled rows (stripped) in
+	input order.
+	"""
+
+	rng = random.Random(random_seed)
+
+	key = None
+	sources = set()
+	counts = collections.defaultdict(dict)
+	reservoirs = {}
+
+	for row_n, line in enumerate(rows):
+		line = line.strip()
+		source, key, noun, *_ = line.split("\t")
+		sources.add(source)
+
+		noun_counts = counts[noun]
+		seen = noun_counts.get(source, 0)
+		noun_counts[source] = seen + 1
+
+		if seen < n_ctxs:
+			reservoirs.setdefault((noun, source), []).append((row_n, line))
+		else:
+			position = rng.randrange(seen + 1)
+			if position < n_ctxs:
+				reservoirs[(noun, source)][position] = (row_n, line)
+
+	# sources are sorted, so that results do not depend on the hash seed of the process
+	sources = sorted(sources)
+
+	sampled = []
+	for noun in counts:
+		for source, f, quota in _quotas(counts[noun], sources, n_ctxs):
+			if quota > 0:
+				sampled.extend(rng.sample(reservoirs[(noun, source)], quota))
+
+	return key, sources, counts, [line for _, line in sorted(sampled)]
+
+
+def sample_contexts(filename, n_ctxs, random_seed, output_directory, exact=False):
 	"""
 	The function `sample_contexts` reads data from a file, calculates frequencies, samples contexts
 	based on specified criteria, and writes the sampled data to an output file.
@@ -21,13 +134,46 @@ def sample_contexts(filename, n_ctxs, random_seed, output_directory):
 	  output_directory: The `output_directory` parameter is a directory where the output files will be
 	saved. It should be a path to the directory where you want to store the output files generated by
 	the `sample_contexts` function.
+	  exact: Whether contexts are sampled as in previous versions (see `sample_contexts_exact`),
+	instead of in a single pass.
 	"""
 
-	random.seed(random_seed)
+	if exact:
+		sample_contexts_exact(filename, n_ctxs, random_seed, output_directory)
+		return
 
-	counts = collections.defaultdict(
-		lambda: collections.defaultdict(int)
-		)
+	with open(filename, encoding="utf-8") as fin:
+		key, sources, counts, sampled = sample_rows(fin, n_ctxs, file_seed(random_seed, Path(filename).name))
+
+	if key is not None:
+		_write_sample(output_directory, key, sources, counts, sampled)
+
+
+def _write_sample(output_directory, key, sources, counts, sampled):
+	"""
+	The function `_write_sample` writes the `{key}.counts.tsv` and `{key}.sampled.tsv` files.
+	"""
+
+	with open(output_directory.joinpath(f"{key}.counts.tsv"), "w", encoding="utf-8") as fout:
+		_write_counts(fout, sources, counts)
+
+	with open(output_directory.joinpath(f"{key}.sampled.tsv") , "w", encoding="utf-8") as fout:
+		for line in sampled:
+			print(line, file=fout)
+
+
+def sample_contexts_exact(filename, n_ctxs, random_seed, output_directory):
+	"""
+	The function `sample_contexts_exact` samples contexts as previous versions of `sample_contexts`
+	did: frequencies are counted in a first pass over the file, `random.sample` draws the indexes of
+	the contexts of each noun and source, and sampled contexts are written in a second pass. With
+	the same seed, outputs are the same as those of previous versions. Arguments are the same as for
+	`sample_contexts`.
+	"""
+
+	rng = random.Random(random_seed)
+
+	counts = collections.defaultdict(dict)
 
 	sources = set()
 	with open(filename, encoding="utf-8") as fin:
@@ -35,46 +181,132 @@ def sample_contexts(filename, n_ctxs, random_seed, output_directory):
 			linesplit = line.strip().split("\t")
 			source, par1, noun, *_ = linesplit
 			sources.add(source)
-			counts[noun][source] += 1
+			counts[noun][source] = counts[noun].get(source, 0) + 1
+
+	sources = list(sources)
+
+	to_sample = {}
+	for noun in counts:
+		for source, f, quota in _quotas(counts[noun], sources, n_ctxs):
+			to_sample[(noun, source)] = set(rng.sample(range(f), quota))
 
-	to_sample = collections.defaultdict(lambda: collections.defaultdict(list))
 	with open(output_directory.joinpath(f"{par1}.counts.tsv"), "w", encoding="utf-8") as fout:
-		sources = list(sources)
-		sources_str = '\t'.join(sources)
-		print(f"NOUN\t{sources_str}", file=fout)
-		for noun in counts:
-			freqs = [counts[noun][source] for source in sources]
-			tot = sum(freqs)
-			percentages = [math.ceil(x*n_ctxs/tot) for x in freqs]
-
-			pairs = zip(freqs, percentages)
-
-			for i, pair in enumerate(pairs):
-				source = sources[i]
-				f, p = pair
-				to_sample[noun][source] = sorted(random.sample(range(f), min(f, p)))
-
-			freqs = [str(x) for x in freqs]
-			freqs_str = '\t'.join(freqs)
-			print(f"{noun}\t{freqs_str}", file=fout)
-
-	indexes = collections.defaultdict(lambda: collections.defaultdict(int))
+		_write_counts(fout, sources, counts)
+
+	indexes = collections.defaultdict(int)
 	with open(filename, encoding="utf-8") as fin, \
 		open(output_directory.joinpath(f"{par1}.sampled.tsv") , "w", encoding="utf-8") as fout:
 		for line in fin:
 			linesplit = line.strip().split("\t")
 			source, _, noun, *_ = linesplit
 
-			example_id = indexes[noun][source]
-			indexes[noun][source] += 1
+			example_id = indexes[(noun, source)]
+			indexes[(noun, source)] += 1
+
+			if example_id in to_sample[(noun, source)]:
+				print(line.strip(), file=fout)
+
+
+def sample_store_contexts(store, key, n_ctxs, random_seed, output_directory, exact=False):
+	"""
+	The function `sample_store_contexts` samples the contexts of `key` from a context store, with the
+	same results as `sample_contexts` on file `{key}.contexts.tsv`. In exact mode, counts are read
+	from the index of the store and only the sampled rows are read.
+
+	Args:
+	  store: A `context_store.ContextStore`.
+	  key: The key (e.g., the prefix or the adverb) whose contexts are sampled.
+	  n_ctxs: The number of contexts to sample for each noun, see `sample_contexts`.
+	  random_seed: The seed of the random number generator.
+	  output_directory: The folder where `{key}.counts.tsv` and `{key}.sampled.tsv` are written.
+	  exact: Whether contexts are sampled as by `sample_contexts_exact`.
+	"""
+
+	if not exact:
+		_, sources, counts, sampled = sample_rows(store.contexts(key), n_ctxs,
+												  file_seed(random_seed, f"{key}.contexts.tsv"))
+		_write_sample(output_directory, key, sources, counts, sampled)
+		return
+
+	rng = random.Random(random_seed)
+
+	counts = store.counts(key)
+
+	# sources are added in order of first occurrence, so that the set is iterated as if it had been
+	# built while reading the rows
+	sources = set()
+	for source in store.sources(key):
+		sources.add(source)
+	sources = list(sources)
+
+	to_sample = []
+	for noun in counts:
+		for source, f, quota in _quotas(counts[noun], sources, n_ctxs):
+			sampled = rng.sample(range(f), quota)
+			if sampled:
+				row_ids = store.row_ids(key, noun, source)
+				to_sample.extend(row_ids[example_id] for example_id in sampled)
+
+	with open(output_directory.joinpath(f"{key}.counts.tsv"), "w", encoding="utf-8") as fout:
+		_write_counts(fout, sources, counts)
+
+	with open(output_directory.joinpath(f"{key}.sampled.tsv") , "w", encoding="utf-8") as fout:
+		for row in store.get_rows(sorted(to_sample)):
+			print(row.strip(), file=fout)
+
+
+@functools.lru_cache(maxsize=None)
+def _open_store(path):
+	return context_store.ContextStore(path)
+
+
+def _sample_task(path, key, n_ctxs, random_seed, output_directory, exact):
+	"""
+	The function `_sample_task` samples a contexts file (if `key` is `None`) or the contexts of `key`
+	in the context store at `path`.
+	"""
+
+	if key is None:
+		sample_contexts(path, n_ctxs, random_seed, output_directory, exact)
+	else:
+		sample_store_contexts(_open_store(path), key, n_ctxs, random_seed, output_directory, exact)
+
+
+def sample_folder(input_directory, output_directory, n_ctxs, random_seed, exact=False, n_workers=1):
+	"""
+	The function `sample_folder` samples all the `*contexts.tsv` files, and the context stores, of a
+	folder. Results do not depend on the number of workers nor on the order in which files are
+	sampled.
+
+	Args:
+	  input_directory: The folder containing the contexts files and stores.
+	  output_directory: The folder where `*.counts.tsv` and `*.sampled.tsv` files are written.
+	  n_ctxs: The number of contexts to sample for each noun, see `sample_contexts`.
+	  random_seed: The seed from which the seed of each file is derived, see `file_seed`.
+	  exact: Whether contexts are sampled as by `sample_contexts_exact`.
+	  n_workers: The number of worker processes. With 1 (or less) files are sampled one after the
+	other in the current process.
+	"""
+
+	tasks = [(path, None) for path in sorted(input_directory.glob("*contexts.tsv"))]
+
+	for path in sorted(input_directory.glob(f"*{context_store.STORE_SUFFIX}")):
+		if context_store.is_store(path):
+			tasks.extend((path, key) for key in _open_store(path).keys())
+
+	if n_workers <= 1:
+		for path, key in tqdm.tqdm(tasks):
+			_sample_task(path, key, n_ctxs, random_seed, output_directory, exact)
+		return
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+		futures = [executor.submit(_sample_task, path, key, n_ctxs, random_seed, output_directory, exact)
+				   for path, key in tasks]
 
-			if len(to_sample[noun][source]) > 0:
-				if to_sample[noun][source][0] == example_id:
-					print(line.strip(), file=fout)
-					to_sample[noun][source].pop(0)
+		for future in tqdm.tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
+			future.result()
 
 
 if __name__ == "__main__":
-	from pathlib import Path
 	sample_contexts("data/output_compoundcontexts/ex.contexts.tsv", 5, 13, Path("data/output_compoundcontexts/"))
 #TODO: sample contexts and add annotations
\ No newline at end of file
@@ -0,0 +1,487 @@
+"""
+This python module implements the approximate frequency tables used by the `--approximate` mode of
+the `frequencies` and `extract` steps, whose memory does not grow with the vocabulary of the corpus.
+
+Frequency lists are only used to select the keys above a threshold (see `utils.load_from_file`), so
+that exact counts of the long tail of rare keys are not needed. An `ApproximateTable` combines:
+- a Count-Min sketch with conservative update (`CountMinSketch`), which estimates the frequency of
+any key with a fixed number of counters: estimates are never lower than true frequencies, and exceed
+them by at most `e / width * N` (N being the total count) with probability `1 - exp(-depth)`;
+- a Space-Saving summary (`SpaceSaving`), which keeps the `capacity` most frequent keys: every key
+whose frequency is above `N / capacity` is kept.
+
+The frequency of each kept key is the lowest of its two estimates. Tables of different files (or
+shards of a file) are merged by summing their sketches and their summaries, with the same bounds
+over the total count, so that the merge of approximate lists only reads the saved tables (see
+`save` and `merge_files`).
+"""
+import array
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+
+# default number of counters of each row of the sketch, and number of rows: 8 MB per table, with
+# estimates exceeding true frequencies by at most 1.04e-5 * N with probability 0.98
+WIDTH = 1 << 18
+DEPTH = 4
+
+# default number of keys kept by the Space-Saving summary: about 200 bytes per key (300 per pair),
+# i.e. about as much memory as the sketch
+CAPACITY = 40000
+
+# saved tables are written next to the frequency lists, e.g. `ITWAC_0.nouns.sketch`
+SKETCH_SUFFIX = ".sketch"
+
+# maximum number of outcomes of the predicate of `ApproximateTable.add_if` memoized at once
+MAX_FLAGS = 1 << 16
+
+# maximum number of distinct keys whose counts are summed before being added to the sketch and the
+# summary: frequent keys are then hashed once per batch rather than once per occurrence
+MAX_PENDING = 1 << 14
+
+
+def _key_bytes(key):
+	# pairs (as counted for ngrams) are hashed as their two strings separated by a tab
+	if not isinstance(key, str):
+		key = "\t".join(key)
+	return key.encode("utf-8")
+
+
+class CountMinSketch:
+	"""
+	The CountMinSketch class estimates the frequencies of keys with `depth` rows of `width` counters.
+	Each key is hashed to one counter per row, and its estimate is the lowest of them.
+	"""
+	__slots__ = ("width", "depth", "counts", "total")
+
+	def __init__(self, width=WIDTH, depth=DEPTH):
+		"""
+		This function initializes an empty sketch.
+
+		Args:
+		  width: The number of counters of each row.
+		  depth: The number of rows.
+		"""
+
+		self.width = width
+		self.depth = depth
+		self.counts = array.array("Q", [0]) * (width * depth)
+		self.total = 0
+
+	def _cells(self, key):
+		# double hashing: the counter of row i is h1 + i*h2
+		digest = int.from_bytes(hashlib.blake2b(_key_bytes(key), digest_size=8).digest(), "little")
+		h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+		width = self.width
+		return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+	def add(self, key, f=1):
+		"""
+		The function `add` adds `f` to the frequency of `key` with a conservative update: counters
+		are only raised up to the new estimate of the key, which keeps estimates lower than with a
+		plain update. It returns the new estimate.
+		"""
+
+		counts = self.counts
+		cells = self._cells(key)
+
+		estimate = min(counts[cell] for cell in cells) + f
+		for cell in cells:
+			if counts[cell] < estimate:
+				counts[cell] = estimate
+
+		self.total += f
+		return estimate
+
+	def estimate(self, key):
+		"""
+		The function `estimate` returns an upper bound of the frequency of `key`.
+		"""
+
+		counts = self.counts
+		return min(counts[cell] for cell in self._cells(key))
+
+	def merge(self, other):
+		"""
+		The function `merge` adds the counters of a sketch of the same size to this one.
+		"""
+
+		if (self.width, self.depth) != (other.width, other.depth):
+			raise ValueError(f"Cannot merge sketches of different sizes: {self.width}x{self.depth} and "
+							 f"{other.width}x{other.depth}")
+
+		counts = self.counts
+		for cell, f in enumerate(other.counts):
+			if f:
+				counts[cell] += f
+		self.total += other.total
+
+
+class SpaceSaving:
+	"""
+	The SpaceSaving class keeps the (approximately) most frequent keys of a stream, with at most
+	`capacity` counters: a new key takes the place of the key with the lowest count, and inherits its
+	count as an error.
+	"""
+	__slots__ = ("capacity", "counts", "errors", "heap")
+
+	def __init__(self, capacity=CAPACITY):
+		"""
+		This function initializes an empty summary.
+
+		Args:
+		  capacity: The maximum number of keys kept.
+		"""
+
+		if capacity < 1:
+			raise ValueError(f"The capacity of a summary must be positive: {capacity}")
+
+		self.capacity = capacity
+		# keys are kept in order of (last) insertion
+		self.counts = {}
+		self.errors = {}
+		# (count, key) pairs, one per key; counts may be lower than the current ones (see `_min`)
+		self.heap = []
+
+	def _min(self):
+		# counts of the heap are only updated when they reach its top
+		heap = self.heap
+		counts = self.counts
+		while True:
+			f, key = heap[0]
+			if counts[key] == f:
+				return f, key
+			heapq.heapreplace(heap, (counts[key], key))
+
+	def min_count(self):
+		"""
+		The function `min_count` returns the count that keys missing from the summary may have
+		reached, 0 if the summary is not full.
+		"""
+
+		if len(self.counts) < self.capacity:
+			return 0
+		return self._min()[0]
+
+	def add(self, key, f=1):
+		"""
+		The function `add` adds `f` to the count of `key`.
+		"""
+
+		counts = self.counts
+		if key in counts:
+			counts[key] += f
+			return
+
+		if len(counts) < self.capacity:
+			counts[key] = f
+			self.errors[key] = 0
+			heapq.heappush(self.heap, (f, key))
+			return
+
+		min_f, evicted = self._min()
+		del counts[evicted]
+		del self.errors[evicted]
+
+		counts[key] = min_f + f
+		self.errors[key] = min_f
+		heapq.heapreplace(self.heap, (min_f + f, key))
+
+	def merge(self, other):
+		"""
+		The function `merge` adds the counts of another summary to this one: keys missing from a
+		full summary are counted as its lowest count, and the `capacity` keys with the highest counts
+		are kept.
+		"""
+
+		self_min, other_min = self.min_count(), other.min_count()
+
+		counts = {}
+		errors = {}
+		for key in itertools.chain(self.counts, other.counts):
+			if key not in counts:
+				counts[key] = self.counts.get(key, self_min) + other.counts.get(key, other_min)
+				errors[key] = self.errors.get(key, self_min) + other.errors.get(key, other_min)
+
+		if len(counts) > self.capacity:
+			kept = set(heapq.nlargest(self.capacity, counts, key=counts.__getitem__))
+			counts = {key: f for key, f in counts.items() if key in kept}
+			errors = {key: errors[key] for key in counts}
+
+		self.counts = counts
+		self.errors = errors
+		self.heap = [(f, key) for key, f in counts.items()]
+		heapq.heapify(self.heap)
+
+	def __contains__(self, key):
+		return key in self.counts
+
+	def __len__(self):
+		return len(self.counts)
+
+
+class ApproximateTable:
+	"""
+	The ApproximateTable class counts strings in bounded memory, with the same interface as
+	`vocabulary.FrequencyTable`. It is iterated over the keys kept by its Space-Saving summary, in
+	order of insertion, with their estimated frequencies.
+
+	Counts are first summed in a buffer of at most `MAX_PENDING` keys, which is flushed into the
+	sketch and the summary when full and before the table is read or merged. Adding a batch of
+	occurrences at once keeps the bounds of both (see `bounds`).
+	"""
+	__slots__ = ("sketch", "summary", "flags", "pending")
+
+	def __init__(self, width=WIDTH, depth=DEPTH, capacity=CAPACITY):
+		"""
+		This function initializes an empty table.
+
+		Args:
+		  width: The number of counters of each row of the Count-Min sketch.
+		  depth: The number of rows of the Count-Min sketch.
+		  capacity: The number of keys kept by the Space-Saving summary.
+		"""
+
+		self.sketch = CountMinSketch(width, depth)
+		self.summary = SpaceSaving(capacity)
+		self.flags = {}
+		self.pending = {}
+
+	def add(self, key, f=1):
+		"""
+		The function `add` adds `f` to the frequency of `key`.
+		"""
+
+		pending = self.pending
+		if key in pending:
+			pending[key] += f
+			return
+
+		if len(pending) >= MAX_PENDING:
+			self.flush()
+		pending[key] = f
+
+	def flush(self):
+		"""
+		The function `flush` adds the counts of the buffer to the sketch and the summary.
+		"""
+
+		sketch_add = self.sketch.add
+		summary_add = self.summary.add
+		for key, f in self.pending.items():
+			sketch_add(key, f)
+			summary_add(key, f)
+		self.pending.clear()
+
+	def add_if(self, key, predicate, f=1):
+		"""
+		The function `add_if` adds `f` to the frequency of `key` if `predicate(key)` is true. The
+		outcomes of `predicate` are memoized for the last keys seen, therefore the same `predicate`
+		must be used in all calls on the same table.
+		"""
+
+		flags = self.flags
+		flag = flags.get(key)
+		if flag is None:
+			if len(flags) >= MAX_FLAGS:
+				flags.clear()
+			flag = flags[key] = bool(predicate(key))
+
+		if flag:
+			self.add(key, f)
+
+	def items(self):
+		self.flush()
+		estimate = self.sketch.estimate
+		for key, f in self.summary.counts.items():
+			yield key, min(f, estimate(key))
+
+	def keys(self):
+		self.flush()
+		return iter(self.summary.counts)
+
+	def __iter__(self):
+		return self.keys()
+
+	def __getitem__(self, key):
+		self.flush()
+		f = self.sketch.estimate(key)
+		return min(f, self.summary.counts[key]) if key in self.summary else f
+
+	def __contains__(self, key):
+		self.flush()
+		return key in self.summary
+
+	def __len__(self):
+		self.flush()
+		return len(self.summary)
+
+	def bounds(self):
+		"""
+		The function `bounds` returns the error bounds of the table, as a dictionary with:
+		- "total": the total count;
+		- "overestimate": the maximum difference between estimated and true frequencies, with
+		probability "probability";
+		- "guaranteed": the frequency above which all keys are kept.
+		"""
+
+		self.flush()
+		sketch = self.sketch
+		return {"total": sketch.total,
+				"overestimate": math.ceil(math.e / sketch.width * sketch.total),
+				"probability": 1 - math.exp(-sketch.depth),
+				"guaranteed": sketch.total // self.summary.capacity}
+
+	def merge(self, other):
+		"""
+		The function `merge` adds the counts of a table of the same size to this one.
+		"""
+
+		self.flush()
+		other.flush()
+		self.sketch.merge(other.sketch)
+		self.summary.merge(other.summary)
+
+	def copy(self):
+		self.flush()
+		table = self.__class__.__new__(self.__class__)
+		table.sketch = CountMinSketch.__new__(CountMinSketch)
+		table.sketch.width, table.sketch.depth = self.sketch.width, self.sketch.depth
+		table.sketch.counts = array.array("Q", self.sketch.counts)
+		table.sketch.total = self.sketch.total
+		table.summary = SpaceSaving(self.summary.capacity)
+		table.summary.merge(self.summary)
+		table.flags = {}
+		table.pending = {}
+		return table
+
+	def save(self, filename):
+		"""
+		The function `save` writes the table to `filename`: a JSON header on the first line, with
+		the kind and sizes of the table, its bounds and the kept keys, then the counters of the sketch.
+		"""
+
+		self.flush()
+		summary = self.summary
+		header = {"pairs": isinstance(self, ApproximatePairTable), "width": self.sketch.width,
+				  "depth": self.sketch.depth, "capacity": summary.capacity, "total": self.sketch.total,
+				  "bounds": self.bounds(),
+				  "keys": [[key, f, summary.errors[key]] for key, f in summary.counts.items()]}
+
+		with open(f"{filename}.tmp", "wb") as fout:
+			fout.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+			fout.write(self.sketch.counts.tobytes())
+		os.replace(f"{filename}.tmp", filename)
+
+	@staticmethod
+	def load(filename):
+		"""
+		The function `load` reads a table written by `save`, as an `ApproximatePairTable` if it
+		counts pairs.
+		"""
+
+		with open(filename, "rb") as fin:
+			header = json.loads(fin.readline())
+			table = new_table(header["pairs"], header["width"], header["depth"], header["capacity"])
+			table.sketch.counts = array.array("Q")
+			table.sketch.counts.frombytes(fin.read())
+		table.sketch.total = header["total"]
+
+		summary = table.summary
+		for key, f, error in header["keys"]:
+			# pairs are written as lists
+			key = key if isinstance(key, str) else tuple(key)
+			summary.counts[key] = f
+			summary.errors[key] = error
+		summary.heap = [(f, key) for key, f in summary.counts.items()]
+		heapq.heapify(summary.heap)
+
+		return table
+
+
+class ApproximatePairTable(ApproximateTable):
+	"""
+	The ApproximatePairTable class counts pairs of strings in bounded memory, with the same interface
+	as `vocabulary.PairTable`. Keys are returned as tuples.
+	"""
+	__slots__ = ()
+
+	def add(self, first, second, f=1):
+		"""
+		The function `add` adds `f` to the frequency of the pair (`first`, `second`).
+		"""
+
+		super().add((first, second), f)
+
+
+def new_table(pairs=False, width=WIDTH, depth=DEPTH, capacity=CAPACITY):
+	"""
+	The function `new_table` returns an empty `ApproximatePairTable` if `pairs` is true, an empty
+	`ApproximateTable` otherwise.
+	"""
+
+	table_class = ApproximatePairTable if pairs else ApproximateTable
+	return table_class(width, depth, capacity)
+
+
+def sketch_filename(filename):
+	"""
+	The function `sketch_filename` returns the path of the table saved next to a frequency list, e.g.
+	`ITWAC_0.nouns.sketch` for `ITWAC_0.nouns.tsv`.
+	"""
+
+	root, _ = os.path.splitext(str(filename))
+	return f"{root}{SKETCH_SUFFIX}"
+
+
+def current_sketch(filename):
+	"""
+	The function `current_sketch` returns the path of the table saved next to a frequency list, or
+	`None` if there is none or if it is older than the list, i.e. left by a previous approximate run
+	before the list was rewritten.
+	"""
+
+	table_filename = sketch_filename(filename)
+	try:
+		if os.path.getmtime(table_filename) < os.path.getmtime(filename):
+			return None
+	except OSError:
+		return None
+
+	return table_filename
+
+
+def read_bounds(filename):
+	"""
+	The function `read_bounds` returns the bounds (see `ApproximateTable.bounds`) of the table saved
+	next to a frequency list, or `None` if the list is exact.
+	"""
+
+	table_filename = current_sketch(filename)
+	if table_filename is None:
+		return None
+
+	try:
+		with open(table_filename, "rb") as fin:
+			return json.loads(fin.readline())["bounds"]
+	except (OSError, ValueError, KeyError):
+		return None
+
+
+def merge_files(filenames):
+	"""
+	The function `merge_files` merges the tables saved in `filenames` into a single `ApproximateTable`.
+	"""
+
+	merged = None
+	for filename in filenames:
+		table = ApproximateTable.load(filename)
+		if merged is None:
+			merged = table
+		else:
+			merged.merge(table)
+
+	return merged
@@ -1,17 +1,328 @@
+"""
+This python module implements an asynchronous client of the SketchEngine API, through which
+itTenTen is available. Word lists and concordances are requested page by page, several pages at
+the same time over a pool of reused connections, at most `rate` requests per second, and responses
+are cached on disk by a hash of the request, so that interrupted or repeated downloads only request
+the missing pages.
+
+Word lists are written in the `count\tword` format read by `utils.merge_frequencies`, as pages are
+received. Credentials are read from the `SKETCHENGINE_USERNAME` and `SKETCHENGINE_API_KEY`
+environment variables; requests are sent without authentication if they are not set (e.g., to a
+local server, with `base_url`).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
 import requests
+import requests.adapters
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://api.sketchengine.eu/bonito/run.cgi"
+USERNAME_VARIABLE = "SKETCHENGINE_USERNAME"
+API_KEY_VARIABLE = "SKETCHENGINE_API_KEY"
+
+# default folder of the response cache
+CACHE_FOLDER = ".sketchengine_cache"
+
+# default number of items of a page, of requests sent at the same time, and of requests per second
+PAGE_SIZE = 10000
+MAX_REQUESTS = 4
+RATE = 1.0
+
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TIMEOUT = 300
+
+# parameters of the page number and of the page size, and key of the items in responses
+WORDLIST_PAGES = ("wlpage", "wlmaxitems", "Items")
+CONCORDANCE_PAGES = ("fromp", "pagesize", "Lines")
+
+
+class RateLimiter:
+	"""
+	The RateLimiter class spaces the start of requests so that at most `rate` requests start each
+	second.
+	"""
+
+	def __init__(self, rate):
+		"""
+		This function initializes a rate limiter.
+
+		Args:
+		  rate: The maximum number of requests per second, `None` (or 0) for no limit.
+		"""
+
+		self.interval = 1 / rate if rate else 0
+		self.next_start = 0
+		self.lock = asyncio.Lock()
+
+	async def wait(self):
+		async with self.lock:
+			now = asyncio.get_running_loop().time()
+			delay = self.next_start - now
+			self.next_start = max(now, self.next_start) + self.interval
+
+		if delay > 0:
+			await asyncio.sleep(delay)
+
+
+class ResponseCache:
+	"""
+	The ResponseCache class stores the JSON responses of the API in a folder, one file per request,
+	named by the hash of the endpoint and of the parameters of the request.
+	"""
+
+	def __init__(self, directory=CACHE_FOLDER):
+		self.directory = directory
+		if directory is not None:
+			os.makedirs(directory, exist_ok=True)
+
+	def key(self, endpoint, params):
+		request = json.dumps([endpoint, sorted((str(name), str(value)) for name, value in params.items())])
+		return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+	def _filename(self, key):
+		return os.path.join(self.directory, f"{key}.json")
+
+	def get(self, key):
+		if self.directory is None:
+			return None
+
+		try:
+			with open(self._filename(key), encoding="utf-8") as fin:
+				return json.load(fin)
+		except (OSError, ValueError):
+			return None
+
+	def put(self, key, data):
+		if self.directory is None:
+			return
+
+		# written to a temporary file first, so that interrupted writes leave no partial response
+		filename = self._filename(key)
+		with open(f"{filename}.tmp", "w", encoding="utf-8") as fout:
+			json.dump(data, fout, ensure_ascii=False)
+		os.replace(f"{filename}.tmp", filename)
+
+
+class SketchEngineClient:
+	"""
+	The SketchEngineClient class sends requests to the SketchEngine API. It is used as an
+	asynchronous context manager:
+
+	```
+	async with SketchEngineClient() as client:
+		async for word, f in client.wordlist("preloaded/ittenten20_fl1", pattern=".*-n"):
+			...
+	```
+	"""
+
+	def __init__(self, username=None, api_key=None, base_url=BASE_URL, cache_folder=CACHE_FOLDER,
+				 max_requests=MAX_REQUESTS, rate=RATE, max_retries=MAX_RETRIES, timeout=TIMEOUT):
+		"""
+		This function initializes a client and its pool of connections.
+
+		Args:
+		  username: The SketchEngine username, read from `SKETCHENGINE_USERNAME` if `None`.
+		  api_key: The SketchEngine API key, read from `SKETCHENGINE_API_KEY` if `None`.
+		  base_url: The URL of the API, to which endpoints (e.g., "/wordlist") are appended.
+		  cache_folder: The folder of the response cache, `None` to disable the cache.
+		  max_requests: The maximum number of requests sent at the same time (and of pages requested
+		at once).
+		  rate: The maximum number of requests per second, `None` for no limit.
+		  max_retries: The number of times a request is sent again after a connection error or a
+		retryable status (e.g., 429), waiting twice as long each time.
+		  timeout: The timeout of each request, in seconds.
+		"""
+
+		username = os.environ.get(USERNAME_VARIABLE) if username is None else username
+		api_key = os.environ.get(API_KEY_VARIABLE) if api_key is None else api_key
+
+		self.auth = (username, api_key) if username and api_key else None
+		self.base_url = base_url.rstrip("/")
+		self.cache = ResponseCache(cache_folder)
+		self.max_requests = max_requests
+		self.max_retries = max_retries
+		self.timeout = timeout
+
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_requests)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+
+		self.semaphore = asyncio.Semaphore(max_requests)
+		self.rate_limiter = RateLimiter(rate)
+
+		# requests actually sent, i.e. not answered by the cache
+		self.sent = 0
+
+	def _send(self, url, params):
+		response = self.session.get(url, params=params, auth=self.auth, timeout=self.timeout)
+		if response.status_code in RETRY_STATUSES:
+			return response.status_code, None
+
+		response.raise_for_status()
+		return response.status_code, response.json()
+
+	async def get(self, endpoint, params):
+		"""
+		The function `get` returns the JSON response of a request, from the cache if available.
+
+		Args:
+		  endpoint: The endpoint of the request, e.g. "/wordlist".
+		  params: A dictionary with the parameters of the request.
+		"""
+
+		key = self.cache.key(endpoint, params)
+		data = self.cache.get(key)
+		if data is not None:
+			return data
+
+		url = f"{self.base_url}{endpoint}"
+		delay = 1
+		for attempt in range(self.max_retries + 1):
+			async with self.semaphore:
+				await self.rate_limiter.wait()
+				self.sent += 1
+				try:
+					status, data = await asyncio.to_thread(self._send, url, params)
+					error = None
+				except (requests.ConnectionError, requests.Timeout) as err:
+					status, data, error = None, None, err
+
+			if data is not None:
+				break
+
+			if attempt == self.max_retries:
+				raise RuntimeError(f"SketchEngine request {endpoint} failed after {attempt + 1} attempts "
+								   f"({status or error})")
+
+			logger.warning("SketchEngine request %s failed (%s), retrying in %d s", endpoint,
+						   status or error, delay)
+			await asyncio.sleep(delay)
+			delay *= 2
+
+		if "error" in data:
+			raise RuntimeError(f"SketchEngine request {endpoint} failed: {data['error']}")
+
+		self.cache.put(key, data)
+		return data
+
+	async def pages(self, endpoint, params, pages=WORDLIST_PAGES, page_size=PAGE_SIZE):
+		"""
+		The function `pages` yields the items of each page of a request, in page order. Pages are
+		requested `max_requests` at a time, until a page has fewer than `page_size` items.
+
+		Args:
+		  endpoint: The endpoint of the request, e.g. "/wordlist".
+		  params: A dictionary with the parameters of the request, except for paging.
+		  pages: The (page number parameter, page size parameter, items key) triple of the endpoint,
+		e.g. `WORDLIST_PAGES`.
+		  page_size: The number of items of each page.
+		"""
+
+		page_parameter, size_parameter, items_key = pages
+
+		first_page = 1
+		while True:
+			batch = [self.get(endpoint, {**params, page_parameter: page, size_parameter: page_size})
+					 for page in range(first_page, first_page + self.max_requests)]
+
+			for data in await asyncio.gather(*batch):
+				items = data.get(items_key, [])
+				yield items
+
+				if len(items) < page_size:
+					return
+
+			first_page += self.max_requests
+
+	async def wordlist(self, corpname, attribute="lempos", pattern=".*", min_freq=0, page_size=PAGE_SIZE):
+		"""
+		The function `wordlist` yields the (`word`, `frequency`) pairs of a word list.
+
+		Args:
+		  corpname: The name of the corpus, e.g. "preloaded/ittenten20_fl1".
+		  attribute: The attribute listed, e.g. "lempos" (lemma and part of speech, as in "casa-n").
+		  pattern: A regular expression the listed values must match, e.g. ".*-n" for nouns.
+		  min_freq: The minimum frequency of the listed values.
+		  page_size: The number of items requested in each page.
+		"""
+
+		params = {"corpname": corpname, "format": "json", "wlattr": attribute, "wlpat": pattern,
+				  "wlminfreq": min_freq}
+
+		async for items in self.pages("/wordlist", params, WORDLIST_PAGES, page_size):
+			for item in items:
+				yield item["str"], item["frq"]
+
+	async def concordance(self, corpname, query, page_size=PAGE_SIZE):
+		"""
+		The function `concordance` yields the lines of a concordance, as returned by the API.
+
+		Args:
+		  corpname: The name of the corpus, e.g. "preloaded/ittenten20_fl1".
+		  query: The query, in the syntax of the API (e.g., 'q[lempos="casa-n"]').
+		  page_size: The number of lines requested in each page.
+		"""
+
+		params = {"corpname": corpname, "format": "json", "q": query}
+
+		async for items in self.pages("/concordance", params, CONCORDANCE_PAGES, page_size):
+			for item in items:
+				yield item
+
+	def close(self):
+		self.session.close()
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		self.close()
+
+
+async def write_wordlist(client, output_file, corpname, **wordlist_args):
+	"""
+	The function `write_wordlist` writes a word list to `output_file` in the `count\tword` format
+	read by `utils.merge_frequencies`, as its pages are received.
+
+	Args:
+	  client: The `SketchEngineClient` the word list is requested through.
+	  output_file: The path of the file to be written.
+	  corpname: The name of the corpus.
+	  **wordlist_args: Other arguments of `SketchEngineClient.wordlist`.
+
+	Returns:
+	  The number of items written.
+	"""
+
+	n_items = 0
+	with open(output_file, "w", encoding="utf-8") as fout:
+		async for word, f in client.wordlist(corpname, **wordlist_args):
+			print(f"{f}\t{word}", file=fout)
+			n_items += 1
+
+	return n_items
+
+
+def download_wordlist(output_file, corpname, attribute="lempos", pattern=".*", min_freq=0,
+					  page_size=PAGE_SIZE, **client_args):
+	"""
+	The function `download_wordlist` writes a word list to `output_file` (see `write_wordlist`).
+	Other arguments are those of `SketchEngineClient.wordlist` and of `SketchEngineClient`.
+
+	Returns:
+	  The number of items written.
+	"""
 
-USERNAME = 'ludovica.pannitto'
-API_KEY = '2930da4e46236d168f3f7a783e0099e5'
-base_url = 'https://api.sketchengine.eu/bonito/run.cgi'
-data = {
- 'corpname': 'preloaded/ittenten20_fl1',
- 'format': 'json',
- 'wlattr': 'lempos',
- "wlpat": ".*-n",
- 'wlminfreq': 0,
- "wlmaxitems": 10000000,
-
-}
-d = requests.get(base_url + '/wordlist?corpname=%s' % data['corpname'], params=data, auth=(USERNAME, API_KEY)).json()
-print(d)
+	async def download():
+		async with SketchEngineClient(**client_args) as client:
+			return await write_wordlist(client, output_file, corpname, attribute=attribute,
+										pattern=pattern, min_freq=min_freq, page_size=page_size)
 
+	return asyncio.run(download())
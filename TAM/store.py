@@ -0,0 +1,193 @@
+"""
+This python module stores merged frequency lists in SQLite databases indexed by frequency, so that
+the keys reaching a threshold are read with a range query instead of parsing the whole list again.
+
+A store is built next to its frequency list (as `{filename}.db`) by the `merge` step with `--store`,
+together with the frequencies of each merged file (the per-source breakdown), keyed by file name.
+Thresholded lists are read through their store only while it matches the size and modification
+time of the list; lists without a current store are parsed, and nothing is written next to them.
+"""
+import functools
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+STORE_SUFFIX = ".db"
+STORE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE frequencies (key TEXT PRIMARY KEY, f INTEGER NOT NULL) WITHOUT ROWID;
+CREATE INDEX frequencies_by_f ON frequencies (f, key);
+CREATE TABLE sources (key TEXT NOT NULL, source TEXT NOT NULL, f INTEGER NOT NULL,
+					  PRIMARY KEY (key, source)) WITHOUT ROWID;
+"""
+
+
+def _store_filename(filename, store_filename=None):
+	return f"{filename}{STORE_SUFFIX}" if store_filename is None else store_filename
+
+
+def _read_list(filename):
+	"""
+	The function `_read_list` yields the (key, frequency) pairs of a frequency list, parsed as
+	`utils.load_from_file` always did.
+	"""
+
+	with open(filename, encoding="utf-8") as fin:
+		for line in fin:
+			linesplit = line.strip().split("\t")
+			if len(linesplit) > 1:
+				yield linesplit[1], int(linesplit[0])
+
+
+def build_store(filename, sources=None, store_filename=None):
+	"""
+	The function `build_store` builds the store of a frequency list. The store is written to a
+	temporary file first, so that concurrent readers never see a partial store.
+
+	Args:
+	  filename: The path to the frequency list, in the "count\tword" format of `utils.merge_frequencies`.
+	  sources: An optional dictionary mapping the name of each merged file to an iterable of its
+	(key, frequency) pairs, e.g. as yielded by `utils.read_frequencies`.
+	  store_filename: The path where the store is written, `{filename}.db` by default.
+	"""
+
+	store_filename = _store_filename(filename, store_filename)
+	temp_filename = f"{store_filename}.{os.getpid()}.tmp"
+	stat = os.stat(filename)
+
+	if os.path.exists(temp_filename):
+		os.remove(temp_filename)
+
+	connection = sqlite3.connect(temp_filename)
+	try:
+		with connection:
+			connection.executescript(SCHEMA)
+			connection.executemany("INSERT INTO meta VALUES (?, ?)",
+								   [("version", STORE_VERSION), ("size", stat.st_size),
+									("mtime_ns", stat.st_mtime_ns)])
+
+			# hand-written lists may repeat a key, which is accepted if any of its lines is
+			connection.executemany("INSERT INTO frequencies VALUES (?, ?) "
+								   "ON CONFLICT (key) DO UPDATE SET f = max(f, excluded.f)",
+								   _read_list(filename))
+
+			for source, rows in (sources or {}).items():
+				connection.executemany("INSERT INTO sources VALUES (?, ?, ?) "
+									   "ON CONFLICT (key, source) DO UPDATE SET f = f + excluded.f",
+									   ((key, source, f) for key, f in rows))
+	except BaseException:
+		connection.close()
+		os.remove(temp_filename)
+		raise
+
+	connection.close()
+	os.replace(temp_filename, store_filename)
+
+
+def open_store(filename, store_filename=None):
+	"""
+	The function `open_store` opens the store of a frequency list, if it exists and matches the
+	current list.
+
+	Args:
+	  filename: The path to the frequency list.
+	  store_filename: The path where the store is kept, `{filename}.db` by default.
+
+	Returns:
+	  A read-only `sqlite3.Connection`, or `None` if the store is missing or older than the list.
+	"""
+
+	store_filename = _store_filename(filename, store_filename)
+
+	if not _is_valid(filename, store_filename):
+		if os.path.exists(store_filename):
+			logger.warning("Ignoring outdated store %s, run merge with --store to rebuild it", store_filename)
+		return None
+
+	return sqlite3.connect(f"file:{store_filename}?mode=ro", uri=True)
+
+
+def _is_valid(filename, store_filename):
+	"""
+	The function `_is_valid` checks whether the store of a frequency list exists and matches the
+	current size and modification time of the list.
+	"""
+
+	if not os.path.exists(store_filename):
+		return False
+
+	stat = os.stat(filename)
+	try:
+		connection = sqlite3.connect(f"file:{store_filename}?mode=ro", uri=True)
+		try:
+			meta = dict(connection.execute("SELECT name, value FROM meta"))
+		finally:
+			connection.close()
+	except sqlite3.Error:
+		return False
+
+	return meta.get("version") == STORE_VERSION and meta.get("size") == stat.st_size and \
+		meta.get("mtime_ns") == stat.st_mtime_ns
+
+
+def accepted_keys(connection, threshold):
+	"""
+	The function `accepted_keys` returns the keys of a store whose frequency is at least
+	`threshold`, read as a range of the frequency index.
+	"""
+
+	return frozenset(key for key, in connection.execute(
+		"SELECT key FROM frequencies INDEXED BY frequencies_by_f WHERE f >= ?", (threshold,)))
+
+
+def source_frequencies(connection, key):
+	"""
+	The function `source_frequencies` returns a dictionary mapping the name of each merged file
+	(see `build_store`) to the frequency of `key` in it. The dictionary is empty if the store has no
+	per-source breakdown.
+	"""
+
+	return dict(connection.execute("SELECT source, f FROM sources WHERE key = ?", (key,)))
+
+
+def load_accepted(filename, threshold, store_filename=None):
+	"""
+	The function `load_accepted` returns the keys of a frequency list whose frequency is at least
+	`threshold`. Results are cached for each (list, threshold) pair in the current process, and
+	read from the store of the list otherwise (see `open_store`). Lists without a store are parsed.
+
+	Args:
+	  filename: The path to the frequency list.
+	  threshold: The minimum frequency of accepted keys.
+	  store_filename: The path where the store is kept, `{filename}.db` by default.
+
+	Returns:
+	  A frozenset of strings.
+	"""
+
+	stat = os.stat(filename)
+	return _load_accepted(os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, threshold,
+						  store_filename)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_accepted(filename, size, mtime_ns, threshold, store_filename):
+	# size and modification time are part of the key, so that modified lists are read again
+
+	try:
+		connection = open_store(filename, store_filename)
+	except sqlite3.Error as err:
+		logger.warning("Unable to read the store of %s: %s", filename, err)
+		connection = None
+
+	if connection is None:
+		return frozenset(key for key, f in _read_list(filename) if f >= threshold)
+
+	try:
+		return accepted_keys(connection, threshold)
+	finally:
+		connection.close()
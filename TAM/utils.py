@@ -1,165 +1,563 @@
 import logging
 
 import collections
-
+import heapq
+import itertools
+import mmap
+import operator
+import os
+import tempfile
+
+import TAM.diagnostics as diagnostics
+import TAM.encoded as encoded
+import TAM.index as index
 import TAM.objects as objs
 import TAM.pos_maps as pmaps
+import TAM.sketch as sketch
+import TAM.store as store
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(filename='logs/utils.log', format='%(levelname)s:%(message)s',
-					encoding='utf-8', level=logging.DEBUG)
 
-def read_wikiconll(fname):
+# maximum number of sorted runs merged at once by `merge_frequencies`
+MERGE_FAN_IN = 64
+
+# number of bytes of the memory map of a corpus file split into lines at once by `read_mapped`
+MAPPED_CHUNK_SIZE = 4 * 1024 * 1024
+
+def _pos_code(pos, pos_map, prefix_fallback=True):
 	"""
-	This Python function reads a file in the wikiCoNLL format and yields Sentence objects containing
-	Token objects parsed from the file.
+	The function `_pos_code` normalizes a native part of speech tag through `pos_map` and returns
+	the code of the resulting tag.
+
+	Args:
+	  pos: The native part of speech tag, as found in the corpus.
+	  pos_map: One of the maps defined in `pos_maps`.
+	  prefix_fallback: If `True`, tags that are not in `pos_map` are looked up by their first
+	character (e.g., "SP" is mapped as "S").
+
+	Returns:
+	  The integer code of the normalized tag (see `pos_maps.pos_code`).
+	"""
+	if pos in pos_map:
+		pos = pos_map[pos]
+	elif prefix_fallback and pos[0] in pos_map:
+		pos = pos_map[pos[0]]
+
+	return pmaps.pos_code(pos)
+
+
+def _sentence_blocks(fname, start, end, is_boundary, stats, predicate):
+	"""
+	The function `_sentence_blocks` splits a corpus file (or a byte range of it) into the raw lines of
+	each sentence, skipping the sentences rejected by `predicate` before they are parsed.
+
+	Args:
+	  fname: The path to the corpus file.
+	  start: Byte offset of the sentence boundary from which reading starts.
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
+	  is_boundary: A function taking a raw line and returning `True` if a new sentence starts at it.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read, and of sentences
+	"skipped" by `predicate`, are stored.
+	  predicate: An optional function taking the raw lines of a sentence (as a single bytes object)
+	and returning `False` if the sentence can be skipped (see `TAM.prefilter`).
+
+	Yields:
+	  (`offset`, `lines`) pairs, where `lines` is the list of the raw lines following a sentence
+	boundary, and `offset` the byte offset of the first one.
+	"""
+
+	with open(fname, "rb") as fin:
+		fin.seek(start)
+		offset = start
+		lines = 0
+		skipped = 0
+
+		block_offset = start
+		block = []
+		for raw_line in fin:
+			line_offset = offset
+			offset += len(raw_line)
+			lines += 1
+
+			if is_boundary(raw_line):
+				if end is not None and line_offset >= end:
+					offset, lines = line_offset, lines - 1
+					break
+
+				if block:
+					if predicate is None or predicate(b"".join(block)):
+						yield block_offset, block
+					else:
+						skipped += 1
+
+				block_offset = offset
+				block = []
+
+			else:
+				block.append(raw_line)
+
+		if block and predicate is not None and not predicate(b"".join(block)):
+			block = []
+			skipped += 1
+
+		if stats is not None:
+			stats["bytes"] = offset - start
+			stats["lines"] = lines
+			if predicate is not None:
+				stats["skipped"] = skipped
+
+		if block:
+			yield block_offset, block
+
+
+def _wikiconll_sentences(raw_lines, offset, end, pos_codes, malformed, stats=None):
+	"""
+	The function `_wikiconll_sentences` parses the raw lines of a wikiCoNLL file, or of a single
+	sentence of it (see `_sentence_blocks`), into ColumnarSentence objects.
+
+	Args:
+	  raw_lines: An iterable of raw lines, e.g. a file object positioned at `offset`.
+	  offset: The byte offset of the first line.
+	  end: Byte offset of the sentence boundary at which parsing stops, `None` for the last line.
+	  pos_codes: A dictionary caching the code of each native part of speech tag.
+	  malformed: The `diagnostics.ParseDiagnostics` where malformed lines are counted.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read are stored.
+	"""
+	sentence = objs.ColumnarSentence(source="wikiCoNLL")
+	start = offset
+	lines = 0
+
+	for raw_line in raw_lines:
+		line_offset = offset
+		offset += len(raw_line)
+		lines += 1
+
+		line = raw_line.decode("utf-8").strip()
+		if line.startswith("<doc") or len(line) == 0:
+			if end is not None and line_offset >= end:
+				offset, lines = line_offset, lines - 1
+				break
+
+			if not sentence.empty():
+				yield sentence
+
+			sentence = objs.ColumnarSentence(source="wikiCoNLL")
+
+		elif line.startswith("</doc"):
+			pass
+
+		else:
+			line = line.strip().split("\t")
+
+			tok_id = int(line[0])
+			form = line[1].strip().lower()
+			lemma = line[2]
+			pos = line[3]
+			head = -1
+			deprel = ""
+			try:
+				head = int(line[6])
+				deprel = line[7]
+			except Exception as _:
+				malformed.add("missing head or deprel", line_offset, raw_line.decode("utf-8"))
+
+			code = pos_codes.get(pos)
+			if code is None:
+				code = pos_codes[pos] = _pos_code(pos, pmaps.wikiCoNLL_map)
+
+			sentence.add_token(tok_id, form, lemma, code, head, deprel)
+
+	if stats is not None:
+		stats["bytes"] = offset - start
+		stats["lines"] = lines
+
+	if not sentence.empty():
+		yield sentence
+
+
+def read_wikiconll(fname, start=0, end=None, stats=None, predicate=None):
+	"""
+	This Python function reads a file in the wikiCoNLL format and yields ColumnarSentence objects
+	parsed from the file.
 
 	Args:
 	  fname: The `fname` parameter in the `read_wikiconll` function is a string that represents the file
 	name or path to the file that contains the data in the wikiCoNLL format. This function reads the
-	contents of the specified file, processes the data, and yields `Sentence` objects
+	contents of the specified file, processes the data, and yields `ColumnarSentence` objects
+	  start: Byte offset from which reading starts. It should be a sentence boundary (see
+	`TAM.index`), 0 by default.
+	  end: Byte offset of the sentence boundary at which reading stops. If `None`, the file is read
+	until its end.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read are stored (see
+	`TAM.metrics`), with a summary of the "malformed" lines (see `TAM.diagnostics`).
+	  predicate: An optional function taking the raw lines of a sentence and returning `False` if the
+	sentence can be skipped without being parsed (see `_sentence_blocks`).
+	"""
+	pos_codes = {}
+	malformed = diagnostics.ParseDiagnostics("wikiCoNLL", fname)
+
+	if predicate is None:
+		with open(fname, "rb") as fin:
+			fin.seek(start)
+			yield from _wikiconll_sentences(fin, start, end, pos_codes, malformed, stats)
+
+	else:
+		# only the sentences accepted by `predicate` are parsed, one at a time
+		for offset, block in _sentence_blocks(fname, start, end, index.is_wikiconll_boundary, stats, predicate):
+			yield from _wikiconll_sentences(block, offset, None, pos_codes, malformed)
+
+	malformed.report(stats)
+
+
+def _repubblica_sentences(raw_lines, offset, end, pos_codes, stats=None):
 	"""
-	sentence = objs.Sentence(source="wikiCoNLL")
+	The function `_repubblica_sentences` parses the raw lines of a Repubblica file, or of a single
+	sentence of it, into ColumnarSentence objects (see `_wikiconll_sentences`).
+	"""
+	sentence = objs.ColumnarSentence(source="repubblica")
+	start = offset
+	lines = 0
 
-	with open(fname, encoding="utf-8") as fin:
-		for line_n, line in enumerate(fin):
-			line = line.strip()
-			if line.startswith("<doc"):
-				if not sentence.empty():
-					yield sentence
+	for raw_line in raw_lines:
+		line_offset = offset
+		offset += len(raw_line)
+		lines += 1
 
-				sentence = objs.Sentence(source="wikiCoNLL")
+		line = raw_line.decode("utf-8")
+		if line.startswith("<s"):
+			if end is not None and line_offset >= end:
+				offset, lines = line_offset, lines - 1
+				break
 
-			elif len(line) == 0:
-				if not sentence.empty():
-					yield sentence
+			if not sentence.empty():
+				yield sentence
 
-				sentence = objs.Sentence(source="wikiCoNLL")
+			sentence = objs.ColumnarSentence(source="repubblica")
 
-			elif line.startswith("</doc"):
-				pass
+		elif line.startswith("<"):
+			pass
 
-			else:
-				line = line.strip().split("\t")
+		else:
+			line = line.strip().split("\t")
 
-				tok_id = int(line[0])
-				form = line[1].strip().lower()
-				lemma = line[2]
-				pos = line[3]
-				head = -1
-				deprel = ""
-				try:
-					head = int(line[6])
-					deprel = line[7]
-				except Exception as _:
-					logger.info("Ignoring line %d", line_n)
-
-				if pos in pmaps.wikiCoNLL_map:
-					pos = pmaps.wikiCoNLL_map[pos]
-				elif pos[0] in pmaps.wikiCoNLL_map:
-					pos = pmaps.wikiCoNLL_map[pos[0]]
-
-				token = objs.Token(tok_id, form, lemma, pos, head, deprel)
-				sentence.add_token(token)
-		if not sentence.empty():
-			yield sentence
+			tok_id = int(line[0])
+			form = line[1].strip().lower()
+			lemma = line[2].strip()
+			pos = line[4].strip()
+			head = int(line[6])
+			deprel = line[7].strip()
 
+			code = pos_codes.get(pos)
+			if code is None:
+				code = pos_codes[pos] = _pos_code(pos, pmaps.repubblica_map)
 
-def read_repubblica(fname):
+			sentence.add_token(tok_id, form, lemma, code, head, deprel)
+
+	if stats is not None:
+		stats["bytes"] = offset - start
+		stats["lines"] = lines
+
+	if not sentence.empty():
+		yield sentence
+
+
+def read_repubblica(fname, start=0, end=None, stats=None, predicate=None):
 	"""
 	This Python function reads a file containing data in a specific format from the "repubblica" source,
-	parses the content, and yields sentences represented as objects with token information.
+	parses the content, and yields sentences represented as ColumnarSentence objects.
 
 	Args:
 	  fname: It looks like the code you provided is a Python function that reads a file in a specific
 	format and yields sentences represented as objects. The function reads the file line by line,
 	processes the lines, and creates tokens and sentences based on the content of the file.
+	  start: Byte offset from which reading starts. It should be a sentence boundary (see
+	`TAM.index`), 0 by default.
+	  end: Byte offset of the sentence boundary at which reading stops. If `None`, the file is read
+	until its end.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read are stored (see
+	`TAM.metrics`).
+	  predicate: An optional function taking the raw lines of a sentence and returning `False` if the
+	sentence can be skipped without being parsed (see `_sentence_blocks`).
 	"""
-	sentence = objs.Sentence(source="repubblica")
+	pos_codes = {}
 
-	with open(fname, encoding="utf-8") as fin:
-		for line in fin:
-			if line.startswith("<s"):
-				if not sentence.empty():
-					yield sentence
+	if predicate is None:
+		with open(fname, "rb") as fin:
+			fin.seek(start)
+			yield from _repubblica_sentences(fin, start, end, pos_codes, stats)
 
-				sentence = objs.Sentence(source="repubblica")
+	else:
+		# only the sentences accepted by `predicate` are parsed, one at a time
+		for offset, block in _sentence_blocks(fname, start, end, index.is_vert_boundary, stats, predicate):
+			yield from _repubblica_sentences(block, offset, None, pos_codes)
 
-			elif line.startswith("<"):
-				pass
 
-			else:
-				line = line.strip().split("\t")
+def _itwac_sentences(raw_lines, offset, end, pos_codes, malformed, stats=None):
+	"""
+	The function `_itwac_sentences` parses the raw lines of an ItWaC file, or of a single sentence of
+	it, into ColumnarSentence objects (see `_wikiconll_sentences`).
+	"""
+	sentence = objs.ColumnarSentence(source="itwac")
+	start_id = 0
+	start = offset
+	lines = 0
 
-				tok_id = int(line[0])
-				form = line[1].strip().lower()
-				lemma = line[2].strip()
-				pos = line[4].strip()
-				head = int(line[6])
-				deprel = line[7].strip()
+	for raw_line in raw_lines:
+		line_offset = offset
+		offset += len(raw_line)
+		lines += 1
 
-				if pos in pmaps.repubblica_map:
-					pos = pmaps.repubblica_map[pos]
-				elif pos[0] in pmaps.repubblica_map:
-					pos = pmaps.repubblica_map[pos[0]]
+		line = raw_line.decode("iso-8859-1")
+		if line.startswith("<s"):
+			if end is not None and line_offset >= end:
+				offset, lines = line_offset, lines - 1
+				break
 
-				token = objs.Token(tok_id, form, lemma, pos, head, deprel)
-				sentence.add_token(token)
-		if not sentence.empty():
-			yield sentence
+			if not sentence.empty():
+				yield sentence
+
+			sentence = objs.ColumnarSentence(source="itwac")
+			start_id = 0
+
+		elif line.startswith("<"):
+			pass
+
+		else:
+			line = line.strip().split("\t")
+			start_id += 1
+
+			if len(line) == 3:
+
+				tok_id = start_id
+				form = line[0].strip().lower()
+				lemma = line[2]
+				pos = line[1].split(":")[0]
 
+				code = pos_codes.get(pos)
+				if code is None:
+					code = pos_codes[pos] = _pos_code(pos, pmaps.itwac_map, prefix_fallback=False)
 
-def read_itwac(fname):
+				sentence.add_token(tok_id, form, lemma, code, -1, "")
+			else:
+				malformed.add("wrong number of columns", line_offset, raw_line.decode("iso-8859-1"))
+
+	if stats is not None:
+		stats["bytes"] = offset - start
+		stats["lines"] = lines
+
+	if not sentence.empty():
+		yield sentence
+
+
+def read_itwac(fname, start=0, end=None, stats=None, predicate=None):
 	"""
 	The `read_itwac` function reads a file in the ITWAC format, parses the content to extract tokens and
-	their attributes, and yields sentences containing the parsed tokens.
+	their attributes, and yields ColumnarSentence objects containing the parsed tokens.
 
 	Args:
 	  fname: It looks like the code you provided is a Python function that reads a file in the ITWAC
 	format and yields sentences. The function reads the file line by line, processes each line to
-	extract token information, and creates a Sentence object with Token objects for each line of valid
-	token data.
+	extract token information, and fills a ColumnarSentence object with the columns of each line of
+	valid token data.
+	  start: Byte offset from which reading starts. It should be a sentence boundary (see
+	`TAM.index`), 0 by default.
+	  end: Byte offset of the sentence boundary at which reading stops. If `None`, the file is read
+	until its end.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read are stored (see
+	`TAM.metrics`), with a summary of the "malformed" lines (see `TAM.diagnostics`).
+	  predicate: An optional function taking the raw lines of a sentence and returning `False` if the
+	sentence can be skipped without being parsed (see `_sentence_blocks`).
 	"""
 
-	sentence = objs.Sentence(source="itwac")
+	pos_codes = {}
+	malformed = diagnostics.ParseDiagnostics("itwac", fname)
 
-	with open(fname, encoding="iso-8859-1") as fin:
+	if predicate is None:
+		with open(fname, "rb") as fin:
+			fin.seek(start)
+			yield from _itwac_sentences(fin, start, end, pos_codes, malformed, stats)
 
-		for line_n, line in enumerate(fin):
-			if line.startswith("<s"):
-				if not sentence.empty():
-					yield sentence
+	else:
+		# only the sentences accepted by `predicate` are parsed, one at a time
+		for offset, block in _sentence_blocks(fname, start, end, index.is_vert_boundary, stats, predicate):
+			yield from _itwac_sentences(block, offset, None, pos_codes, malformed)
+
+	malformed.report(stats)
 
-				sentence = objs.Sentence(source="itwac")
-				start_id = 0
 
-			elif line.startswith("<"):
-				pass
+def _mapped_blocks(fname, start, end, is_boundary, stats, predicate):
+	"""
+	The function `_mapped_blocks` is the counterpart of `_sentence_blocks` over a memory map of the
+	corpus file: lines are found by splitting chunks of `MAPPED_CHUNK_SIZE` bytes at once, instead of
+	being read one at a time, and are yielded without their newline.
+	"""
 
+	with open(fname, "rb") as fin:
+		size = os.fstat(fin.fileno()).st_size
+		mapped = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+
+		try:
+			offset = start
+			lines = 0
+			skipped = 0
+
+			block_offset = start
+			block = []
+			position = start
+			stop = False
+			while position < size and not stop:
+				# chunks end after a newline (or at the end of the file)
+				chunk_end = min(position + MAPPED_CHUNK_SIZE, size)
+				if chunk_end < size:
+					newline = mapped.rfind(b"\n", position, chunk_end)
+					if newline < 0:
+						newline = mapped.find(b"\n", chunk_end)
+					chunk_end = newline + 1 if newline >= 0 else size
+
+				chunk_lines = mapped[position:chunk_end].split(b"\n")
+				if chunk_lines[-1] == b"":
+					chunk_lines.pop()
+				position = chunk_end
+
+				for raw_line in chunk_lines:
+					line_offset = offset
+					offset += len(raw_line) + 1
+					lines += 1
+
+					if is_boundary(raw_line):
+						if end is not None and line_offset >= end:
+							offset, lines = line_offset, lines - 1
+							stop = True
+							break
+
+						if block:
+							if predicate is None or predicate(b"\n".join(block)):
+								yield block_offset, block
+							else:
+								skipped += 1
+
+						block_offset = offset
+						block = []
+
+					else:
+						block.append(raw_line)
+
+			# the last line may have no newline
+			offset = min(offset, size)
+
+			if block and predicate is not None and not predicate(b"\n".join(block)):
+				block = []
+				skipped += 1
+
+			if stats is not None:
+				stats["bytes"] = offset - start
+				stats["lines"] = lines
+				if predicate is not None:
+					stats["skipped"] = skipped
+
+			if block:
+				yield block_offset, block
+		finally:
+			if size > 0:
+				mapped.close()
+
+
+def read_mapped(fname, source, start=0, end=None, stats=None, predicate=None):
+	"""
+	The function `read_mapped` reads a corpus file through a memory map and yields its sentences with
+	their forms and part of speech codes only: lines are split into columns as bytes, the other
+	columns are never decoded, and part of speech tags are looked up by their bytes. It is used by
+	the steps that only need forms and tags (e.g., `extract.count_NOUN`), and yields the same forms
+	and tags as the reader of `source`.
+
+	Args:
+	  fname: The path to the corpus file.
+	  source: The identifier of the corpus format ("ITWAC", "REPUBBLICA" or "WIKICONLL").
+	  start: Byte offset of the sentence boundary from which reading starts.
+	  end: Byte offset of the sentence boundary at which reading stops, `None` for the end of file.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read are stored, with a
+	summary of the "malformed" lines (see `TAM.diagnostics`).
+	  predicate: An optional function taking the raw lines of a sentence and returning `False` if the
+	sentence can be skipped without being parsed (see `_sentence_blocks`).
+
+	Yields:
+	  `ColumnarSentence` objects whose `ids`, `lemmas`, `heads` and `deprels` columns are empty.
+	"""
+
+	if source == "ITWAC":
+		sentence_source, encoding, is_boundary = "itwac", "iso-8859-1", index.is_vert_boundary
+		decode_tag = lambda tag: _pos_code(tag.decode(encoding).split(":")[0], pmaps.itwac_map,
+										   prefix_fallback=False)
+	elif source == "REPUBBLICA":
+		sentence_source, encoding, is_boundary = "repubblica", "utf-8", index.is_vert_boundary
+		decode_tag = lambda tag: _pos_code(tag.decode(encoding).strip(), pmaps.repubblica_map)
+	elif source == "WIKICONLL":
+		sentence_source, encoding, is_boundary = "wikiCoNLL", "utf-8", index.is_wikiconll_boundary
+		decode_tag = lambda tag: _pos_code(tag.decode(encoding), pmaps.wikiCoNLL_map)
+	else:
+		raise ValueError(f"Unable to read from source: {source}")
+
+	# columns of the form and of the tag, and whether lines starting with "<" are markup
+	form_column, tag_column = {"ITWAC": (0, 1), "REPUBBLICA": (1, 4), "WIKICONLL": (1, 3)}[source]
+	is_itwac = source == "ITWAC"
+	is_wikiconll = source == "WIKICONLL"
+
+	# forms and codes are cached by the raw bytes of their columns
+	form_strings = {}
+	pos_codes = {}
+	malformed = diagnostics.ParseDiagnostics(sentence_source, fname)
+
+	for offset, block in _mapped_blocks(fname, start, end, is_boundary, stats, predicate):
+		sentence = objs.ColumnarSentence(source=sentence_source)
+		forms = sentence.forms
+		pos = sentence.pos
+
+		for raw_line in block:
+			line_offset = offset
+			offset += len(raw_line) + 1
+
+			if not is_wikiconll and raw_line.startswith(b"<"):
+				continue
+
+			line = raw_line.strip()
+			if line and 0x20 < line[0] < 0x7f and 0x20 < line[-1] < 0x7f:
+				columns = line.split(b"\t")
 			else:
-				line = line.strip().split("\t")
-				start_id += 1
+				# lines may be stripped of more characters once decoded (see `index.is_wikiconll_boundary`)
+				columns = [column.encode(encoding) for column in raw_line.decode(encoding).strip().split("\t")]
 
-				if len(line) == 3:
+			if is_itwac:
+				if len(columns) != 3:
+					malformed.add("wrong number of columns", line_offset, raw_line.decode(encoding))
+					continue
 
-					tok_id = start_id
-					form = line[0].strip().lower()
-					lemma = line[2]
-					pos = line[1].split(":")[0]
-					if pos in pmaps.itwac_map:
-						pos = pmaps.itwac_map[pos]
+			elif is_wikiconll:
+				if columns[0].startswith(b"</doc"):
+					continue
 
-					token = objs.Token(tok_id, form, lemma, pos, -1, "")
-					sentence.add_token(token)
-				else:
-					logger.info("Ignoring line %d", line_n)
+				if len(columns) < 8 or not columns[6].lstrip(b"-").isdigit():
+					malformed.add("missing head or deprel", line_offset, raw_line.decode(encoding))
+
+			form = columns[form_column]
+			string = form_strings.get(form)
+			if string is None:
+				string = form_strings[form] = form.decode(encoding).strip().lower()
+			forms.append(string)
+
+			tag = columns[tag_column]
+			code = pos_codes.get(tag)
+			if code is None:
+				code = pos_codes[tag] = decode_tag(tag)
+			pos.append(code)
 
 		if not sentence.empty():
 			yield sentence
 
+	malformed.report(stats)
 
-def read(filename, source):
+
+def read(filename, source, start=0, end=None, stats=None, prefilter=None, forms_only=False):
 	"""
 	The function `read` reads data from different sources based on the input `source` parameter.
 
@@ -169,6 +567,19 @@ def read(filename, source):
 	  source: The `source` parameter in the `read` function is used to determine from which specific
 	source the data should be read. The function then calls different helper functions based on the
 	value of the `source` parameter to read data from different sources such as "ITWAC", "REPUBBLICA
+	  start: Byte offset of the sentence boundary from which reading starts.
+	  end: Byte offset of the sentence boundary at which reading stops, `None` to read until the end
+	of the file. `TAM.index.shard_ranges` computes valid (`start`, `end`) pairs.
+	  stats: An optional dictionary where the number of "bytes" and "lines" read, and a summary of the
+	"malformed" lines (see `TAM.diagnostics`), are stored once the sentences are read.
+	  prefilter: An optional `TAM.prefilter.Prefilter`, whose predicates are pushed down to the
+	readers: sentences in which none of its patterns can match are skipped without being parsed, and
+	their number is stored in `stats` as "skipped".
+	  forms_only: If `True`, sentences are read with their forms and part of speech codes only,
+	through memory maps (see `read_mapped`), and their other columns are left empty.
+
+	If `filename` is a corpus encoded by `TAM.encoded.encode`, it is read through memory maps whatever
+	the `source`, and `start` and `end` are sentence indexes instead of byte offsets.
 
 	Returns:
 	  The function `read()` is returning the result of reading from the specified source based on the
@@ -176,26 +587,43 @@ def read(filename, source):
 	`source` parameter.
 	"""
 
+	if encoded.is_encoded(filename):
+		logger.info("Reading %s from encoded %s", filename, source)
+		predicate = prefilter.pos_predicate() if prefilter is not None else None
+		return encoded.read_encoded(filename, start, end, predicate, forms_only)
+
+	predicate = None
+	if prefilter is not None and source in ("ITWAC", "REPUBBLICA", "WIKICONLL"):
+		predicate = prefilter.raw_predicate(source)
+
+	if forms_only and source in ("ITWAC", "REPUBBLICA", "WIKICONLL"):
+		logger.info("Reading forms of %s from %s", filename, source)
+		return read_mapped(filename, source, start, end, stats, predicate)
+
 	if source == "ITWAC":
-		print("Reading from ITWAC")
-		return read_itwac(filename)
+		logger.info("Reading %s from ITWAC", filename)
+		return read_itwac(filename, start, end, stats, predicate)
 
 	elif source == "REPUBBLICA":
-		print("Reading from REPUBBLICA")
-		return read_repubblica(filename)
+		logger.info("Reading %s from REPUBBLICA", filename)
+		return read_repubblica(filename, start, end, stats, predicate)
 
 	elif source == "WIKICONLL":
-		print("Reading from WIKICONLL")
-		return read_wikiconll(filename)
+		logger.info("Reading %s from WIKICONLL", filename)
+		return read_wikiconll(filename, start, end, stats, predicate)
 	else:
 		logger.warning("Unable to read from source: %s", source)
 
 
-def merge_frequencies(files_list, output_file):
+def merge_frequencies(files_list, output_file, max_items=None, temp_directory=None):
 	"""
 	The function `merge_frequencies` reads data from multiple files, merges the frequencies of each
 	unique key, and writes the merged frequencies to an output file.
 
+	With `max_items`, at most `max_items` distinct keys are held in memory: whenever the limit is
+	reached, keys are sorted and spilled to a run file, and the runs are then merged with
+	`heapq.merge`, summing the frequencies of equal keys. The output is the same in both modes.
+
 	Args:
 	  files_list: A list of file names that contain frequency data in the format of "count\tword" on
 	each line. The function `merge_frequencies` reads these files and merges the frequencies of the same
@@ -204,28 +632,164 @@ def merge_frequencies(files_list, output_file):
 	merged frequencies will be written to. This function takes a list of file paths (`files_list`)
 	containing frequency data and merges them into a single frequency count, which is then written to
 	the specified `output_file`.
+	  max_items: The maximum number of distinct keys kept in memory, `None` for no limit.
+	  temp_directory: The folder where run files are created, the system default if `None`.
 	"""
 
 	total = collections.defaultdict(int)
 
+	if max_items is None:
+		for key, f in read_frequencies(files_list):
+			total[key] += f
+
+		write_frequencies(total, output_file)
+		return
+
+	with tempfile.TemporaryDirectory(dir=temp_directory, prefix="merge_") as run_directory:
+		runs = []
+
+		for key, f in read_frequencies(files_list):
+			total[key] += f
+
+			if len(total) >= max_items:
+				runs.append(_write_run(sorted(total.items()), run_directory, len(runs)))
+				total.clear()
+
+		# everything fits in memory, no run has been written
+		if not runs:
+			write_frequencies(total, output_file)
+			return
+
+		if total:
+			runs.append(_write_run(sorted(total.items()), run_directory, len(runs)))
+			total.clear()
+
+		n_runs = len(runs)
+		while len(runs) > MERGE_FAN_IN:
+			merged_runs = []
+			for run_n in range(0, len(runs), MERGE_FAN_IN):
+				group = runs[run_n:run_n+MERGE_FAN_IN]
+				merged_runs.append(_write_run(_merge_runs(group), run_directory, n_runs))
+				n_runs += 1
+
+				for run_filename in group:
+					os.remove(run_filename)
+			runs = merged_runs
+
+		with open(output_file, "w", encoding="utf-8") as fout:
+			for key, f in _merge_runs(runs):
+				print(f"{f}\t{key}", file=fout)
+
+
+def read_frequencies(files_list):
+	"""
+	The function `read_frequencies` yields the (key, frequency) pairs of frequency lists, with keys
+	normalized as by `write_frequencies`.
+	"""
+
 	for filename in files_list:
 		with open(filename, encoding="utf-8") as fin:
 			for line in fin:
 				linesplit = line.strip().split("\t")
 
 				if len(linesplit) > 1:
-					total[linesplit[1]] += int(linesplit[0])
+					key = linesplit[1].rstrip()
+					if len(key) > 0:
+						yield key, int(linesplit[0])
+
+
+def _write_run(items, run_directory, run_n):
+	"""
+	The function `_write_run` writes (key, frequency) pairs sorted by key to a run file and returns
+	its path.
+	"""
+
+	run_filename = os.path.join(run_directory, f"{run_n}.run")
+
+	# keys never contain tabs or newlines, and newlines are not translated so that they are read
+	# back exactly
+	with open(run_filename, "w", encoding="utf-8", newline="\n") as fout:
+		for key, f in items:
+			print(f"{key}\t{f}", file=fout)
+
+	return run_filename
+
+
+def _read_run(run_filename):
+	with open(run_filename, encoding="utf-8", newline="\n") as fin:
+		for line in fin:
+			key, _, f = line[:-1].rpartition("\t")
+			yield key, int(f)
+
+
+def _merge_runs(runs):
+	"""
+	The function `_merge_runs` merges sorted run files, yielding (key, frequency) pairs sorted by key
+	with the frequencies of equal keys summed.
+	"""
+
+	merged = heapq.merge(*[_read_run(run_filename) for run_filename in runs],
+						 key=operator.itemgetter(0))
+
+	for key, items in itertools.groupby(merged, key=operator.itemgetter(0)):
+		yield key, sum(f for _, f in items)
+
+
+def write_frequencies(freqs, output_file):
+	"""
+	The function `write_frequencies` writes an in-memory frequency table in the format produced by
+	`merge_frequencies`, i.e. one "count\tword" line per key, sorted by key.
+
+	Keys are written as they would be read back from a per-file frequency list: tuples (as used for
+	ngrams) are joined by a space, trailing whitespace is removed and empty keys are skipped. Writing
+	the reduction of several in-memory tables therefore gives the same output as writing each table
+	to disk and merging the files with `merge_frequencies`.
+
+	Args:
+	  freqs: A dictionary mapping keys (strings or tuples of strings) to frequencies.
+	  output_file: The path of the file to be written.
+	"""
 
 	with open(output_file, "w", encoding="utf-8") as fout:
-		for key, f in sorted(total.items()):
+		for key, f in sorted(normalize_frequencies(freqs).items()):
 			print(f"{f}\t{key}", file=fout)
 
 
+def normalize_frequencies(freqs):
+	"""
+	The function `normalize_frequencies` normalizes the keys of an in-memory frequency table as
+	`write_frequencies` does (tuples joined by a space, trailing whitespace removed, empty keys
+	skipped), summing the frequencies of keys that become equal.
+
+	Args:
+	  freqs: A dictionary mapping keys (strings or tuples of strings) to frequencies.
+
+	Returns:
+	  A dictionary mapping strings to frequencies, as they would be read back from the written file.
+	"""
+
+	total = collections.defaultdict(int)
+	for key, f in freqs.items():
+		if not isinstance(key, str):
+			key = " ".join(key)
+		key = key.rstrip()
+
+		if len(key) > 0:
+			total[key] += f
+
+	return dict(total)
+
+
 def load_from_file (input_filename, threshold):
 	"""
 	This Python function reads data from a file, filters it based on a threshold, and returns a set of
 	accepted values.
 
+	If the file has a current frequency store (built by `merge --store`, see `TAM.store`), only the
+	accepted keys are read from it; otherwise the file is parsed. Calls with the same file and
+	threshold return the same cached set. For lists written with `--approximate`, a warning is logged
+	if the threshold is too low for the bounds saved in their sketch (see `TAM.sketch`).
+
 	Args:
 	  input_filename: The `input_filename` parameter is the name of the file from which the function
 	`load_from_file` will read the data. This file should contain tab-separated values where the first
@@ -236,20 +800,18 @@ def load_from_file (input_filename, threshold):
 	against the threshold
 
 	Returns:
-	  The function `load_from_file` returns a set of strings that meet the specified threshold
+	  The function `load_from_file` returns a frozenset of strings that meet the specified threshold
 	condition. The set contains the second element of each line in the input file where the first
 	element is greater than or equal to the threshold value.
 	"""
-	accepted = set()
 
-	with open(input_filename, encoding="utf-8") as fin:
-		for line in fin:
-			linesplit = line.strip().split("\t")
-			f = int(linesplit[0])
-			if f >= threshold:
-				accepted.add(linesplit[1])
+	bounds = sketch.read_bounds(input_filename)
+	if bounds is not None and threshold <= max(bounds["guaranteed"], bounds["overestimate"]):
+		logger.warning("Threshold %d is within the error bounds of approximate list %s: keys with frequency "
+					   "up to %d may be missing, frequencies may be overestimated by up to %d", threshold,
+					   input_filename, bounds["guaranteed"], bounds["overestimate"])
 
-	return accepted
+	return store.load_accepted(input_filename, threshold)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+"""
+This python module implements the interning layer used by the counting functions of `TAM.extract`.
+Strings are mapped to dense integer ids by a `Vocabulary`, and frequencies are accumulated in arrays
+indexed by id (`FrequencyTable`). Strings are materialized again only when tables are iterated, i.e.
+when frequency lists are written or reduced. Pairs of strings are counted in dictionaries keyed by
+the pairs themselves (`PairTable`): packing the ids of the two strings in a single integer takes two
+lookups in the vocabulary for each pair, which costs more than hashing the pair.
+"""
+import array
+
+# values of the per-id flags memoized by `FrequencyTable.add_if`
+UNKNOWN = 0
+ACCEPTED = 1
+REJECTED = 2
+
+
+class Vocabulary:
+	"""
+	The Vocabulary class maps strings to dense integer ids, assigned in order of first occurrence.
+	"""
+	__slots__ = ("ids", "strings")
+
+	def __init__(self):
+		self.ids = {}
+		self.strings = []
+
+	def intern(self, string):
+		"""
+		The function `intern` returns the id of `string`, adding it to the vocabulary if needed.
+		"""
+
+		string_id = self.ids.get(string)
+		if string_id is None:
+			string_id = self.ids[string] = len(self.strings)
+			self.strings.append(string)
+
+		return string_id
+
+	def __getstate__(self):
+		# ids are rebuilt when unpickling, so that vocabularies sent between processes stay small
+		return self.strings
+
+	def __setstate__(self, strings):
+		self.strings = strings
+		self.ids = {string: string_id for string_id, string in enumerate(strings)}
+
+	def __getitem__(self, string_id):
+		return self.strings[string_id]
+
+	def __len__(self):
+		return len(self.strings)
+
+
+class FrequencyTable:
+	"""
+	The FrequencyTable class counts strings of a `Vocabulary` in an array indexed by their ids.
+	Like a `defaultdict(int)`, it is iterated in order of first insertion.
+	"""
+	__slots__ = ("vocabulary", "counts", "order", "flags")
+
+	def __init__(self, vocabulary=None):
+		"""
+		This function initializes an empty table.
+
+		Args:
+		  vocabulary: The `Vocabulary` used to intern keys, possibly shared with other tables. A new
+		one is created if `None`.
+		"""
+
+		self.vocabulary = Vocabulary() if vocabulary is None else vocabulary
+		self.counts = array.array("q")
+		self.order = array.array("q")
+		self.flags = bytearray()
+
+	def add_id(self, string_id, f=1):
+		"""
+		The function `add_id` adds `f` to the frequency of the string with id `string_id`.
+		"""
+
+		counts = self.counts
+		if string_id >= len(counts):
+			counts.frombytes(bytes(counts.itemsize * max(string_id + 1 - len(counts), len(counts))))
+
+		if counts[string_id] == 0:
+			self.order.append(string_id)
+		counts[string_id] += f
+
+	def add(self, string, f=1):
+		"""
+		The function `add` adds `f` to the frequency of `string`.
+		"""
+
+		# the lookup of known strings is inlined, being the most frequent case
+		string_id = self.vocabulary.ids.get(string)
+		if string_id is None:
+			string_id = self.vocabulary.intern(string)
+
+		self.add_id(string_id, f)
+
+	def add_if(self, string, predicate, f=1):
+		"""
+		The function `add_if` adds `f` to the frequency of `string` if `predicate(string)` is true.
+		The outcome of `predicate` is computed once per string and memoized in the table, therefore
+		the same `predicate` must be used in all calls on the same table.
+		"""
+
+		string_id = self.vocabulary.ids.get(string)
+		if string_id is None:
+			string_id = self.vocabulary.intern(string)
+
+		flags = self.flags
+		if string_id >= len(flags):
+			flags.extend(bytes(max(string_id + 1 - len(flags), len(flags))))
+
+		flag = flags[string_id]
+		if flag == UNKNOWN:
+			flag = flags[string_id] = ACCEPTED if predicate(string) else REJECTED
+
+		if flag == ACCEPTED:
+			self.add_id(string_id, f)
+
+	def items(self):
+		strings = self.vocabulary.strings
+		counts = self.counts
+		for string_id in self.order:
+			yield strings[string_id], counts[string_id]
+
+	def keys(self):
+		strings = self.vocabulary.strings
+		for string_id in self.order:
+			yield strings[string_id]
+
+	def __iter__(self):
+		return self.keys()
+
+	def __getitem__(self, string):
+		string_id = self.vocabulary.ids.get(string)
+		if string_id is None or string_id >= len(self.counts):
+			return 0
+		return self.counts[string_id]
+
+	def __contains__(self, string):
+		return self[string] > 0
+
+	def __len__(self):
+		return len(self.order)
+
+
+class PairTable:
+	"""
+	The PairTable class counts pairs of strings in a dictionary keyed by the pairs. It is iterated in
+	order of first insertion, with keys returned as tuples.
+	"""
+	__slots__ = ("counts",)
+
+	def __init__(self):
+		self.counts = {}
+
+	def add(self, first, second, f=1):
+		"""
+		The function `add` adds `f` to the frequency of the pair (`first`, `second`).
+		"""
+
+		key = (first, second)
+		counts = self.counts
+		counts[key] = counts.get(key, 0) + f
+
+	def items(self):
+		return iter(self.counts.items())
+
+	def keys(self):
+		return iter(self.counts)
+
+	def __iter__(self):
+		return self.keys()
+
+	def __getitem__(self, pair):
+		return self.counts.get(tuple(pair), 0)
+
+	def __contains__(self, pair):
+		return self[pair] > 0
+
+	def __len__(self):
+		return len(self.counts)
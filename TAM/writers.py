@@ -0,0 +1,159 @@
+"""
+This python module implements a pool of buffered writers for steps that spread their output over
+many files, such as the `{key}.contexts.tsv` files of `TAM.contexts`.
+
+Rows are buffered in memory and written in bulk; at most `max_open` files are kept open at the
+same time, the least recently written one being closed when the limit is reached and reopened in
+append mode when needed again.
+"""
+import collections
+import os
+import time
+
+# default maximum number of files open at the same time
+MAX_OPEN = 256
+
+# default size (in characters) of the buffer of a single file, and of all buffers together
+BUFFER_SIZE = 1 << 16
+MAX_BUFFERED = 1 << 26
+
+
+class WriterPool:
+	"""
+	The WriterPool class writes rows to files identified by a key (e.g., the prefix or the adverb of
+	a contexts file). A file is created (or truncated) the first time a row is written to it.
+	"""
+
+	def __init__(self, filename_of, max_open=MAX_OPEN, buffer_size=BUFFER_SIZE,
+				 max_buffered=MAX_BUFFERED):
+		"""
+		This function initializes an empty pool.
+
+		Args:
+		  filename_of: A function mapping a key to the path of its file, called when the file is
+		(re)opened.
+		  max_open: The maximum number of files open at the same time.
+		  buffer_size: The size (in characters) above which the buffer of a file is written.
+		  max_buffered: The size (in characters) above which all buffers are written.
+		"""
+
+		if max_open < 1:
+			raise ValueError("A writer pool needs at least one open file")
+
+		self.filename_of = filename_of
+		self.max_open = max_open
+		self.buffer_size = buffer_size
+		self.max_buffered = max_buffered
+
+		self.buffers = {}
+		self.sizes = {}
+		self.buffered = 0
+
+		# open files, from the least to the most recently written
+		self.files = collections.OrderedDict()
+		self.created = set()
+
+		# time spent writing buffers to files (see `TAM.metrics`)
+		self.write_seconds = 0.0
+
+	def write(self, key, row):
+		"""
+		The function `write` appends `row` (without the trailing newline) to the file of `key`.
+		"""
+
+		buffer = self.buffers.get(key)
+		if buffer is None:
+			buffer = self.buffers[key] = []
+			self.sizes[key] = 0
+
+		buffer.append(row)
+		size = len(row) + 1
+		self.sizes[key] += size
+		self.buffered += size
+
+		if self.sizes[key] >= self.buffer_size:
+			self._flush(key)
+		elif self.buffered >= self.max_buffered:
+			self.flush()
+
+	def _flush(self, key):
+		"""
+		The function `_flush` writes the buffer of `key` to its file, opening it if needed.
+		"""
+
+		write_start = time.perf_counter()
+		buffer = self.buffers.pop(key)
+		self.buffered -= self.sizes.pop(key)
+
+		fout = self.files.get(key)
+		if fout is None:
+			if len(self.files) >= self.max_open:
+				_, evicted = self.files.popitem(last=False)
+				evicted.close()
+
+			mode = "a" if key in self.created else "w"
+			fout = self.files[key] = open(self.filename_of(key), mode, encoding="utf-8")
+			self.created.add(key)
+		else:
+			self.files.move_to_end(key)
+
+		buffer.append("")
+		fout.write("\n".join(buffer))
+		self.write_seconds += time.perf_counter() - write_start
+
+	def flush(self):
+		"""
+		The function `flush` writes all buffers to their files.
+		"""
+
+		for key in list(self.buffers):
+			self._flush(key)
+
+	def positions(self):
+		"""
+		The function `positions` writes all buffers to disk and returns the size of each file created
+		by the pool, as a dictionary indexed by key.
+		"""
+
+		self.flush()
+		for fout in self.files.values():
+			fout.flush()
+
+		return {key: os.path.getsize(self.filename_of(key)) for key in self.created}
+
+	def restore(self, positions):
+		"""
+		The function `restore` truncates files to the sizes returned by `positions`, discarding rows
+		written afterwards; rows for these keys will then be appended. Files of other keys are
+		created again when written.
+		"""
+
+		for fout in self.files.values():
+			fout.close()
+		self.files.clear()
+
+		self.buffers.clear()
+		self.sizes.clear()
+		self.buffered = 0
+
+		for key, size in positions.items():
+			os.truncate(self.filename_of(key), size)
+		self.created = set(positions)
+
+	def close(self):
+		"""
+		The function `close` writes all buffers and closes all files.
+		"""
+
+		try:
+			self.flush()
+		finally:
+			for fout in self.files.values():
+				fout.close()
+			self.files.clear()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
@@ -0,0 +1,175 @@
+"""
+This python module checks that the patterns of the "ngram" construction of `TAM/patterns.yaml`,
+interpreted by `matcher.Matcher`, give exactly the frequencies and contexts of the hand-written loops
+`extract.process_detADVN` and `contexts.process_ctx_detADVN`, which are run in their place as long as
+the construction is left unchanged (see `matcher.NGRAM_DIGEST`).
+
+Usage (from the main folder of the repository):
+```
+python3 -m benchmarks.equivalence [-i path/to/files_input.tsv] [--tokens N] [-c 20]
+```
+
+Sentences are read from the corpora of `data_sample` and from synthetic corpora of `--tokens`
+tokens in each format (see `benchmarks.generate`), whose sentences contain all the patterns, or from
+the files listed with `-i`. All nouns are accepted, as well as all the adverbs counted by the loop,
+so that every match is compared. The matches of each pattern are reported, together with the
+DET ADV ADJ NOUN sequences that neither path extracts; differences are printed, and the exit status
+is 1.
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+
+import TAM.contexts as contexts
+import TAM.extract as extract
+import TAM.matcher as matcher
+import TAM.pos_maps as pmaps
+import TAM.utils as utils
+
+from benchmarks.generate import generate
+from benchmarks.run import read_files_list
+
+DATA_SAMPLE = pathlib.Path(__file__).parent.parent.joinpath("data_sample", "corpora")
+SAMPLE_FILES = [("ITWAC", "itwac", DATA_SAMPLE.joinpath("itwac.sample")),
+				("REPUBBLICA", "repubblica", DATA_SAMPLE.joinpath("repubblica.sample")),
+				("WIKICONLL", "wikiCoNLL", DATA_SAMPLE.joinpath("wikiCoNLL.sample"))]
+
+# number of differences printed for each output
+MAX_SHOWN = 10
+
+
+class RowBuffer:
+	"""
+	The RowBuffer class keeps the rows written by the context extraction functions in memory, in
+	place of a `writers.WriterPool`.
+	"""
+
+	def __init__(self):
+		self.rows = {}
+
+	def write(self, key, row):
+		self.rows.setdefault(key, []).append(row)
+
+
+def read_sentences(input_files):
+	sentences = []
+	for source, _, path in input_files:
+		for sentence in utils.read(path, source):
+			sentences.append((source, sentence))
+	return sentences
+
+
+def count_excluded(sentences):
+	"""
+	The function `count_excluded` counts the DET ADV ADJ NOUN sequences of `sentences` in the range of
+	the patterns, which are not instances of the "ngram" construction.
+	"""
+
+	excluded = 0
+	for _, sentence in sentences:
+		pos = sentence.pos
+		for c_id in range(3, len(pos)-3):
+			if pos[c_id-1] == pmaps.DET and pos[c_id] == pmaps.ADV and \
+					pos[c_id+1] == pmaps.ADJ and pos[c_id+2] == pmaps.NOUN:
+				excluded += 1
+	return excluded
+
+
+def compare(name, expected, actual):
+	"""
+	The function `compare` prints the differences between the items of the lists `expected` (from the
+	hand-written loop) and `actual` (from the matcher), in order, and returns their number.
+	"""
+
+	differences = [(n, left, right) for n, (left, right) in enumerate(zip(expected, actual))
+				   if left != right]
+	if len(expected) != len(actual):
+		differences.append((min(len(expected), len(actual)), f"{len(expected)} items", f"{len(actual)} items"))
+
+	for n, left, right in differences[:MAX_SHOWN]:
+		print(f"{name}[{n}]:\tloop {left!r}\tmatcher {right!r}")
+	return len(differences)
+
+
+def check(sentences, ctx):
+	"""
+	The function `check` runs the hand-written loops and the patterns of the "ngram" construction
+	over `sentences` and returns the number of differences between their outputs.
+	"""
+
+	construction = extract.NGRAM_MATCHER.constructions["ngram"]
+	# the same patterns, matched by the matcher rather than by the hand-written loops
+	pattern_matcher = matcher.Matcher({"ngram": construction})
+	pattern_matcher.ngram = None
+
+	nouns = set()
+	for _, sentence in sentences:
+		nouns.update(form for form, code in zip(sentence.forms, sentence.pos) if code == pmaps.NOUN)
+
+	loop_counters = extract.new_construction_counters(construction)
+	matcher_counters = extract.new_construction_counters(construction)
+	loop_matches, matcher_matches = {}, {}
+	for _, sentence in sentences:
+		extract.process_detADVN(sentence, nouns, loop_counters, loop_matches, construction)
+		extract.process_matches(pattern_matcher, sentence, {"ngram": {"nouns": nouns}}, {"ngram": matcher_counters},
+								matcher_matches)
+
+	differences = 0
+	for table in construction.tables:
+		differences += compare(table, list(loop_counters[table].items()), list(matcher_counters[table].items()))
+
+	print("pattern\tloop\tmatcher")
+	for pattern in construction.patterns:
+		loop_n, matcher_n = loop_matches.get(pattern, 0), matcher_matches.get(pattern, 0)
+		print(f"{pattern.label}\t{loop_n}\t{matcher_n}" + ("" if loop_n else "\t(not exercised)"))
+		differences += loop_n != matcher_n
+	print(f"DET ADV ADJ NOUN (excluded)\t{count_excluded(sentences)}")
+
+	adverbs = {adverb for adverb, _ in loop_counters["adverbs"].items()}
+	accepted = {"ngram": {"nouns": nouns, "adverbs": adverbs}}
+
+	loop_rows, matcher_rows = RowBuffer(), RowBuffer()
+	for source, sentence in sentences:
+		contexts.process_ctx_detADVN(sentence, source, adverbs, nouns, ctx, loop_rows)
+		contexts.process_ctx_matches(pattern_matcher, sentence, source, accepted, ctx, matcher_rows)
+
+	for key in sorted(loop_rows.rows.keys() | matcher_rows.rows.keys()):
+		differences += compare(f"contexts {key[1]}", loop_rows.rows.get(key, []), matcher_rows.rows.get(key, []))
+	print(f"contexts\t{sum(len(rows) for rows in loop_rows.rows.values())}\t"
+		  f"{sum(len(rows) for rows in matcher_rows.rows.values())}")
+
+	return differences
+
+
+def main():
+	parser = argparse.ArgumentParser(prog="benchmarks.equivalence",
+									 formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+	parser.add_argument("-i", "--input-files",
+						help="path to a file containing the list of corpus files, "
+							 "instead of data_sample and synthetic corpora")
+	parser.add_argument("--tokens", type=int, default=100000,
+						help="number of tokens of each synthetic corpus")
+	parser.add_argument("-c", "--context-size", type=int, default=20,
+						help="width of left and right contexts")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as output_directory:
+		if args.input_files:
+			input_files = read_files_list(args.input_files)
+		else:
+			generate(output_directory, args.tokens)
+			input_files = SAMPLE_FILES + read_files_list(pathlib.Path(output_directory).joinpath("files_input.tsv"))
+
+		sentences = read_sentences(input_files)
+
+	print(f"{len(sentences)} sentences, {sum(len(sentence) for _, sentence in sentences)} tokens")
+	differences = check(sentences, args.context_size)
+	if differences:
+		print(f"{differences} differences between the hand-written loops and the matcher")
+		sys.exit(1)
+	print("the hand-written loops and the matcher give the same outputs")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,371 @@
+"""
+This python module generates synthetic corpora in the ITWAC, REPUBBLICA and WIKICONLL formats read
+by `TAM.utils.read`, to measure the throughput of the processing steps at any size.
+
+Nouns, adjectives and verbs are made-up words drawn from Zipfian distributions, while determiners,
+prepositions, adverbs and prefixes are real Italian words. Sentences are built from chunks that
+exercise the patterns of `TAM/patterns.yaml`: hyphenated compounds (PREF-NOUN), DET ADV NOUN,
+DET ADV ADV NOUN and DET ADJ ADV NOUN, with syntactic heads pointing to the noun, besides plain noun
+phrases, verbs, prepositions and punctuation.
+
+Usage (from the main folder of the repository):
+```
+python3 -m benchmarks.generate -o path/to/output/folder --tokens 1000000 [--files N] [--seed S]
+```
+
+Corpus files are written with a `files_input.tsv` list, which can be passed as `-i` to `main.py`
+and to `benchmarks.run`, and a `corpus.json` file with the number of sentences and tokens of each
+corpus file.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import pathlib
+import random
+
+FORMATS = {"ITWAC": "itwac.xml", "REPUBBLICA": "repubblica.conll", "WIKICONLL": "wikiconll.conll"}
+
+PREFIXES = ["ex", "pre", "post", "anti", "neo", "super", "vice", "pseudo", "semi", "non", "quasi",
+			"mini", "maxi", "extra", "iper", "ultra", "multi", "contro", "sotto", "auto"]
+
+ADVERBS = ["non", "sempre", "quasi", "già", "ancora", "mai", "più", "molto", "poco", "troppo",
+		   "ormai", "allora", "solo", "appena", "circa", "oggi", "ieri", "presto", "spesso", "forse",
+		   "davvero", "proprio", "anche", "tanto", "meno", "subito", "finalmente", "soprattutto"]
+
+DETERMINERS = [("il", "RD"), ("la", "RD"), ("lo", "RD"), ("l'", "RD"), ("i", "RD"), ("le", "RD"),
+			   ("gli", "RD"), ("un", "RI"), ("una", "RI"), ("uno", "RI")]
+
+PREPOSITIONS = [("di", "E"), ("a", "E"), ("da", "E"), ("in", "E"), ("con", "E"), ("su", "E"),
+				("per", "E"), ("tra", "E"), ("del", "EA"), ("della", "EA"), ("nel", "EA"),
+				("alla", "EA"), ("dal", "EA"), ("sul", "EA")]
+
+CONJUNCTIONS = ["e", "o", "ma", "che", "se", "perché"]
+
+SYLLABLES = ["ba", "be", "bi", "ca", "ce", "co", "da", "de", "di", "fa", "fe", "fi", "ga", "go",
+			 "la", "le", "li", "lo", "ma", "me", "mi", "mo", "na", "ne", "no", "pa", "pe", "po",
+			 "ra", "re", "ri", "ro", "sa", "se", "si", "so", "ta", "te", "ti", "to", "va", "ve",
+			 "vi", "za", "zo", "stra", "spi", "gno", "chia", "ghe"]
+
+# (coarse, fine) tags of the CoNLL formats, and tag of the ITWAC format, for each part of speech
+CONLL_TAGS = {"NOUN": ("S", "S"), "PROPN": ("S", "SP"), "ADJ": ("A", "A"), "ADV": ("B", "B"),
+			  "NEG": ("B", "BN"), "VERB": ("V", "V"), "CCONJ": ("C", "CC"), "NUM": ("N", "N"),
+			  "PUNCT": ("F", "FF"), "SENT": ("F", "FS")}
+ITWAC_TAGS = {"NOUN": "NOUN", "PROPN": "NPR", "ADJ": "ADJ", "ADV": "ADV", "NEG": "NEG",
+			  "VERB": "VER:fin", "CCONJ": "CON", "NUM": "NUM", "PUNCT": "PUN", "SENT": "SENT",
+			  "RD": "ART", "RI": "ART", "E": "PRE", "EA": "ARTPRE"}
+
+
+def made_up_words(rng, size, min_syllables=2, max_syllables=4, suffixes=("",)):
+	"""
+	The function `made_up_words` returns `size` distinct words made of random syllables, in random
+	order.
+
+	Args:
+	  rng: The `random.Random` generator.
+	  size: The number of words.
+	  min_syllables: The minimum number of syllables of a word.
+	  max_syllables: The maximum number of syllables of a word.
+	  suffixes: Endings appended to words (e.g., verb endings).
+	"""
+
+	words = set()
+	while len(words) < size:
+		n_syllables = rng.randint(min_syllables, max_syllables)
+		words.add("".join(rng.choice(SYLLABLES) for _ in range(n_syllables)) + rng.choice(suffixes))
+
+	words = sorted(words)
+	rng.shuffle(words)
+	return words
+
+
+class ZipfVocabulary:
+	"""
+	The ZipfVocabulary class draws words with Zipfian frequencies: the word of rank `r` has
+	probability proportional to `1 / r ** exponent`.
+	"""
+
+	def __init__(self, rng, words, exponent=1.1):
+		"""
+		This function initializes a vocabulary.
+
+		Args:
+		  rng: The `random.Random` generator.
+		  words: The words, from the most to the least frequent.
+		  exponent: The exponent of the Zipfian distribution.
+		"""
+
+		self.rng = rng
+		self.words = list(words)
+		self.cum_weights = list(itertools.accumulate(1 / rank ** exponent
+													 for rank in range(1, len(self.words) + 1)))
+
+	def draw(self):
+		return self.words[bisect.bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+
+class SentenceGenerator:
+	"""
+	The SentenceGenerator class builds random sentences, as lists of (`form`, `lemma`, `tag`,
+	`head`, `deprel`) tuples, where `tag` is a key of `CONLL_TAGS` or a determiner or preposition
+	tag, and `head` is the 1-based position of the head (0 for the root).
+	"""
+
+	def __init__(self, rng, n_nouns=20000, n_adjectives=3000, n_verbs=3000):
+		"""
+		This function initializes the vocabularies of a generator.
+
+		Args:
+		  rng: The `random.Random` generator.
+		  n_nouns: The number of distinct nouns.
+		  n_adjectives: The number of distinct adjectives.
+		  n_verbs: The number of distinct verbs.
+		"""
+
+		self.rng = rng
+		self.nouns = ZipfVocabulary(rng, made_up_words(rng, n_nouns,
+													   suffixes=("a", "o", "e", "i", "zione", "mento")))
+		self.adjectives = ZipfVocabulary(rng, made_up_words(rng, n_adjectives,
+															suffixes=("ale", "oso", "ivo", "ico")))
+		self.verbs = ZipfVocabulary(rng, made_up_words(rng, n_verbs, suffixes=("are", "ere", "ire")))
+		self.proper_nouns = ZipfVocabulary(rng, made_up_words(rng, 1000, suffixes=("", "i", "o")))
+		self.prefixes = ZipfVocabulary(rng, PREFIXES)
+		self.adverbs = ZipfVocabulary(rng, ADVERBS)
+
+	def _adverb(self):
+		adverb = self.adverbs.draw()
+		return (adverb, adverb, "NEG" if adverb == "non" else "ADV")
+
+	def noun_phrase(self):
+		"""
+		The function `noun_phrase` returns the tokens of a noun phrase and the position (within the
+		phrase) of its head noun.
+		"""
+
+		rng = self.rng
+		det, det_tag = rng.choice(DETERMINERS)
+		noun = self.nouns.draw()
+		kind = rng.random()
+
+		if kind < 0.12:
+			# DET ADV NOUN, the adverb depending on the noun
+			return [(det, det, det_tag), self._adverb(), (noun, noun, "NOUN")], 2
+		if kind < 0.15:
+			return [(det, det, det_tag), self._adverb(), self._adverb(), (noun, noun, "NOUN")], 3
+		if kind < 0.19:
+			adjective = self.adjectives.draw()
+			return [(det, det, det_tag), (adjective, adjective, "ADJ"), self._adverb(),
+					(noun, noun, "NOUN")], 3
+		if kind < 0.27:
+			compound = f"{self.prefixes.draw()}-{noun}"
+			return [(det, det, det_tag), (compound, compound, "NOUN")], 1
+		if kind < 0.32:
+			name = self.proper_nouns.draw().capitalize()
+			return [(name, name, "PROPN")], 0
+		if kind < 0.50:
+			adjective = self.adjectives.draw()
+			return [(det, det, det_tag), (noun, noun, "NOUN"), (adjective, adjective, "ADJ")], 1
+		if kind < 0.52:
+			# DET ADV ADJ NOUN, excluded from the "ngram" construction
+			adjective = self.adjectives.draw()
+			return [(det, det, det_tag), self._adverb(), (adjective, adjective, "ADJ"),
+					(noun, noun, "NOUN")], 3
+		return [(det, det, det_tag), (noun, noun, "NOUN")], 1
+
+	def sentence(self):
+		"""
+		The function `sentence` returns the tokens of a random sentence: a subject, a verb and a few
+		objects and prepositional phrases, linked by dependency relations.
+		"""
+
+		rng = self.rng
+		tokens = []
+		heads = []
+
+		def add_phrase(phrase, head_n, phrase_head, deprel):
+			offset = len(tokens)
+			for token_n, token in enumerate(phrase):
+				tokens.append(token)
+				if token_n == head_n:
+					heads.append((phrase_head, deprel))
+				else:
+					heads.append((offset + head_n + 1, "det" if token[2] in ("RD", "RI") else "mod"))
+			return offset + head_n + 1
+
+		subject, subject_head = self.noun_phrase()
+		verb_position = len(subject) + 1
+		add_phrase(subject, subject_head, verb_position, "subj")
+
+		verb = self.verbs.draw()
+		tokens.append((verb, verb, "VERB"))
+		heads.append((0, "ROOT"))
+
+		for _ in range(rng.choice([1, 1, 2, 2, 3, 4])):
+			kind = rng.random()
+			if kind < 0.45:
+				preposition, tag = rng.choice(PREPOSITIONS)
+				tokens.append((preposition, preposition, tag))
+				heads.append((verb_position, "comp"))
+				phrase, head_n = self.noun_phrase()
+				add_phrase(phrase, head_n, len(tokens), "prep")
+			elif kind < 0.8:
+				phrase, head_n = self.noun_phrase()
+				add_phrase(phrase, head_n, verb_position, "obj")
+			elif kind < 0.9:
+				number = str(rng.randint(1, 2000))
+				tokens.append((number, number, "NUM"))
+				heads.append((verb_position, "mod"))
+			else:
+				conjunction = rng.choice(CONJUNCTIONS)
+				tokens.append((conjunction, conjunction, "CCONJ"))
+				heads.append((verb_position, "con"))
+				if rng.random() < 0.5:
+					tokens.append((",", ",", "PUNCT"))
+					heads.append((verb_position, "punc"))
+
+		tokens.append((".", ".", "SENT"))
+		heads.append((verb_position, "punc"))
+
+		sentence = []
+		for token_n, ((form, lemma, tag), (head, deprel)) in enumerate(zip(tokens, heads)):
+			if token_n == 0 or rng.random() < 0.01:
+				form = form.capitalize()
+			sentence.append((form, lemma, tag, head, deprel))
+		return sentence
+
+
+def _conll_tags(tag):
+	if tag in CONLL_TAGS:
+		return CONLL_TAGS[tag]
+	return tag[0], tag
+
+
+def write_itwac(sentences, fout):
+	"""
+	The function `write_itwac` writes sentences in the ITWAC format (form, tag and lemma, no syntax).
+	"""
+
+	print("<corpus>", file=fout)
+	for sentence_n, sentence in enumerate(sentences):
+		if sentence_n % 50 == 0:
+			if sentence_n > 0:
+				print("</text>", file=fout)
+			print(f'<text id="http://www.example.it/page.php?id={sentence_n}">', file=fout)
+
+		print("<s>", file=fout)
+		for form, lemma, tag, _, _ in sentence:
+			if tag == "NUM":
+				lemma = "@card@"
+			print(f"{form}\t{ITWAC_TAGS[tag]}\t{lemma}", file=fout)
+		print("</s>", file=fout)
+	print("</text>\n</corpus>", file=fout)
+
+
+def write_repubblica(sentences, fout):
+	"""
+	The function `write_repubblica` writes sentences in the REPUBBLICA format.
+	"""
+
+	for sentence_n, sentence in enumerate(sentences):
+		if sentence_n % 50 == 0:
+			if sentence_n > 0:
+				print("</text>", file=fout)
+			print(f'<text id="{sentence_n // 50 + 1}">', file=fout)
+
+		print("<s>", file=fout)
+		for token_n, (form, lemma, tag, head, deprel) in enumerate(sentence):
+			coarse, fine = _conll_tags(tag)
+			print(f"{token_n+1}\t{form}\t{lemma}\t{coarse}\t{fine}\t_\t{head}\t{deprel}\t_\t_", file=fout)
+		print("</s>", file=fout)
+	print("</text>", file=fout)
+
+
+def write_wikiconll(sentences, fout):
+	"""
+	The function `write_wikiconll` writes sentences in the WIKICONLL format.
+	"""
+
+	for sentence_n, sentence in enumerate(sentences):
+		if sentence_n % 50 == 0:
+			if sentence_n > 0:
+				print("</doc>", file=fout)
+			print(f'<doc id="{sentence_n}" url="http://it.wikipedia.org/wiki/Pagina_{sentence_n}">', file=fout)
+
+		for token_n, (form, lemma, tag, head, deprel) in enumerate(sentence):
+			coarse, fine = _conll_tags(tag)
+			print(f"{token_n+1}\t{form}\t{lemma}\t{coarse}\t{fine}\t_\t{head}\t{deprel}\t_\t_\tO\tO\t",
+				  file=fout)
+		print("", file=fout)
+	print("</doc>", file=fout)
+
+
+WRITERS = {"ITWAC": (write_itwac, "iso-8859-1"),
+		   "REPUBBLICA": (write_repubblica, "utf-8"),
+		   "WIKICONLL": (write_wikiconll, "utf-8")}
+
+
+def generate(output_directory, n_tokens, sources=tuple(FORMATS), n_files=1, seed=1354):
+	"""
+	The function `generate` writes synthetic corpus files and their `files_input.tsv` list.
+
+	Args:
+	  output_directory: The folder where corpora are written (created if missing).
+	  n_tokens: The (approximate) number of tokens of each corpus file.
+	  sources: The formats of the corpus files, among the keys of `FORMATS`.
+	  n_files: The number of corpus files of each format.
+	  seed: The random seed; the same seed gives the same corpora.
+
+	Returns:
+	  A dictionary mapping the path of each corpus file to its number of sentences and tokens.
+	"""
+
+	output_directory = pathlib.Path(output_directory)
+	output_directory.mkdir(parents=True, exist_ok=True)
+
+	rng = random.Random(seed)
+	generator = SentenceGenerator(rng)
+
+	stats = {}
+	with open(output_directory.joinpath("files_input.tsv"), "w", encoding="utf-8") as files_list:
+		for source in sources:
+			write_function, encoding = WRITERS[source]
+
+			for file_id in range(n_files):
+				sentences = []
+				tokens = 0
+				while tokens < n_tokens:
+					sentence = generator.sentence()
+					sentences.append(sentence)
+					tokens += len(sentence)
+
+				path = output_directory.joinpath(f"{file_id}.{FORMATS[source]}").absolute()
+				with open(path, "w", encoding=encoding) as fout:
+					write_function(sentences, fout)
+
+				print(f"{source}\t{file_id}\t{path}", file=files_list)
+				stats[str(path)] = {"source": source, "sentences": len(sentences), "tokens": tokens}
+
+	with open(output_directory.joinpath("corpus.json"), "w", encoding="utf-8") as fout:
+		json.dump({"seed": seed, "files": stats}, fout, indent=1)
+
+	return stats
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(prog="benchmarks.generate",
+									 formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+									 description="generate synthetic corpora")
+	parser.add_argument("-o", "--output-folder", type=pathlib.Path, default="benchmarks/corpora",
+						help="path to output folder")
+	parser.add_argument("--tokens", type=int, default=1000000,
+						help="number of tokens of each corpus file")
+	parser.add_argument("--files", type=int, default=1,
+						help="number of corpus files of each format")
+	parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS),
+						help="formats of the corpus files")
+	parser.add_argument("-s", "--seed", type=int, default=1354,
+						help="random seed for reproducibility")
+	args = parser.parse_args()
+
+	generate(args.output_folder, args.tokens, args.formats, args.files, args.seed)
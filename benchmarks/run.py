@@ -0,0 +1,390 @@
+"""
+This python module times the readers and the processing steps of the `TAM` library over a list of
+corpus files, such as those written by `benchmarks.generate`, and reports their throughput and peak
+memory.
+
+Usage (from the main folder of the repository):
+```
+python3 -m benchmarks.run -i path/to/files_input.tsv -o path/to/work/folder
+	[--save results.json] [--baseline baseline.json] [--tolerance 0.1] [--repeat N]
+```
+
+Benchmarks run in the order of `BENCHMARKS`, each in a new process, so that its peak memory is
+measured on its own; later benchmarks read the outputs of earlier ones (e.g., `extract_advN`
+reads the merged noun frequencies). With `--baseline`, results are compared with those saved by a
+previous run with `--save`: benchmarks whose throughput dropped by more than `--tolerance`, or
+whose outputs changed on the same corpora, are reported and the exit status is 1.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pathlib
+import platform
+import sys
+import time
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+
+def _peak_memory():
+	"""
+	The function `_peak_memory` returns the peak resident memory of the current process, in MB, or
+	`None` if it is unavailable on this platform.
+	"""
+
+	if resource is None:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# bytes on macOS, kilobytes elsewhere
+	return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _digest(paths):
+	"""
+	The function `_digest` hashes the names and contents of the files in `paths` (files or folders).
+	"""
+
+	digest = hashlib.sha256()
+	for path in paths:
+		path = pathlib.Path(path)
+		files = sorted(path.rglob("*")) if path.is_dir() else [path]
+		for filename in files:
+			if filename.is_file() and filename.suffix != ".db":
+				digest.update(filename.name.encode("utf-8"))
+				digest.update(filename.read_bytes())
+	return digest.hexdigest()
+
+
+def read_files_list(filename):
+	input_files = []
+	with open(filename, encoding="utf-8") as fin:
+		for line in fin:
+			source, file_id, path = line.strip().split("\t")
+			input_files.append((source, file_id, pathlib.Path(path)))
+	return input_files
+
+
+def _files_of(input_files, source):
+	return [(file_source, file_id, path) for file_source, file_id, path in input_files
+			if file_source == source]
+
+
+def bench_read(input_files, work_directory, options, source, forms_only=False):
+	import TAM.utils as utils
+
+	n_tokens = 0
+	n_sentences = 0
+	start = time.perf_counter()
+	for file_source, _, path in _files_of(input_files, source):
+		for sentence in utils.read(path, file_source, forms_only=forms_only):
+			n_sentences += 1
+			n_tokens += len(sentence)
+	seconds = time.perf_counter() - start
+
+	return seconds, n_tokens, "tokens", f"{n_sentences}:{n_tokens}"
+
+
+def bench_extract_NOUN(input_files, work_directory, options):
+	import TAM.extract as extract
+
+	output_directory = work_directory.joinpath("noun_frequencies")
+	output_directory.mkdir(parents=True, exist_ok=True)
+
+	start = time.perf_counter()
+	for source, file_id, path in input_files:
+		extract.extract_NOUN(path, source, file_id, output_directory)
+	seconds = time.perf_counter() - start
+
+	return seconds, options["tokens"], "tokens", _digest([output_directory])
+
+
+def bench_merge_frequencies(input_files, work_directory, options):
+	import TAM.utils as utils
+
+	directory = work_directory.joinpath("noun_frequencies")
+	input_filenames = sorted(directory.glob("*.nouns.tsv"))
+	n_entries = sum(1 for filename in input_filenames for _ in open(filename, encoding="utf-8"))
+
+	start = time.perf_counter()
+	utils.merge_frequencies(input_filenames, directory.joinpath("merged.tsv"))
+	seconds = time.perf_counter() - start
+
+	return seconds, n_entries, "entries", _digest([directory.joinpath("merged.tsv")])
+
+
+def _extract_construction(input_files, work_directory, options, extract_name, folder):
+	import TAM.extract as extract
+	import TAM.utils as utils
+
+	accepted_nouns = utils.load_from_file(work_directory.joinpath("noun_frequencies", "merged.tsv"),
+										  options["threshold"])
+
+	output_directory = work_directory.joinpath(folder)
+	output_directory.mkdir(parents=True, exist_ok=True)
+	extract_function = getattr(extract, extract_name)
+
+	start = time.perf_counter()
+	for source, file_id, path in input_files:
+		extract_function(path, source, file_id, accepted_nouns, output_directory)
+	seconds = time.perf_counter() - start
+
+	return seconds, options["tokens"], "tokens", _digest([output_directory])
+
+
+def bench_extract_advN(input_files, work_directory, options):
+	return _extract_construction(input_files, work_directory, options, "extract_advN",
+								 "compound_frequencies")
+
+
+def bench_extract_detADVN(input_files, work_directory, options):
+	return _extract_construction(input_files, work_directory, options, "extract_detADVN",
+								 "ngrams_frequencies")
+
+
+def _extract_contexts(input_files, work_directory, options, extract_name, name, folder, key_list):
+	import TAM.contexts as contexts
+	import TAM.utils as utils
+
+	frequencies_directory = work_directory.joinpath(f"{folder}_frequencies")
+	accepted = {}
+	for table in ["nouns", key_list]:
+		filename = frequencies_directory.joinpath(f"{table}_merged.tsv")
+		utils.merge_frequencies(sorted(frequencies_directory.glob(f"*.{table}.tsv")), filename)
+		accepted[table] = utils.load_from_file(filename, options["contexts_threshold"])
+
+	output_directory = work_directory.joinpath(f"{folder}_contexts")
+	output_directory.mkdir(parents=True, exist_ok=True)
+	extract_function = getattr(contexts, extract_name)
+
+	start = time.perf_counter()
+	with contexts.contexts_writers({name: output_directory}) as writers:
+		for source, _, path in input_files:
+			extract_function(path, source, accepted[key_list], accepted["nouns"], options["context_width"],
+							 writers)
+	seconds = time.perf_counter() - start
+
+	return seconds, options["tokens"], "tokens", _digest([output_directory])
+
+
+def bench_extract_ctx_advN(input_files, work_directory, options):
+	return _extract_contexts(input_files, work_directory, options, "extract_ctx_advN", "compound",
+							 "compound", "prefs")
+
+
+def bench_extract_ctx_detADVN(input_files, work_directory, options):
+	return _extract_contexts(input_files, work_directory, options, "extract_ctx_detADVN", "ngram",
+							 "ngrams", "adverbs")
+
+
+def bench_sample_contexts(input_files, work_directory, options):
+	import TAM.sample as sample
+
+	filenames = sorted(work_directory.joinpath("compound_contexts").glob("*.contexts.tsv")) + \
+		sorted(work_directory.joinpath("ngrams_contexts").glob("*.contexts.tsv"))
+	n_rows = sum(1 for filename in filenames for _ in open(filename, encoding="utf-8"))
+
+	output_directory = work_directory.joinpath("samples")
+	output_directory.mkdir(parents=True, exist_ok=True)
+
+	start = time.perf_counter()
+	for filename in filenames:
+		sample.sample_contexts(filename, options["contexts_number"], options["seed"], output_directory)
+	seconds = time.perf_counter() - start
+
+	return seconds, n_rows, "contexts", _digest([output_directory])
+
+
+BENCHMARKS = [
+	("read_itwac", bench_read, ("ITWAC",)),
+	("read_repubblica", bench_read, ("REPUBBLICA",)),
+	("read_wikiconll", bench_read, ("WIKICONLL",)),
+	("read_itwac_forms", bench_read, ("ITWAC", True)),
+	("read_repubblica_forms", bench_read, ("REPUBBLICA", True)),
+	("read_wikiconll_forms", bench_read, ("WIKICONLL", True)),
+	("extract_NOUN", bench_extract_NOUN, ()),
+	("merge_frequencies", bench_merge_frequencies, ()),
+	("extract_advN", bench_extract_advN, ()),
+	("extract_detADVN", bench_extract_detADVN, ()),
+	("extract_ctx_advN", bench_extract_ctx_advN, ()),
+	("extract_ctx_detADVN", bench_extract_ctx_detADVN, ()),
+	("sample_contexts", bench_sample_contexts, ()),
+]
+
+
+def _run_benchmark(function, input_files, work_directory, options, extra_args):
+	"""
+	The function `_run_benchmark` runs a benchmark in a worker process, silencing the progress output
+	of the library.
+	"""
+
+	with contextlib.redirect_stdout(io.StringIO()):
+		seconds, units, unit, digest = function(input_files, work_directory, options, *extra_args)
+
+	return {"seconds": seconds, "units": units, "unit": unit,
+			"rate": units / seconds if seconds > 0 else None,
+			"peak_memory_mb": _peak_memory(), "digest": digest}
+
+
+def run_benchmarks(input_files, work_directory, options, repeat=1):
+	"""
+	The function `run_benchmarks` runs all `BENCHMARKS` over a list of corpus files.
+
+	Args:
+	  input_files: A list of (`source`, `file_id`, `path`) triples.
+	  work_directory: The folder where the outputs of the steps are written.
+	  options: A dictionary with the total number of `tokens` of the corpus files and the parameters
+	of the steps (`threshold`, `contexts_threshold`, `context_width`, `contexts_number`, `seed`).
+	  repeat: The number of times each benchmark is run, the fastest run being reported.
+
+	Returns:
+	  A dictionary mapping the name of each benchmark to its results: `seconds`, number of processed
+	`units` (e.g., tokens) and their `unit`, `rate` (units per second), `peak_memory_mb` and a
+	`digest` of the outputs.
+	"""
+
+	# progress bars of the library are disabled in worker processes
+	os.environ["TQDM_DISABLE"] = "1"
+
+	results = {}
+	with concurrent.futures.ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+		for name, function, extra_args in BENCHMARKS:
+			# readers are skipped when there is no file of their format
+			if extra_args and not _files_of(input_files, extra_args[0]):
+				continue
+
+			runs = [executor.submit(_run_benchmark, function, input_files, work_directory, options,
+									extra_args).result()
+					for _ in range(repeat)]
+			results[name] = min(runs, key=lambda run: run["seconds"])
+			results[name]["peak_memory_mb"] = max((run["peak_memory_mb"] or 0) for run in runs) or None
+			print(_format_result(name, results[name]), flush=True)
+
+	return results
+
+
+def _format_result(name, result, baseline=None, flags=()):
+	line = f"{name:<22}{result['seconds']:>10.2f} s{result['rate'] or 0:>14,.0f} {result['unit']}/s"
+	if result["peak_memory_mb"] is not None:
+		line += f"{result['peak_memory_mb']:>10.1f} MB"
+	if baseline is not None and baseline.get("rate") and result["rate"]:
+		line += f"{(result['rate'] / baseline['rate'] - 1) * 100:>+9.1f}%"
+	if flags:
+		line += "  " + ", ".join(flags)
+	return line
+
+
+def compare(results, baseline, tolerance, same_corpus=True):
+	"""
+	The function `compare` prints the change in throughput of each benchmark with respect to a
+	baseline, and flags regressions.
+
+	Args:
+	  results: The results of `run_benchmarks`.
+	  baseline: The results of a previous run.
+	  tolerance: The relative drop in throughput above which a benchmark is reported as slower.
+	  same_corpus: Whether both runs processed the same corpora, so that outputs can be compared.
+
+	Returns:
+	  The number of flagged benchmarks.
+	"""
+
+	n_flagged = 0
+	for name, result in results.items():
+		if name not in baseline:
+			continue
+
+		flags = []
+		if baseline[name].get("rate") and result["rate"] and \
+			result["rate"] < baseline[name]["rate"] * (1 - tolerance):
+			flags.append("slower")
+		if same_corpus and result["digest"] != baseline[name]["digest"]:
+			flags.append("outputs changed")
+
+		n_flagged += bool(flags)
+		print(_format_result(name, result, baseline[name], flags))
+
+	return n_flagged
+
+
+def corpus_description(input_files):
+	"""
+	The function `corpus_description` lists the corpus files with their size, so that results
+	are only compared on the same corpora.
+	"""
+
+	return [[source, file_id, path.name, path.stat().st_size] for source, file_id, path in input_files]
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(prog="benchmarks.run",
+									 formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+									 description="time readers and processing steps")
+	parser.add_argument("-i", "--input-files-list", type=pathlib.Path,
+						default="benchmarks/corpora/files_input.tsv",
+						help="path to file containing list of input files")
+	parser.add_argument("-o", "--output-folder", type=pathlib.Path, default="benchmarks/work",
+						help="path to the folder where outputs of the steps are written")
+	parser.add_argument("--save", type=pathlib.Path,
+						help="path to a JSON file where results are saved")
+	parser.add_argument("--baseline", type=pathlib.Path,
+						help="path to the JSON results of a previous run to compare with")
+	parser.add_argument("--tolerance", type=float, default=0.1,
+						help="relative drop in throughput reported as a regression")
+	parser.add_argument("--repeat", type=int, default=1,
+						help="number of runs of each benchmark, the fastest being reported")
+	parser.add_argument("-t", "--threshold", type=int, default=5,
+						help="minimum noun frequency for extraction")
+	parser.add_argument("--contexts-threshold", type=int, default=5,
+						help="minimum frequency of nouns, prefixes and adverbs for contexts")
+	parser.add_argument("-c", "--context-width", type=int, default=20,
+						help="width of left and right sentence context")
+	parser.add_argument("-n", "--contexts-number", type=int, default=20,
+						help="number of contexts to sample for each noun")
+	parser.add_argument("-s", "--seed", type=int, default=1354,
+						help="random seed for sampling")
+	args = parser.parse_args()
+
+	input_files = read_files_list(args.input_files_list)
+	args.output_folder.mkdir(parents=True, exist_ok=True)
+
+	corpus = corpus_description(input_files)
+	corpus_stats = args.input_files_list.parent.joinpath("corpus.json")
+	if corpus_stats.exists():
+		with open(corpus_stats, encoding="utf-8") as fin:
+			n_tokens = sum(stats["tokens"] for stats in json.load(fin)["files"].values())
+	else:
+		n_tokens = sum(bench_read(input_files, args.output_folder, {}, source)[1]
+					   for source in sorted({source for source, _, _ in input_files}))
+
+	options = {"tokens": n_tokens, "threshold": args.threshold,
+			   "contexts_threshold": args.contexts_threshold, "context_width": args.context_width,
+			   "contexts_number": args.contexts_number, "seed": args.seed}
+
+	print(f"{len(input_files)} corpus files, {n_tokens:,} tokens")
+	results = run_benchmarks(input_files, args.output_folder, options, args.repeat)
+
+	if args.save is not None:
+		with open(args.save, "w", encoding="utf-8") as fout:
+			json.dump({"corpus": corpus, "options": options, "python": platform.python_version(),
+					   "platform": platform.platform(), "results": results}, fout, indent=1)
+
+	if args.baseline is not None:
+		with open(args.baseline, encoding="utf-8") as fin:
+			baseline = json.load(fin)
+
+		same_corpus = baseline["corpus"] == corpus and baseline["options"] == options
+		if not same_corpus:
+			print("Corpora or options differ from the baseline, outputs are not compared")
+
+		print(f"\nCompared with {args.baseline}:")
+		if compare(results, baseline["results"], args.tolerance, same_corpus) > 0:
+			sys.exit(1)
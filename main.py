@@ -1,107 +1,244 @@
 import argparse
+import functools
+import logging
+import os
 import pathlib
+import sys
 from pathlib import Path
 
-import tqdm
-
+import TAM.api as api
+import TAM.checkpoint as ck
+import TAM.dedup as dd
 import TAM.extract as e
-import TAM.contexts as c
+import TAM.context_store as cs
+import TAM.matcher as m
+import TAM.metrics as mt
+import TAM.pipeline as pl
+import TAM.runner as r
 import TAM.utils as u
 import TAM.sample as s
+import TAM.sketch as sk
+import TAM.sketchengine as se
+import TAM.store as st
+import TAM.writers as w
+
+
+def _checkpoints(args, output_directory, step):
+
+	if not (args.resume or args.checkpoint_every is not None):
+		return None
+
+	if args.checkpoint_every is None:
+		segment_size = ck.SEGMENT_SIZE
+	else:
+		segment_size = int(args.checkpoint_every * 1024 * 1024)
+
+	return api.Checkpoints(output_directory, step, segment_size, args.resume)
+
+
+def _approximate(args):
+
+	if not args.approximate:
+		return None
+
+	return {"width": args.sketch_width, "depth": args.sketch_depth, "capacity": args.capacity}
 
 
 def _compute_noun_frequencies(args):
 
-	input_files = []
-	with open(Path(args.input_files_list), encoding="utf-8") as fin:
-		for line in fin:
-			linesplit = line.strip().split("\t")
-			source, file_id, path = linesplit
-			path = Path(path)
-			input_files.append((source, file_id, path))
+	corpus = api.Corpus.from_list(args.input_files_list)
 
 	output_directory = Path(args.output_folder)
 	output_directory.mkdir(parents=True, exist_ok=True)
 
-	for source, file_id, path in tqdm.tqdm(input_files):
-		e.extract_NOUN(path, source, file_id, output_directory)
+	approximate = _approximate(args)
+	step = "frequencies" if approximate is None else repr(("frequencies", approximate))
+	results = api.noun_frequencies(corpus, args.workers, args.shards,
+								   _checkpoints(args, output_directory, step), approximate)
+	api.write_frequencies(results, e.write_NOUN, output_directory,
+						  per_file=not args.no_per_file, merged=args.write_merged)
+	ck.clear_checkpoints(output_directory)
+
+
+def _encode_corpora(args):
+
+	corpus = api.Corpus.from_list(args.input_files_list)
+
+	output_directory = Path(args.output_folder)
+	output_directory.mkdir(parents=True, exist_ok=True)
+
+	deduplicator = None
+	if args.dedup is not None:
+		deduplicator = dd.open_deduplicator(args.dedup, args.dedup_state, args.dedup_capacity)
+
+	api.encode(corpus, output_directory, deduplicator, args.dedup_state)
 
 
 def _merge_frequencies(args):
 
-	input_filenames = Path(args.input_folder).glob(f"*{args.pattern}*")
+	input_filenames = [filename for filename in Path(args.input_folder).glob(f"*{args.pattern}*")
+					   if filename.suffix not in (st.STORE_SUFFIX, sk.SKETCH_SUFFIX)]
 	output_filename = Path(args.output_folder).joinpath(f"{args.output_filename}")
 
-	u.merge_frequencies(input_filenames, output_filename)
+	sketch_filenames = [sk.current_sketch(filename) for filename in input_filenames]
+	if input_filenames and all(filename is not None for filename in sketch_filenames):
+		# lists written with --approximate are merged through their sketches, in bounded memory
+		freqs = sk.merge_files(sketch_filenames)
+		u.write_frequencies(freqs, output_filename)
+		e.save_sketch(freqs, output_filename)
+	else:
+		u.merge_frequencies(input_filenames, output_filename, args.max_items, args.temp_folder)
+		e.remove_sketch(output_filename)
+
+	if args.store:
+		st.build_store(output_filename, {filename.name: u.read_frequencies([filename])
+										 for filename in input_filenames})
 
 
 def _extract_raw(args):
 
-	input_files = []
-	with open(Path(args.input_files), encoding="utf-8") as fin:
-		for line in fin:
-			linesplit = line.strip().split("\t")
-			source, file_id, path = linesplit
-			path = Path(path)
-			input_files.append((source, file_id, path))
+	corpus = api.Corpus.from_list(args.input_files)
 
 	output_directory = Path(args.output_folder)
 	output_directory.mkdir(parents=True, exist_ok=True)
 
 	accepted_nouns = u.load_from_file(args.nouns_filename, args.threshold)
 
-	for source, file_id, path in tqdm.tqdm(input_files):
-		if args.type == "compound":
-			e.extract_advN(path, source, file_id, accepted_nouns, output_directory)
-		elif args.type == "ngram":
-			e.extract_detADVN(path, source, file_id, accepted_nouns, output_directory)
+	construction = m.load_patterns(args.patterns, (args.type,)).constructions[args.type]
+
+	approximate = _approximate(args)
+	step = ("extract", args.type, ck.file_state(args.nouns_filename), args.threshold,
+			ck.file_state(args.patterns))
+	step = repr(step if approximate is None else step + (approximate,))
+	results = api.construction_frequencies(corpus, args.type, accepted_nouns, args.patterns,
+										   args.workers, args.shards,
+										   _checkpoints(args, output_directory, step), approximate)
+	api.write_frequencies(results, functools.partial(e.write_construction, construction), output_directory,
+						  per_file=not args.no_per_file, merged=args.write_merged)
+	ck.clear_checkpoints(output_directory)
+
 
 def _extract_contexts(args):
 
-	input_files = []
-	with open(Path(args.input_files), encoding="utf-8") as fin:
-		for line in fin:
-			linesplit = line.strip().split("\t")
-			source, file_id, path = linesplit
-			path = Path(path)
-			input_files.append((source, file_id, path))
+	corpus = api.Corpus.from_list(args.input_files)
 
 	output_directory = Path(args.output_folder)
 	output_directory.mkdir(parents=True, exist_ok=True)
 
-	if args.type == "compound":
-		accepted_nouns = u.load_from_file(args.accepted_nouns, args.nouns_threshold)
-		accepted_prefs = u.load_from_file(args.accepted_prefs, args.prefs_threshold)
-	elif args.type == "ngram":
-		accepted_nouns = u.load_from_file(args.accepted_nouns, args.nouns_threshold)
-		accepted_adverbs = u.load_from_file(args.accepted_adverbs, args.adverbs_threshold)
+	construction = m.load_patterns(args.patterns, (args.type,)).constructions[args.type]
+
+	accepted_keys = {"prefs": (args.accepted_prefs, args.prefs_threshold),
+					 "adverbs": (args.accepted_adverbs, args.adverbs_threshold)}
+	if construction.key_list not in accepted_keys:
+		raise ValueError(f"No accepted list available for {construction.key_list}")
+
+	accepted = {"nouns": u.load_from_file(args.accepted_nouns, args.nouns_threshold),
+				construction.key_list: u.load_from_file(*accepted_keys[construction.key_list])}
 
+	step = repr(("contexts", args.type, args.context_width,
+				 ck.file_state(args.accepted_nouns), args.nouns_threshold,
+				 ck.file_state(accepted_keys[construction.key_list][0]),
+				 accepted_keys[construction.key_list][1], ck.file_state(args.patterns)))
+	api.write_contexts(corpus, args.type, accepted, output_directory, args.context_width, args.patterns,
+					   store=args.store, max_open_files=args.max_open_files,
+					   checkpoints=_checkpoints(args, output_directory, step))
+	ck.clear_checkpoints(output_directory)
 
-	output_files = {}
-	for source, file_id, path in tqdm.tqdm(input_files):
-		if args.type == "compound":
-			c.extract_ctx_advN(path, source,
-					  accepted_prefs, accepted_nouns,
-					  args.context_width, output_directory, output_files)
-		elif args.type == "ngram":
-			c.extract_ctx_detADVN(path, source,
-						 accepted_adverbs, accepted_nouns,
-						 args.context_width, output_directory, output_files)
+
+def _run_all(args):
+
+	corpus = api.Corpus.from_list(args.input_files)
+
+	pl.run_all(corpus.files, Path(args.output_folder),
+			args.threshold, args.nouns_threshold, args.prefs_threshold, args.adverbs_threshold,
+			args.context_width,
+			accepted_prefs=args.accepted_prefs, accepted_adverbs=args.accepted_adverbs,
+			n_workers=args.workers, patterns=args.patterns, max_open_files=args.max_open_files,
+			store=args.store)
+
+
+def _run_pipeline(args):
+
+	stages = r.load_pipeline(args.pipeline, args.parsers)
+	cache = r.PipelineCache(args.cache_folder, args.hash == "content", [os.path.abspath(__file__)])
+
+	r.run_pipeline(stages, cache, [sys.executable, os.path.abspath(__file__)],
+				n_jobs=args.jobs, force=args.force, dry_run=args.dry_run)
 
 
 def _sample_contexts(args):
 
-	input_files = args.input_folder.glob("*contexts.tsv")
+	args.output_folder.mkdir(parents=True, exist_ok=True)
+
+	s.sample_folder(args.input_folder, args.output_folder, args.contexts_number, args.seed,
+				 args.exact, args.workers)
+
+
+def _export_contexts(args):
+
+	cs.export_tsv(args.input_store, args.output_folder, args.max_open_files)
+
+
+def _download_wordlist(args):
 
 	args.output_folder.mkdir(parents=True, exist_ok=True)
 
-	for file in input_files:
-		s.sample_contexts(file, args.contexts_number, args.seed, args.output_folder)
+	se.download_wordlist(args.output_folder.joinpath(args.output_filename), args.corpname,
+						 args.attribute, args.pattern, args.min_freq, args.page_size,
+						 base_url=args.base_url, cache_folder=args.response_cache,
+						 max_requests=args.max_requests, rate=args.rate)
 
 
 if __name__ == "__main__":
 
 	parent_parser = argparse.ArgumentParser(add_help=False)
+	parent_parser.add_argument("--metrics", type=pathlib.Path,
+							help="append metrics of each scanned file (bytes, sentences, matches, "
+							"timings, peak memory) as JSON lines to this file")
+	parent_parser.add_argument("--profile", nargs="?", const="cpu", choices=["cpu", "memory", "all"],
+							help="profile the step with cProfile (cpu) and/or tracemalloc (memory), "
+							"writing reports in the .profile subfolder of the output folder")
+
+	patterns_parser = argparse.ArgumentParser(add_help=False)
+	patterns_parser.add_argument("--patterns", default=m.DEFAULT_PATTERNS,
+							  type=pathlib.Path,
+							  help="path to the pattern specification file")
+
+	checkpoint_parser = argparse.ArgumentParser(add_help=False)
+	checkpoint_parser.add_argument("--checkpoint-every", type=float,
+								help="save a checkpoint every N MB of each corpus file, "
+								"in the .checkpoints subfolder of the output folder")
+	checkpoint_parser.add_argument("--resume", action="store_true",
+								help="continue from the last checkpoint of an interrupted run "
+								"(with the same --checkpoint-every)")
+
+	scan_parser = argparse.ArgumentParser(add_help=False)
+	scan_parser.add_argument("--shards", default=1, type=int,
+						  help="number of byte ranges each input file is split into and scanned in parallel")
+	scan_parser.add_argument("--workers", type=int,
+						  help="number of worker processes (defaults to --shards); "
+						  "the largest files (or shards) are scheduled first")
+	scan_parser.add_argument("--write-merged", action="store_true",
+						  help="also write merged frequency lists ({name}_merged.tsv), "
+						  "as the merge step would, directly from memory")
+	scan_parser.add_argument("--no-per-file", action="store_true",
+						  help="do not write per-file frequency lists")
+
+	approximate_parser = argparse.ArgumentParser(add_help=False)
+	approximate_parser.add_argument("--approximate", action="store_true",
+								 help="count frequencies approximately in bounded memory (Count-Min sketch "
+								 "and Space-Saving), saving a .sketch file next to each frequency list; "
+								 "with the default sizes, each table takes about 17 MB, which only saves "
+								 "memory over exact counts beyond about 100,000 distinct keys per file")
+	approximate_parser.add_argument("--sketch-width", default=sk.WIDTH, type=int,
+								 help="number of counters of each row of the sketch, estimates exceed true "
+								 "frequencies by at most e/width of the total count")
+	approximate_parser.add_argument("--sketch-depth", default=sk.DEPTH, type=int,
+								 help="number of rows of the sketch, the bound above holds with "
+								 "probability 1 - exp(-depth)")
+	approximate_parser.add_argument("--capacity", default=sk.CAPACITY, type=int,
+								 help="number of keys listed, all keys more frequent than 1/capacity of the "
+								 "total count are listed")
 
 	root_parser = argparse.ArgumentParser(prog='TAM', add_help=True)
 	subparsers = root_parser.add_subparsers(title="actions", dest="actions")
@@ -109,7 +246,8 @@ if __name__ == "__main__":
 
 	parser_frequencies = subparsers.add_parser('frequencies',
 											formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-											parents=[parent_parser],
+											parents=[parent_parser, scan_parser, checkpoint_parser,
+													 approximate_parser],
 											description='compute frequency of NOUNS',
 											help='compute frequency of NOUNS')
 	parser_frequencies.add_argument("-i", "--input-files-list",
@@ -122,6 +260,26 @@ if __name__ == "__main__":
 	parser_frequencies.set_defaults(func=_compute_noun_frequencies)
 
 
+	parser_encode = subparsers.add_parser("encode", parents=[parent_parser],
+									   formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+									   description='convert corpora into the binary encoded format',
+									   help='convert corpora into the binary encoded format')
+	parser_encode.add_argument("-i", "--input-files-list",
+							default="data_sample/files_input.tsv",
+							type=pathlib.Path,
+							help="path to file containing list of input files")
+	parser_encode.add_argument("-o", "--output-folder", default="data_sample/encoded/",
+							type=pathlib.Path,
+							help="path to output folder")
+	parser_encode.add_argument("--dedup", choices=dd.MODES,
+							help="drop sentences already seen, identical (exact) or similar (near)")
+	parser_encode.add_argument("--dedup-state", type=pathlib.Path,
+							help="file where seen sentences are saved, and loaded from by later runs")
+	parser_encode.add_argument("--dedup-capacity", type=int, default=dd.CAPACITY,
+							help="number of sentences the deduplication state is sized for")
+	parser_encode.set_defaults(func=_encode_corpora)
+
+
 	parser_merge = subparsers.add_parser("merge", parents=[parent_parser],
 									  formatter_class=argparse.ArgumentDefaultsHelpFormatter,
 									  description='merge frequency lists',
@@ -138,18 +296,29 @@ if __name__ == "__main__":
 	parser_merge.add_argument("--output-filename", default="accepted.tsv",
 						   type=str,
 						   help="name for merged file")
+	parser_merge.add_argument("--max-items", type=int,
+						   help="maximum number of distinct keys kept in memory, sorted runs are "
+						   "spilled to disk and merged when exceeded (unbounded if not set)")
+	parser_merge.add_argument("--temp-folder", type=pathlib.Path,
+						   help="folder for the sorted runs written with --max-items "
+						   "(system default if not set)")
+	parser_merge.add_argument("--store", action="store_true",
+						   help="also build the frequency store of the merged file, with the "
+						   "frequencies of each input file")
 	parser_merge.set_defaults(func=_merge_frequencies)
 
 
-	parser_extract = subparsers.add_parser("extract", parents=[parent_parser],
+	parser_extract = subparsers.add_parser("extract", parents=[parent_parser, scan_parser, checkpoint_parser,
+															   patterns_parser, approximate_parser],
 										formatter_class=argparse.ArgumentDefaultsHelpFormatter,
 										description='extract raw data',
 										help='extract raw data')
 	parser_extract.add_argument("-i", "--input-files", default="data_sample/files_input.tsv",
 							 type=pathlib.Path,
 							 help="path to file containing list of input files")
-	parser_extract.add_argument("--type", choices=["compound", "ngram"], default="compound",
-							    help="type of structures to extract")
+	parser_extract.add_argument("--type", default="compound",
+							    help="type of structures to extract, as named in the pattern specification file "
+							    "(compound or ngram by default)")
 	parser_extract.add_argument("-o", "--output-folder",
 							 type=pathlib.Path,
 							 default="data_sample/output_compoundfrequencies/",
@@ -163,15 +332,17 @@ if __name__ == "__main__":
 	parser_extract.set_defaults(func=_extract_raw)
 
 
-	parser_contexts = subparsers.add_parser("contexts", parents=[parent_parser],
+	parser_contexts = subparsers.add_parser("contexts", parents=[parent_parser, checkpoint_parser,
+																 patterns_parser],
 										 formatter_class=argparse.ArgumentDefaultsHelpFormatter,
 										 description='extract contexts',
 										 help='extract contexts')
 	parser_contexts.add_argument("-i", "--input-files", default="data_sample/files_input.tsv",
 							  type=pathlib.Path,
 							  help="path to file containing list of input files")
-	parser_contexts.add_argument("--type", choices=["compound", "ngram"], default="compound",
-							    help="type of structures to extract")
+	parser_contexts.add_argument("--type", default="compound",
+							    help="type of structures to extract, as named in the pattern specification file "
+							    "(compound or ngram by default)")
 	parser_contexts.add_argument("-o", "--output-folder",
 							  type=pathlib.Path,
 							  default="data_sample/output_compoundcontexts/",
@@ -193,6 +364,11 @@ if __name__ == "__main__":
 							  help="minimum prefix frequency")
 	parser_contexts.add_argument("-c", "--context-width", type=int, default=20,
 							     help="width of left and right sentence context")
+	parser_contexts.add_argument("--store", action="store_true",
+						     help="write contexts to an indexed context store (contexts.tcs) "
+						     "instead of TSV files")
+	parser_contexts.add_argument("--max-open-files", type=int, default=w.MAX_OPEN,
+							     help="maximum number of contexts files open at the same time")
 	parser_contexts.set_defaults(func=_extract_contexts)
 
 
@@ -210,13 +386,131 @@ if __name__ == "__main__":
 							help="random seed for reproducibility")
 	parser_sample.add_argument("-n", "--contexts-number", type=int, default=20,
 							help="number of contexts to sample for each noun")
+	parser_sample.add_argument("--exact", action="store_true",
+							help="sample in two passes, as previous versions did, so that seeds "
+							"give the same contexts")
+	parser_sample.add_argument("--workers", type=int, default=1,
+							help="number of worker processes sampling files concurrently")
 	parser_sample.set_defaults(func=_sample_contexts)
 
 
+	parser_export = subparsers.add_parser("export", parents=[parent_parser],
+									   formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+									   description='export a context store to contexts TSV files',
+									   help='export a context store to contexts TSV files')
+	parser_export.add_argument("-i", "--input-store", type=pathlib.Path, required=True,
+							help="path to the context store (contexts.tcs folder)")
+	parser_export.add_argument("-o", "--output-folder", type=pathlib.Path, required=True,
+							help="path to output folder")
+	parser_export.add_argument("--max-open-files", type=int, default=w.MAX_OPEN,
+							help="maximum number of contexts files open at the same time")
+	parser_export.set_defaults(func=_export_contexts)
+
+
+	parser_sketchengine = subparsers.add_parser("sketchengine", parents=[parent_parser],
+											 formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+											 description='download a word list from SketchEngine, with credentials '
+											 f'read from {se.USERNAME_VARIABLE} and {se.API_KEY_VARIABLE}',
+											 help='download a word list from SketchEngine')
+	parser_sketchengine.add_argument("-c", "--corpname", default="preloaded/ittenten20_fl1",
+								  help="name of the SketchEngine corpus")
+	parser_sketchengine.add_argument("--attribute", default="lempos",
+								  help="attribute listed")
+	parser_sketchengine.add_argument("--pattern", default=".*-n",
+								  help="regular expression the listed values must match")
+	parser_sketchengine.add_argument("--min-freq", type=int, default=0,
+								  help="minimum frequency of the listed values")
+	parser_sketchengine.add_argument("-o", "--output-folder", default="data/ittenten/",
+								  type=pathlib.Path,
+								  help="path to output folder")
+	parser_sketchengine.add_argument("--output-filename", default="ittenten.nouns.tsv",
+								  help="name of the word list, written as count<TAB>word lines")
+	parser_sketchengine.add_argument("--page-size", type=int, default=se.PAGE_SIZE,
+								  help="number of items requested in each page")
+	parser_sketchengine.add_argument("--max-requests", type=int, default=se.MAX_REQUESTS,
+								  help="maximum number of requests sent at the same time")
+	parser_sketchengine.add_argument("--rate", type=float, default=se.RATE,
+								  help="maximum number of requests per second")
+	parser_sketchengine.add_argument("--response-cache", default=se.CACHE_FOLDER,
+								  type=pathlib.Path,
+								  help="path to the folder where responses are cached")
+	parser_sketchengine.add_argument("--base-url", default=se.BASE_URL,
+								  help="URL of the SketchEngine API")
+	parser_sketchengine.set_defaults(func=_download_wordlist)
+
+
+	parser_all = subparsers.add_parser("all", parents=[parent_parser, patterns_parser],
+									formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+									description='run frequencies, merge, extract and contexts '
+									'for both compounds and ngrams reading each corpus once',
+									help='run frequencies, merge, extract and contexts in a single pass')
+	parser_all.add_argument("-i", "--input-files", default="data_sample/files_input.tsv",
+						 type=pathlib.Path,
+						 help="path to file containing list of input files")
+	parser_all.add_argument("-o", "--output-folder", default="data_sample/output_all/",
+						 type=pathlib.Path,
+						 help="path to output folder")
+	parser_all.add_argument("-t", "--threshold", default=10, type=int,
+						 help="minimum noun frequency for extraction")
+	parser_all.add_argument("--accepted-prefs", type=pathlib.Path,
+						 help="path to list of accepted prefixes (defaults to extracted prefixes)")
+	parser_all.add_argument("--accepted-adverbs", type=pathlib.Path,
+						 help="path to list of accepted adverbs (defaults to extracted adverbs)")
+	parser_all.add_argument("--nouns-threshold", type=int, default=20,
+						 help="minimum noun frequency for contexts")
+	parser_all.add_argument("--adverbs-threshold", type=int, default=20,
+						 help="minimum adverb frequency for contexts")
+	parser_all.add_argument("--prefs-threshold", type=int, default=20,
+						 help="minimum prefix frequency for contexts")
+	parser_all.add_argument("-c", "--context-width", type=int, default=20,
+						 help="width of left and right sentence context")
+	parser_all.add_argument("--store", action="store_true",
+						 help="write contexts to an indexed context store (contexts.tcs) "
+						 "instead of TSV files")
+	parser_all.add_argument("--max-open-files", type=int, default=w.MAX_OPEN,
+						 help="maximum number of contexts files open at the same time")
+	parser_all.add_argument("--workers", type=int, default=1,
+						 help="number of worker processes for the corpus scan")
+	parser_all.set_defaults(func=_run_all)
+
+
+	parser_run = subparsers.add_parser("run", parents=[parent_parser],
+									formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+									description='run the stages of a pipeline file whose outputs are not cached',
+									help='run a pipeline of steps with cached outputs')
+	parser_run.add_argument("-p", "--pipeline", default="data/pipeline.yaml",
+						 type=pathlib.Path,
+						 help="path to the pipeline file")
+	parser_run.add_argument("--cache-folder", default=r.CACHE_FOLDER,
+						 type=pathlib.Path,
+						 help="path to the folder where outputs of stages are cached")
+	parser_run.add_argument("-j", "--jobs", type=int, default=1,
+						 help="maximum number of stages run at the same time")
+	parser_run.add_argument("--hash", choices=["stat", "content"], default="stat",
+						 help="identify input files by size and modification time, or by content")
+	parser_run.add_argument("--force", action="store_true",
+						 help="run all stages again, replacing their cached outputs")
+	parser_run.add_argument("--dry-run", action="store_true",
+						 help="list the stages that would be run, without running them")
+	parser_run.set_defaults(func=_run_pipeline, parsers=subparsers.choices)
+
+
 	args = root_parser.parse_args()
 
 	if "func" not in args:
 		root_parser.print_usage()
 		exit()
 
-	args.func(args)
+	os.makedirs("logs", exist_ok=True)
+	logging.basicConfig(filename="logs/utils.log", format="%(levelname)s:%(message)s",
+						encoding="utf-8", level=logging.DEBUG)
+
+	if args.metrics is not None:
+		mt.enable(args.metrics)
+
+	if args.profile is None:
+		args.func(args)
+	else:
+		with mt.profile(getattr(args, "output_folder", "."), args.actions,
+						cpu=args.profile in ("cpu", "all"), memory=args.profile in ("memory", "all")):
+			args.func(args)